@@ -0,0 +1,375 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import RATING_ENGINES, calculate_rating_history, sort_games
+from src.feature_calculator import add_season_and_week
+from src.preprocessing import OUTCOME_COLUMNS, FeaturePreprocessor
+
+# Columns that identify a game, carry the label or hold its final score and must never be used as features
+NON_FEATURE_COLUMNS = ['game_id', 'season', 'week', 'target'] + OUTCOME_COLUMNS
+
+# Game columns every feature set needs for the ratings, folds and target
+GAME_COLUMNS = ['game_id', 'game_date', 'home_team', 'away_team', 'result']
+
+def load_features(path: str) -> pd.DataFrame:
+    """
+    Load a feature set for the backtest or tuning, a CSV or a training matrix.
+
+    Args:
+        path (str): CSV file, or a training matrix written by save_training_matrix.
+
+    Returns:
+        pd.DataFrame: Feature set.
+    """
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    from src.training_matrix import load_training_matrix
+    return load_training_matrix(path)
+
+def join_game_columns(features: pd.DataFrame, post_priori: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the game columns of post_priori to a feature set that only carries game_id, such as the scenario averages.
+
+    Only GAME_COLUMNS are joined: the rest of post_priori describes the game itself and would
+    leak its outcome into the features.
+
+    Args:
+        features (pd.DataFrame): Feature set with a game_id column.
+        post_priori (pd.DataFrame): Post-priori data.
+
+    Returns:
+        pd.DataFrame: Features with game_date, home_team, away_team and result.
+    """
+    features = features.drop(columns=[col for col in GAME_COLUMNS if col != 'game_id'], errors='ignore')
+    return features.merge(post_priori[GAME_COLUMNS], on='game_id', how='inner')
+
+def prepare_backtest_data(features: pd.DataFrame, k: float = 20, engine: str = 'elo') -> pd.DataFrame:
+    """
+    Attach season, week, pre-game ratings and the binary target to a feature set.
+
+    Args:
+        features (pd.DataFrame): Training matrix, or any feature set with game_id, game_date, home_team,
+            away_team and result columns. Scenario averages only carry game_id; add the game
+            columns with join_game_columns first.
+        k (float): K-factor for ELO rating calculation.
+        engine (str): Rating engine, 'elo' or 'glicko2'.
+
+    Returns:
+        pd.DataFrame: Chronologically sorted games ready for walk-forward evaluation.
+    """
+    missing = [col for col in GAME_COLUMNS if col not in features.columns]
+    if missing:
+        raise ValueError(f"Features are missing the game columns {', '.join(missing)}; use the training matrix "
+                         'or add them from post_priori with join_game_columns')
+
+    games = add_season_and_week(sort_games(features))
+
+    # Rating columns already in the features (e.g. from the training matrix) are recalculated with k and engine
+    games = games.drop(columns=['home_elo', 'away_elo', 'home_rd', 'away_rd', 'elo_home_win_prob', 'elo_diff', 'target'], errors='ignore')
+
+    # Ratings as of each game only use earlier results, so they are safe to use as features
+    elo = calculate_rating_history(games, engine=engine, **({'k': k} if engine == 'elo' else {}))
+    rating_columns = [col for col in ['home_elo', 'away_elo', 'home_rd', 'away_rd', 'home_win_prob'] if col in elo.columns]
+    elo = elo[['game_id'] + rating_columns].rename(columns={'home_win_prob': 'elo_home_win_prob'})
+    games = games.merge(elo, on='game_id', how='left')
+    games['elo_diff'] = games['home_elo'] - games['away_elo']
+
+    games['target'] = (games['result'] == 'home_win').astype(int)
+
+    return games
+
+def feature_columns(games: pd.DataFrame) -> list:
+    """
+    Get the numeric model feature columns of a backtest frame, leaving out identifiers, the
+    target and final score columns.
+
+    Args:
+        games (pd.DataFrame): Output of prepare_backtest_data.
+
+    Returns:
+        list: Names of the feature columns.
+    """
+    return [col for col in games.select_dtypes(include=['number']).columns if col not in NON_FEATURE_COLUMNS]
+
+def walk_forward_folds(games: pd.DataFrame, start_season: int, end_season: int, by: str = 'season') -> list:
+    """
+    Split games into walk-forward folds, each trained on every game played before its test period.
+
+    Args:
+        games (pd.DataFrame): Output of prepare_backtest_data.
+        start_season (int): First season to test on.
+        end_season (int): Last season to test on.
+        by (str): 'season' for one fold per season or 'week' for one fold per season week.
+
+    Returns:
+        list: One dict per fold with season, week, train and test row positions.
+    """
+    if by not in ['season', 'week']:
+        raise ValueError(f"by must be 'season' or 'week', got {by!r}")
+
+    game_date = games['game_date'].to_numpy()
+    folds = []
+
+    for season in range(start_season, end_season + 1):
+        in_season = (games['season'] == season).to_numpy()
+        if by == 'season':
+            periods = [(None, in_season)]
+        else:
+            weeks = np.unique(games.loc[in_season, 'week'])
+            periods = [(week, in_season & (games['week'] == week).to_numpy()) for week in weeks]
+
+        for week, test_mask in periods:
+            if not test_mask.any():
+                continue
+            train_mask = game_date < game_date[test_mask].min()
+            if not train_mask.any():
+                continue
+            folds.append({
+                'season': season,
+                'week': week,
+                'train': np.flatnonzero(train_mask),
+                'test': np.flatnonzero(test_mask)
+            })
+
+    return folds
+
+def build_model(model_name: str, params: dict = None):
+    """
+    Build an unfitted classifier for the backtest.
+
+    Args:
+        model_name (str): 'random_forest' or 'logistic_regression'.
+        params (dict): Keyword arguments overriding the model defaults.
+
+    Returns:
+        Unfitted scikit-learn classifier.
+    """
+    params = params or {}
+    if model_name == 'random_forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**{'n_estimators': 200, 'random_state': 42, 'n_jobs': 1, **params})
+    if model_name == 'logistic_regression':
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        return make_pipeline(StandardScaler(), LogisticRegression(**{'max_iter': 1000, **params}))
+    raise ValueError(f'Unknown model: {model_name}')
+
+def home_win_probability(model, X: np.ndarray) -> np.ndarray:
+    """
+    Get the home win probability from a fitted binary classifier.
+
+    Args:
+        model: Fitted scikit-learn classifier trained on the backtest target.
+        X (np.ndarray): Feature matrix.
+
+    Returns:
+        np.ndarray: Probability of the home team winning.
+    """
+    classes = list(model.classes_)
+    if 1 not in classes:
+        return np.zeros(len(X))
+    return model.predict_proba(X)[:, classes.index(1)]
+
+def fold_features(games: pd.DataFrame, X: np.ndarray, fold: dict, preprocessor: FeaturePreprocessor = None,
+                  selection: str = None) -> tuple:
+    """
+    Get the training and test features of a fold.
+
+    With a preprocessor, a copy of it is fitted on the fold's training games only, so its
+    scaling and feature selection never see the test period or its results.
+
+    Args:
+        games (pd.DataFrame): Output of prepare_backtest_data.
+        X (np.ndarray): Raw feature matrix of the games, used without a preprocessor.
+        fold (dict): Fold from walk_forward_folds.
+        preprocessor (FeaturePreprocessor): Unfitted preprocessor whose settings are fitted per fold.
+        selection (str): Preprocessor feature selection, e.g. 'top_10_features', or None for all features.
+
+    Returns:
+        tuple: (X_train, X_test).
+    """
+    if preprocessor is None:
+        return X[fold['train']], X[fold['test']]
+    fitted = preprocessor.clone().fit(games.iloc[fold['train']], target_column='target')
+    return (fitted.transform_array(games.iloc[fold['train']], selection).astype(np.float32),
+            fitted.transform_array(games.iloc[fold['test']], selection).astype(np.float32))
+
+# Backtest data shared by the fold workers, set once per process by _init_worker
+_worker_games = None
+_worker_X = None
+_worker_y = None
+_worker_preprocessor = None
+
+def _init_worker(games: pd.DataFrame, X: np.ndarray, y: np.ndarray, preprocessor: FeaturePreprocessor):
+    global _worker_games, _worker_X, _worker_y, _worker_preprocessor
+    _worker_games = games
+    _worker_X = X
+    _worker_y = y
+    _worker_preprocessor = preprocessor
+
+def _run_fold(fold: dict, model_name: str, model_params: dict, selection: str) -> np.ndarray:
+    X_train, X_test = fold_features(_worker_games, _worker_X, fold, _worker_preprocessor, selection)
+    model = build_model(model_name, model_params)
+    model.fit(X_train, _worker_y[fold['train']])
+    return home_win_probability(model, X_test)
+
+def evaluate_predictions(y_true, prob, n_bins: int = 10) -> dict:
+    """
+    Calculate accuracy and calibration metrics for home win probabilities.
+
+    Args:
+        y_true (array-like): 1 if the home team won, else 0.
+        prob (array-like): Predicted home win probabilities.
+        n_bins (int): Number of probability bins for the expected calibration error.
+
+    Returns:
+        dict: Accuracy, Brier score, log loss and expected calibration error.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    prob = np.asarray(prob, dtype=float)
+    clipped = np.clip(prob, 1e-15, 1 - 1e-15)
+
+    bins = np.minimum((prob * n_bins).astype(int), n_bins - 1)
+    bin_count = np.bincount(bins, minlength=n_bins)
+    bin_gap = np.abs(np.bincount(bins, weights=prob - y_true, minlength=n_bins))
+
+    return {
+        'games': len(y_true),
+        'accuracy': np.mean((prob > 0.5) == (y_true == 1)),
+        'brier': np.mean((prob - y_true) ** 2),
+        'log_loss': -np.mean(y_true * np.log(clipped) + (1 - y_true) * np.log(1 - clipped)),
+        'ece': bin_gap.sum() / max(bin_count.sum(), 1)
+    }
+
+def summarize_backtest(predictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Report per-season accuracy and calibration of the model and the ELO baseline.
+
+    Args:
+        predictions (pd.DataFrame): Predictions returned by run_backtest.
+
+    Returns:
+        pd.DataFrame: One row per season plus an 'all' row, with model_* and elo_* metrics.
+    """
+    rows = []
+    groups = [(season, group) for season, group in predictions.groupby('season')] + [('all', predictions)]
+    for season, group in groups:
+        row = {'season': season}
+        for source in ['model', 'elo']:
+            metrics = evaluate_predictions(group['target'], group[source + '_prob'])
+            row['games'] = metrics.pop('games')
+            row.update({source + '_' + name: value for name, value in metrics.items()})
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+def run_backtest(features: pd.DataFrame, start_season: int = 2010, end_season: int = 2018, by: str = 'season',
+                 model_name: str = 'random_forest', model_params: dict = None, workers: int = None,
+                 warm_start: bool = False, warm_start_trees: int = 50, k: float = 20, engine: str = 'elo',
+                 preprocessor: FeaturePreprocessor = None, selection: str = None) -> dict:
+    """
+    Walk forward through the seasons, refitting the model before each test period.
+
+    Folds are independent and run in parallel across processes. With warm_start the folds run
+    in order in a single process instead, and the random forest keeps its trees from earlier
+    folds and only grows warm_start_trees new ones on the extended training window.
+
+    Args:
+        features (pd.DataFrame): Training matrix or other feature set, see prepare_backtest_data.
+        start_season (int): First season to test on.
+        end_season (int): Last season to test on.
+        by (str): 'season' or 'week' walk-forward step.
+        model_name (str): Model passed to build_model.
+        model_params (dict): Keyword arguments for the model.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        warm_start (bool): Refit incrementally instead of from scratch (random forest only).
+        warm_start_trees (int): Trees added per fold when warm starting.
+        k (float): K-factor for ELO rating calculation.
+        engine (str): Rating engine for the rating features and the baseline, 'elo' or 'glicko2'.
+        preprocessor (FeaturePreprocessor): Unfitted preprocessor to scale and select the features
+            with instead of using the raw feature columns. A copy is fitted on each fold's training
+            games; a fitted preprocessor is rejected, as it would select features with test results.
+        selection (str): Preprocessor feature selection, e.g. 'top_10_features', or None for all features.
+
+    Returns:
+        dict: 'predictions' with one row per test game and 'summary' from summarize_backtest.
+    """
+    if preprocessor is not None:
+        if preprocessor.fitted:
+            raise ValueError('Pass an unfitted preprocessor; it is fitted on the training games of every fold')
+        if warm_start:
+            raise ValueError('warm_start cannot be combined with a preprocessor, whose features change between folds')
+        if selection is not None and selection not in preprocessor.selection_names():
+            raise ValueError(f"Unknown selection {selection!r}, expected one of {', '.join(preprocessor.selection_names())}")
+
+    games = prepare_backtest_data(features, k=k, engine=engine)
+    X = None if preprocessor is not None else games[feature_columns(games)].fillna(0).to_numpy(dtype=np.float32)
+    y = games['target'].to_numpy()
+
+    folds = walk_forward_folds(games, start_season, end_season, by=by)
+    if not folds:
+        raise ValueError(f'No games to test between seasons {start_season} and {end_season}')
+
+    if warm_start:
+        if model_name != 'random_forest':
+            raise ValueError('warm_start is only supported for the random_forest model')
+        model = build_model(model_name, {**(model_params or {}), 'warm_start': True})
+        fold_probs = []
+        for i, fold in enumerate(folds):
+            if i > 0:
+                model.set_params(n_estimators=model.n_estimators + warm_start_trees)
+            model.fit(X[fold['train']], y[fold['train']])
+            fold_probs.append(home_win_probability(model, X[fold['test']]))
+    else:
+        # Only the preprocessed backtest needs the games in the workers
+        initargs = (games if preprocessor is not None else None, X, y, preprocessor)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+            fold_probs = list(executor.map(_run_fold, folds, [model_name] * len(folds), [model_params] * len(folds),
+                                           [selection] * len(folds)))
+
+    predictions = []
+    for fold, prob in zip(folds, fold_probs):
+        fold_games = games.iloc[fold['test']][['game_id', 'game_date', 'season', 'week', 'home_team', 'away_team', 'target', 'elo_home_win_prob']]
+        fold_games = fold_games.rename(columns={'elo_home_win_prob': 'elo_prob'})
+        fold_games['model_prob'] = prob
+        predictions.append(fold_games)
+    predictions = pd.concat(predictions, ignore_index=True)
+
+    return {
+        'predictions': predictions,
+        'summary': summarize_backtest(predictions)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Walk-forward season backtest of the ELO baseline and a trained model.')
+    parser.add_argument('--features', default='data/processed/training_matrix.parquet',
+                        help='Training matrix or feature CSV with game columns.')
+    parser.add_argument('--start-season', type=int, default=2010)
+    parser.add_argument('--end-season', type=int, default=2018)
+    parser.add_argument('--by', choices=['season', 'week'], default='season')
+    parser.add_argument('--model', default='random_forest', choices=['random_forest', 'logistic_regression'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--warm-start', action='store_true')
+    parser.add_argument('--k', type=float, default=20)
+    parser.add_argument('--engine', choices=list(RATING_ENGINES), default='elo')
+    parser.add_argument('--preprocessor', action='store_true', help="Scale and select features, fitted on each fold's training games.")
+    parser.add_argument('--selection', default=None, help='Preprocessor feature selection, e.g. top_10_features.')
+    parser.add_argument('--output', default=None, help='Optional CSV path for the per-game predictions.')
+    args = parser.parse_args()
+
+    features = load_features(args.features)
+    preprocessor = FeaturePreprocessor() if args.preprocessor else None
+    backtest = run_backtest(features, start_season=args.start_season, end_season=args.end_season, by=args.by,
+                            model_name=args.model, workers=args.workers, warm_start=args.warm_start, k=args.k,
+                            engine=args.engine, preprocessor=preprocessor, selection=args.selection)
+
+    if args.output:
+        backtest['predictions'].to_csv(args.output, index=False)
+    print(backtest['summary'].to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from src.config import load_config, neo4j_credentials
+
+# Every subcommand imports its modules inside its handler, so a command only pays for the
+# libraries it uses. predict reads exported models from their numpy form (CompactModel), so it
+# never loads neo4j, torch or sklearn; only models without one fall back to the sklearn pickle
+
+def _ingest(args, config: dict):
+    from src.data_loader import ingest_plays, season_date_ranges
+
+    store = args.store or config['plays_store']
+    written = ingest_plays(args.source or config['raw_plays'], store, chunksize=config['chunksize'])
+    print(f'Wrote {len(written)} partitions to {store}')
+    for season, (start_date, end_date) in season_date_ranges(store).items():
+        print(f'Season {season}: {start_date} to {end_date}')
+
+def _play_source(args, config: dict) -> str:
+    # The partitioned store once it has been ingested, the raw CSV before that
+    if args.source:
+        return args.source
+    return config['plays_store'] if os.path.isdir(config['plays_store']) else config['raw_plays']
+
+def _post_priori(args, config: dict):
+    from src.data_loader import load_and_clean_data
+    from src.feature_calculator import calculate_post_priori, save_post_priori
+
+    plays = load_and_clean_data(_play_source(args, config), seasons=args.seasons, start_date=args.start_date,
+                                end_date=args.end_date, workers=config['workers'], chunksize=config['chunksize'])
+    if args.processes and args.processes > 1:
+        from src.shared_frame import parallel_post_priori
+        post_priori = parallel_post_priori(plays, workers=args.processes)
+    else:
+        post_priori = calculate_post_priori(plays)
+    output = args.output or config['post_priori']
+    save_post_priori(post_priori, output)
+    print(f'Saved {len(post_priori)} games to {output}')
+
+def _scenarios(args, config: dict):
+    import pandas as pd
+    from src.averages_by_scenario import calculate_averages_by_scenario, save_scenario_averages
+
+    averages = calculate_averages_by_scenario(pd.read_csv(args.post_priori or config['post_priori']))
+    output = args.output or config['averages_dir']
+    save_scenario_averages(averages, output)
+    print(f'Saved {len(averages)} scenarios to {output}')
+
+def _schedule(args, config: dict):
+    import pandas as pd
+    from src.schedule_graph import ScheduleGraph
+
+    if args.neo4j:
+        from nflelo import Neo4jElo
+
+        elo_system = Neo4jElo(*neo4j_credentials(config))
+        try:
+            graph = ScheduleGraph.from_neo4j(elo_system, k=config['k'])
+        finally:
+            elo_system.close()
+    else:
+        graph = ScheduleGraph(pd.read_csv(args.games or config['post_priori']), k=config['k'])
+    output = args.output or config['schedule_ratings']
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    graph.save(output)
+    print(f'Saved schedule ratings of {len(graph.teams)} teams over {len(graph.games)} games to {output}')
+
+def _matrix(args, config: dict):
+    import pandas as pd
+    from src.training_matrix import assemble_training_matrix, save_training_matrix
+
+    schedule_ratings = None
+    if args.schedule_ratings:
+        from src.schedule_graph import load_ratings_table
+        schedule_ratings = load_ratings_table(args.schedule_ratings)
+    matrix = assemble_training_matrix(pd.read_csv(args.post_priori or config['post_priori']), windows=tuple(args.windows),
+                                      h2h_windows=tuple(args.h2h_windows), k=config['k'], engine=args.engine or config['engine'],
+                                      schedule_ratings=schedule_ratings)
+    path = save_training_matrix(matrix, args.output or config['training_matrix'])
+    print(f'Saved {len(matrix)} games x {matrix.shape[1]} columns to {path}')
+
+def _elo(args, config: dict):
+    import pandas as pd
+    from src.elo_ratings import calculate_rating_history, latest_ratings
+
+    games = pd.read_csv(args.games or config['post_priori'])
+    engine = args.engine or config['engine']
+    history = calculate_rating_history(games, engine=engine, **({'k': config['k']} if engine == 'elo' else {}))
+    ratings = latest_ratings(history)
+
+    for path in [config['elo_history'], config['elo_ratings']]:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    history.to_csv(config['elo_history'], index=False)
+    with open(config['elo_ratings'], 'w') as f:
+        json.dump(ratings, f, indent=2)
+    print(f'Saved {engine} ratings of {len(ratings)} teams to {config["elo_ratings"]}')
+
+    if args.neo4j:
+        from nflelo import Neo4jElo
+
+        elo_system = Neo4jElo(*neo4j_credentials(config))
+        try:
+            games = games.rename(columns={'total_home_score': 'home_score', 'total_away_score': 'away_score'})
+            elo_system.create_teams(pd.concat([games['home_team'], games['away_team']]).unique())
+            for game in games.itertuples():
+                elo_system.create_game(game.game_id, game.home_team, game.away_team, game.home_score, game.away_score, game.game_date)
+            elo_system.calculate_elo(k=config['k'])
+            print(elo_system.query_stats())
+        finally:
+            elo_system.close()
+
+def _predict(args, config: dict):
+    if args.url:
+        from urllib.request import Request, urlopen
+
+        body = json.dumps({'home_team': args.home_team, 'away_team': args.away_team}).encode()
+        request = Request(args.url.rstrip('/') + '/predict', data=body, headers={'Content-Type': 'application/json'})
+        with urlopen(request) as response:
+            result = json.load(response)
+    else:
+        artifacts = args.artifacts or config['artifacts']
+        with open(os.path.join(artifacts, 'manifest.json')) as f:
+            manifest = json.load(f)
+
+        if manifest['model'] is None and manifest.get('engine', 'elo') == 'elo':
+            # ELO-only artifacts need nothing but the ratings file
+            with open(os.path.join(artifacts, manifest['elo_ratings'])) as f:
+                ratings = json.load(f)
+            home_elo = ratings.get(args.home_team, 1500.0)
+            away_elo = ratings.get(args.away_team, 1500.0)
+            prob = 1 / (1 + 10 ** ((away_elo - home_elo) / 400))
+            result = {'home_team': args.home_team, 'away_team': args.away_team,
+                      'elo_home_win_prob': prob, 'home_win_prob': prob, 'version': manifest['version']}
+        else:
+            from src.prediction_service import PredictionArtifacts
+
+            loaded = PredictionArtifacts(artifacts)
+            probs = loaded.predict([args.home_team], [args.away_team])
+            result = {'home_team': args.home_team, 'away_team': args.away_team,
+                      'elo_home_win_prob': float(probs['elo_home_win_prob'][0]),
+                      'home_win_prob': float(probs['home_win_prob'][0]), 'version': loaded.version}
+
+    print(json.dumps(result, indent=2))
+
+def _features_path(args, config: dict) -> str:
+    # The training matrix unless another feature set is configured
+    return args.features or config['features'] or config['training_matrix']
+
+def _export(args, config: dict):
+    import pandas as pd
+    from src.backtest import load_features
+    from src.prediction_service import export_artifacts
+    from src.preprocessing import FeaturePreprocessor
+
+    model_name = args.model or config['model']
+    path = args.output or config['artifacts']
+    post_priori = None if model_name == 'elo' else pd.read_csv(args.post_priori or config['post_priori'])
+    version = export_artifacts(path, load_features(_features_path(args, config)), post_priori=post_priori,
+                               model_name=None if model_name == 'elo' else model_name, k=config['k'],
+                               engine=args.engine or config['engine'],
+                               preprocessor=FeaturePreprocessor() if args.preprocessor else None, selection=args.selection)
+    print(f'Exported artifacts {version} to {path}')
+
+def _backtest(args, config: dict):
+    from src.backtest import load_features, run_backtest
+    from src.preprocessing import FeaturePreprocessor
+
+    features = load_features(_features_path(args, config))
+    preprocessor = FeaturePreprocessor() if args.preprocessor else None
+    backtest = run_backtest(features, start_season=args.start_season, end_season=args.end_season, by=args.by,
+                            model_name=args.model or config['model'], workers=config['workers'], warm_start=args.warm_start,
+                            k=config['k'], engine=args.engine or config['engine'], preprocessor=preprocessor, selection=args.selection)
+    if args.output:
+        backtest['predictions'].to_csv(args.output, index=False)
+    print(backtest['summary'].to_string(index=False))
+
+def _tune(args, config: dict):
+    import numpy as np
+    import pandas as pd
+    from src.backtest import feature_columns, load_features, prepare_backtest_data
+    from src.tuning import (RF_PARAM_GRID, RNN_PARAM_GRID, asha_search, best_params, param_candidates, prepare_sequence_tuning,
+                            tuning_folds)
+
+    if args.model == 'rnn':
+        # The RNN reads each team's sequence of previous games instead of the game rows
+        X = y = None
+        folds = prepare_sequence_tuning(pd.read_csv(args.post_priori or config['post_priori']), config['sequences'], args.folds)
+    else:
+        games = prepare_backtest_data(load_features(_features_path(args, config)), k=config['k'], engine=config['engine'])
+        X = games[feature_columns(games)].fillna(0).to_numpy(dtype=np.float32)
+        y = games['target'].to_numpy()
+        folds = tuning_folds(games, args.folds)
+    candidates = param_candidates(RNN_PARAM_GRID if args.model == 'rnn' else RF_PARAM_GRID)
+
+    trials = asha_search(X, y, folds, model_name=args.model, candidates=candidates, eta=args.eta,
+                         n_rungs=args.rungs, max_epochs=args.max_epochs, patience=args.patience, metric=args.metric,
+                         workers=config['workers'], cache_dir=config['tuning_cache'], sequence_path=config['sequences'])
+    if args.output:
+        trials.to_csv(args.output, index=False)
+    print(trials.head(10).to_string(index=False))
+    print('Best parameters:', best_params(trials, candidates))
+
+def _time(function, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def _bench(args, config: dict):
+    import numpy as np
+    from src.data_loader import load_and_clean_data
+    from src.elo_ratings import calculate_rating_history
+    from src.feature_calculator import calculate_post_priori
+
+    source = _play_source(args, config)
+    engine = args.engine or config['engine']
+    rows = []
+
+    plays, timings = _time(lambda: load_and_clean_data(source, seasons=args.seasons, workers=config['workers'],
+                                                       chunksize=config['chunksize']), args.repeat)
+    rows.append(('load', len(plays), timings))
+    post_priori, timings = _time(lambda: calculate_post_priori(plays), args.repeat)
+    rows.append(('post-priori', len(post_priori), timings))
+    history, timings = _time(lambda: calculate_rating_history(post_priori, engine=engine), args.repeat)
+    rows.append((engine, len(history), timings))
+
+    artifacts = args.artifacts or config['artifacts']
+    if os.path.exists(os.path.join(artifacts, 'manifest.json')):
+        from src.prediction_service import PredictionArtifacts
+
+        loaded = PredictionArtifacts(artifacts)
+        rng = np.random.default_rng(0)
+        home = rng.choice(loaded.teams, config['batch_size']).tolist()
+        away = rng.choice(loaded.teams, config['batch_size']).tolist()
+        _, timings = _time(lambda: loaded.predict(home, away), args.repeat)
+        rows.append(('predict', config['batch_size'], timings))
+
+    print(f'{"stage":<12} {"rows":>8} {"best_s":>9} {"median_s":>9}')
+    for stage, n_rows, timings in rows:
+        print(f'{stage:<12} {n_rows:>8} {min(timings):>9.3f} {statistics.median(timings):>9.3f}')
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Build the command line parser with one subcommand per pipeline stage.
+
+    Returns:
+        argparse.ArgumentParser: Parser whose parsed arguments carry the subcommand's handler.
+    """
+    parser = argparse.ArgumentParser(prog='nflelo', description='NFL ELO ratings, features and win prediction.')
+    parser.add_argument('--config', default=None, help='JSON config file (default $NFLELO_CONFIG or nflelo.json).')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Add a play-by-play CSV to the partitioned store.')
+    ingest.add_argument('--source', default=None, help='Play-by-play CSV (default raw_plays).')
+    ingest.add_argument('--store', default=None, help='Store directory (default plays_store).')
+    ingest.set_defaults(handler=_ingest)
+
+    post_priori = subparsers.add_parser('post-priori', help='Calculate the per-game post-priori statistics.')
+    post_priori.add_argument('--source', default=None, help='Store directory or play-by-play CSV.')
+    post_priori.add_argument('--seasons', type=int, nargs='+', default=None)
+    post_priori.add_argument('--start-date', default=None)
+    post_priori.add_argument('--end-date', default=None)
+    post_priori.add_argument('--output', default=None, help='Output CSV (default post_priori).')
+    post_priori.add_argument('--processes', type=int, default=None,
+                             help='Worker processes sharing one in-memory copy of the plays. Only faster with several cores '
+                                  'and multiple seasons of plays (default: calculate in-process).')
+    post_priori.set_defaults(handler=_post_priori)
+
+    scenarios = subparsers.add_parser('scenarios', help='Calculate the scenario averages of every game.')
+    scenarios.add_argument('--post-priori', default=None, help='Post-priori CSV.')
+    scenarios.add_argument('--output', default=None, help='Output directory (default averages_dir).')
+    scenarios.set_defaults(handler=_scenarios)
+
+    schedule = subparsers.add_parser('schedule', help='Calculate weekly Massey, Colley, PageRank and strength of schedule ratings.')
+    schedule.add_argument('--games', default=None, help='Games CSV with scores (default post_priori).')
+    schedule.add_argument('--neo4j', action='store_true', help='Read the games from the Neo4j PLAYED relationships instead.')
+    schedule.add_argument('--output', default=None, help='Output CSV (default schedule_ratings).')
+    schedule.set_defaults(handler=_schedule)
+
+    matrix = subparsers.add_parser('matrix', help='Assemble the as-of joined training matrix.')
+    matrix.add_argument('--post-priori', default=None, help='Post-priori CSV.')
+    matrix.add_argument('--windows', type=int, nargs='+', default=[3, 5, 10], help='Rolling average windows in games.')
+    matrix.add_argument('--h2h-windows', type=int, nargs='+', default=[3], help='Head-to-head windows in meetings.')
+    matrix.add_argument('--engine', choices=['elo', 'glicko2'], default=None)
+    matrix.add_argument('--schedule-ratings', default=None, help='Join the ratings table written by the schedule command.')
+    matrix.add_argument('--output', default=None, help='Output parquet file (default training_matrix).')
+    matrix.set_defaults(handler=_matrix)
+
+    elo = subparsers.add_parser('elo', help='Calculate ELO or Glicko-2 ratings.')
+    elo.add_argument('--games', default=None, help='Games CSV with results (default post_priori).')
+    elo.add_argument('--engine', choices=['elo', 'glicko2'], default=None)
+    elo.add_argument('--neo4j', action='store_true', help='Also load the games into Neo4j and rate them there.')
+    elo.set_defaults(handler=_elo)
+
+    predict = subparsers.add_parser('predict', help='Predict the home win probability of one matchup.')
+    predict.add_argument('home_team')
+    predict.add_argument('away_team')
+    predict.add_argument('--artifacts', default=None, help='Artifact directory (default artifacts).')
+    predict.add_argument('--url', default=None, help='Ask a running prediction service instead of loading artifacts.')
+    predict.set_defaults(handler=_predict)
+
+    backtest = subparsers.add_parser('backtest', help='Walk-forward backtest of the ELO baseline and a model.')
+    backtest.add_argument('--features', default=None, help='Training matrix or feature CSV with game columns (default training_matrix).')
+    backtest.add_argument('--start-season', type=int, default=2010)
+    backtest.add_argument('--end-season', type=int, default=2018)
+    backtest.add_argument('--by', choices=['season', 'week'], default='season')
+    backtest.add_argument('--model', choices=['random_forest', 'logistic_regression'], default=None)
+    backtest.add_argument('--engine', choices=['elo', 'glicko2'], default=None)
+    backtest.add_argument('--warm-start', action='store_true')
+    backtest.add_argument('--preprocessor', action='store_true', help="Scale and select features, fitted on each fold's training games.")
+    backtest.add_argument('--selection', default=None, help='Preprocessor feature selection, e.g. top_10_features.')
+    backtest.add_argument('--output', default=None, help='Optional CSV path for the per-game predictions.')
+    backtest.set_defaults(handler=_backtest)
+
+    export = subparsers.add_parser('export', help='Fit a model on every game and export the prediction service artifacts.')
+    export.add_argument('--features', default=None, help='Training matrix or feature CSV with game columns (default training_matrix).')
+    export.add_argument('--post-priori', default=None, help='Post-priori CSV the team state is rebuilt from (default post_priori).')
+    export.add_argument('--model', choices=['random_forest', 'logistic_regression', 'elo'], default=None,
+                        help='Model to serve, or elo for rating probabilities only (default model).')
+    export.add_argument('--engine', choices=['elo', 'glicko2'], default=None)
+    export.add_argument('--preprocessor', action='store_true', help='Scale and select features, fitted on every game.')
+    export.add_argument('--selection', default=None, help='Preprocessor feature selection, e.g. top_10_features.')
+    export.add_argument('--output', default=None, help='Artifact directory (default artifacts).')
+    export.set_defaults(handler=_export)
+
+    tune = subparsers.add_parser('tune', help='Tune the random forest or RNN with ASHA over time-ordered folds.')
+    tune.add_argument('--features', default=None, help='Training matrix or feature CSV with game columns (default training_matrix).')
+    tune.add_argument('--post-priori', default=None, help='Post-priori CSV the RNN sequences are built from (default post_priori).')
+    tune.add_argument('--model', choices=['random_forest', 'rnn'], default='random_forest')
+    tune.add_argument('--folds', type=int, default=3, help='Number of validation seasons.')
+    tune.add_argument('--eta', type=int, default=3)
+    tune.add_argument('--rungs', type=int, default=3)
+    tune.add_argument('--max-epochs', type=int, default=100)
+    tune.add_argument('--patience', type=int, default=10, help='RNN epochs without validation improvement before a trial stops.')
+    tune.add_argument('--metric', choices=['log_loss', 'brier', 'accuracy', 'ece'], default='log_loss')
+    tune.add_argument('--output', default=None, help='Optional CSV path for every trial.')
+    tune.set_defaults(handler=_tune)
+
+    bench = subparsers.add_parser('bench', help='Time the load, post-priori, rating and predict stages.')
+    bench.add_argument('--source', default=None, help='Store directory or play-by-play CSV.')
+    bench.add_argument('--seasons', type=int, nargs='+', default=[2018])
+    bench.add_argument('--engine', choices=['elo', 'glicko2'], default=None)
+    bench.add_argument('--artifacts', default=None, help='Artifact directory to time predictions with.')
+    bench.add_argument('--repeat', type=int, default=3)
+    bench.set_defaults(handler=_bench)
+
+    return parser
+
+def main(argv: list = None):
+    args = build_parser().parse_args(argv)
+    args.handler(args, load_config(args.config))
+
+if __name__ == "__main__":
+    main()
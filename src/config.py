@@ -0,0 +1,85 @@
+import json
+import os
+
+CONFIG_FILE = 'nflelo.json'
+ENV_PREFIX = 'NFLELO_'
+
+DEFAULTS = {
+    'raw_plays': 'data/raw/NFL Play by Play 2009-2018 (v5).csv',
+    'plays_store': 'data/plays',
+    'post_priori': 'data/processed/post_priori.csv',
+    'averages_dir': 'data/processed/averages',
+    'training_matrix': 'data/processed/training_matrix.parquet',
+    'schedule_ratings': 'data/processed/schedule_ratings.csv',
+    # Feature set of backtest and tune, None for the training matrix
+    'features': None,
+    'sequences': 'data/processed/sequences',
+    'elo_history': 'data/processed/elo_history.csv',
+    'elo_ratings': 'data/processed/elo_ratings.json',
+    'artifacts': 'data/artifacts',
+    'tuning_cache': 'data/tuning',
+    'neo4j_uri': 'bolt://localhost:7687',
+    'neo4j_user': 'neo4j',
+    'neo4j_password': None,
+    'engine': 'elo',
+    'k': 20,
+    'model': 'random_forest',
+    'workers': None,
+    'batch_size': 256,
+    'chunksize': 200000
+}
+
+# Settings that are not strings, so environment variables can be converted
+TYPES = {
+    'k': float,
+    'workers': int,
+    'batch_size': int,
+    'chunksize': int
+}
+
+def load_config(path: str = None) -> dict:
+    """
+    Load the settings shared by the command line entry points.
+
+    Defaults are overridden by the config file, which is overridden by NFLELO_<SETTING>
+    environment variables (e.g. NFLELO_NEO4J_PASSWORD, NFLELO_WORKERS).
+
+    Args:
+        path (str): JSON config file. Defaults to $NFLELO_CONFIG, then nflelo.json if it exists.
+
+    Returns:
+        dict: Settings keyed by name.
+    """
+    config = dict(DEFAULTS)
+
+    path = path or os.environ.get(ENV_PREFIX + 'CONFIG')
+    if path is None and os.path.exists(CONFIG_FILE):
+        path = CONFIG_FILE
+    if path is not None:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f'Unknown settings in {path}: {", ".join(sorted(unknown))}')
+        config.update(overrides)
+
+    for key in DEFAULTS:
+        value = os.environ.get(ENV_PREFIX + key.upper())
+        if value is not None:
+            config[key] = TYPES.get(key, str)(value)
+
+    return config
+
+def neo4j_credentials(config: dict) -> tuple:
+    """
+    Get the Neo4j connection settings, failing early when no password is configured.
+
+    Args:
+        config (dict): Output of load_config.
+
+    Returns:
+        tuple: (uri, user, password).
+    """
+    if not config['neo4j_password']:
+        raise ValueError(f'Set the Neo4j password with {ENV_PREFIX}NEO4J_PASSWORD or neo4j_password in the config file')
+    return config['neo4j_uri'], config['neo4j_user'], config['neo4j_password']
@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from src.feature_calculator import add_season_and_week
+
+PLAYS_STORE = 'data/plays'
+PARTITIONS_FILE = 'partitions.json'
+STORE_FORMAT = 1
+
+def partition_path(season: int, week: int) -> str:
+    """
+    Get the path of a season/week partition, relative to the store.
+
+    Args:
+        season (int): NFL season.
+        week (int): Week of the season.
+
+    Returns:
+        str: Relative path of the partition file.
+    """
+    return os.path.join(f'season={season}', f'week={week:02d}.csv')
+
+def clean_play_data(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Drop plays without a game and duplicated plays, and order plays chronologically within each game.
+
+    Args:
+        data (pd.DataFrame): Raw play-by-play data.
+
+    Returns:
+        pd.DataFrame: Cleaned play-by-play data.
+    """
+    data = data.dropna(subset=['game_id', 'game_date'])
+    data = data.assign(game_date=pd.to_datetime(data['game_date']).dt.strftime('%Y-%m-%d'))
+    data = data.drop_duplicates(subset=['game_id', 'play_id'], keep='last')
+    return data.sort_values(['game_date', 'game_id', 'play_id'], kind='stable').reset_index(drop=True)
+
+def source_season_starts(source: str) -> dict:
+    """
+    Find the first game date of every season in a play-by-play CSV with a pass over its game_date column only.
+
+    Args:
+        source (str): Play-by-play CSV.
+
+    Returns:
+        dict: First game date keyed by season.
+    """
+    source_dates = add_season_and_week(pd.read_csv(source, usecols=['game_date']).dropna().drop_duplicates())
+    return {int(season): start for season, start in source_dates.groupby('season')['game_date'].min().items()}
+
+def load_partitions(store_path: str = PLAYS_STORE) -> pd.DataFrame:
+    """
+    Load the partition metadata of a play-by-play store.
+
+    Args:
+        store_path (str): Store directory.
+
+    Returns:
+        pd.DataFrame: One row per partition with season, week, path, rows, games, start_date and end_date.
+    """
+    metadata_file = os.path.join(store_path, PARTITIONS_FILE)
+    if not os.path.exists(metadata_file):
+        return pd.DataFrame(columns=['season', 'week', 'path', 'rows', 'games', 'start_date', 'end_date'])
+    with open(metadata_file) as f:
+        metadata = json.load(f)
+    if metadata['format'] != STORE_FORMAT:
+        raise ValueError(f"Unsupported play-by-play store format {metadata['format']} in {store_path}")
+    return pd.DataFrame(metadata['partitions'])
+
+def _save_partitions(store_path: str, partitions: pd.DataFrame):
+    partitions = partitions.sort_values(['season', 'week']).reset_index(drop=True)
+    metadata = {'format': STORE_FORMAT, 'partitions': partitions.to_dict('records')}
+    tmp_file = os.path.join(store_path, PARTITIONS_FILE + '.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(metadata, f, indent=2, default=int)
+    os.replace(tmp_file, os.path.join(store_path, PARTITIONS_FILE))
+
+def season_date_ranges(store_path: str = PLAYS_STORE) -> dict:
+    """
+    Get the first and last game date of every season in the store.
+
+    Args:
+        store_path (str): Store directory.
+
+    Returns:
+        dict: (start_date, end_date) strings keyed by season.
+    """
+    partitions = load_partitions(store_path)
+    ranges = partitions.groupby('season').agg(start_date=('start_date', 'min'), end_date=('end_date', 'max'))
+    return {int(season): (row.start_date, row.end_date) for season, row in ranges.iterrows()}
+
+def split_into_seasons(post_priori: pd.DataFrame, store_path: str = PLAYS_STORE) -> dict:
+    """
+    Split games into seasons using the season date ranges of the play-by-play store.
+
+    Args:
+        post_priori (pd.DataFrame): DataFrame with a game_date column.
+        store_path (str): Store directory.
+
+    Returns:
+        dict: Games of each season keyed by season.
+    """
+    game_date = pd.to_datetime(post_priori['game_date'])
+    return {season: post_priori[(game_date >= start_date) & (game_date <= end_date)]
+            for season, (start_date, end_date) in season_date_ranges(store_path).items()}
+
+def select_partitions(partitions: pd.DataFrame, seasons: list = None, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    """
+    Select the partitions that can hold plays matching a season and date filter.
+
+    Args:
+        partitions (pd.DataFrame): Output of load_partitions.
+        seasons (list): Seasons to keep, or None for every season.
+        start_date (str): Keep games played on or after this date.
+        end_date (str): Keep games played on or before this date.
+
+    Returns:
+        pd.DataFrame: Matching partitions.
+    """
+    keep = pd.Series(True, index=partitions.index)
+    if seasons is not None:
+        keep &= partitions['season'].isin(seasons)
+    if start_date is not None:
+        keep &= partitions['end_date'] >= pd.Timestamp(start_date).strftime('%Y-%m-%d')
+    if end_date is not None:
+        keep &= partitions['start_date'] <= pd.Timestamp(end_date).strftime('%Y-%m-%d')
+    return partitions[keep]
+
+def ingest_plays(source: str, store_path: str = PLAYS_STORE, chunksize: int = 200000) -> pd.DataFrame:
+    """
+    Add a play-by-play CSV to the store, one partition per season and week.
+
+    New seasons and weeks become new partitions. Partitions that already exist are merged
+    with the new plays, keeping the newest copy of a play, so a weekly update can be ingested
+    again without duplicating plays.
+
+    Args:
+        source (str): Play-by-play CSV, e.g. the 2009-2018 file or a weekly export.
+        store_path (str): Store directory.
+        chunksize (int): Rows read from the source at a time.
+
+    Returns:
+        pd.DataFrame: Metadata of the partitions written.
+    """
+    os.makedirs(store_path, exist_ok=True)
+    partitions = load_partitions(store_path)
+
+    # Weeks are counted from the first game of each season, which may be in the store or anywhere in the source
+    season_starts = {int(season): start for season, start in partitions.groupby('season')['start_date'].min().items()}
+    for season, start in source_season_starts(source).items():
+        season_starts[season] = min(season_starts.get(season, start), start)
+
+    # Plays are staged per partition first, so each partition file is only rewritten once
+    staging_path = os.path.join(store_path, '.staging')
+    os.makedirs(staging_path, exist_ok=True)
+    for leftover in os.listdir(staging_path):
+        os.remove(os.path.join(staging_path, leftover))
+    staged = set()
+    for chunk in pd.read_csv(source, chunksize=chunksize, low_memory=False):
+        chunk = add_season_and_week(chunk.dropna(subset=['game_id', 'game_date']), season_starts)
+        for (season, week), plays in chunk.groupby(['season', 'week']):
+            staging_file = os.path.join(staging_path, f'{season}_{week}.csv')
+            plays.to_csv(staging_file, mode='a', header=(season, week) not in staged, index=False)
+            staged.add((season, week))
+
+    written = []
+    for season, week in sorted(staged):
+        staging_file = os.path.join(staging_path, f'{season}_{week}.csv')
+        plays = pd.read_csv(staging_file, low_memory=False)
+        path = partition_path(season, week)
+        full_path = os.path.join(store_path, path)
+        if os.path.exists(full_path):
+            plays = pd.concat([pd.read_csv(full_path, low_memory=False), plays], ignore_index=True)
+        plays = clean_play_data(plays)
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        plays.to_csv(full_path + '.tmp', index=False)
+        os.replace(full_path + '.tmp', full_path)
+        os.remove(staging_file)
+
+        written.append({
+            'season': int(season),
+            'week': int(week),
+            'path': path,
+            'rows': len(plays),
+            'games': int(plays['game_id'].nunique()),
+            'start_date': plays['game_date'].min(),
+            'end_date': plays['game_date'].max()
+        })
+    os.rmdir(staging_path)
+
+    written = pd.DataFrame(written)
+    if not written.empty:
+        kept = partitions.set_index(['season', 'week']).index.isin(written.set_index(['season', 'week']).index)
+        _save_partitions(store_path, pd.concat([partitions[~kept], written], ignore_index=True))
+    return written
+
+def load_and_clean_data(path: str = PLAYS_STORE, seasons: list = None, start_date: str = None, end_date: str = None,
+                        workers: int = None, chunksize: int = 200000) -> pd.DataFrame:
+    """
+    Load and clean play-by-play data, from the partitioned store or from a single CSV.
+
+    With the store only the partitions whose seasons and date ranges match the filter are
+    read, in parallel. A single CSV is read in chunks and each chunk is filtered before the
+    next one is read, with weeks counted from each season's first game in the whole file.
+
+    Args:
+        path (str): Store directory or play-by-play CSV.
+        seasons (list): Seasons to load, or None for every season.
+        start_date (str): Only load games played on or after this date.
+        end_date (str): Only load games played on or before this date.
+        workers (int): Number of partitions read at the same time.
+        chunksize (int): Rows of a single CSV read at a time.
+
+    Returns:
+        pd.DataFrame: Cleaned plays with season and week columns.
+    """
+    if os.path.isdir(path):
+        partitions = select_partitions(load_partitions(path), seasons, start_date, end_date)
+        files = [os.path.join(path, partition) for partition in partitions['path']]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Partitions overlapping the edges of a date range still hold plays outside it
+            chunks = list(executor.map(lambda file: _filter_plays(pd.read_csv(file, low_memory=False), seasons, start_date, end_date), files))
+    else:
+        # A season can span chunks, so its first game is found before any chunk is numbered
+        season_starts = source_season_starts(path)
+        chunks = [_filter_plays(add_season_and_week(chunk, season_starts), seasons, start_date, end_date)
+                  for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False)]
+
+    data = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=['game_id', 'play_id', 'game_date', 'season', 'week'])
+    return clean_play_data(data)
+
+def _filter_plays(data: pd.DataFrame, seasons: list = None, start_date: str = None, end_date: str = None) -> pd.DataFrame:
+    # Keep the plays of the selected seasons and date range
+    keep = pd.Series(True, index=data.index)
+    if seasons is not None:
+        keep &= data['season'].isin(seasons)
+    if start_date is not None:
+        keep &= pd.to_datetime(data['game_date']) >= pd.Timestamp(start_date)
+    if end_date is not None:
+        keep &= pd.to_datetime(data['game_date']) <= pd.Timestamp(end_date)
+    return data[keep]
+
+def save_processed_data(data: pd.DataFrame, path: str):
+    """
+    Save a processed DataFrame to CSV, creating its directory if needed.
+
+    Args:
+        data (pd.DataFrame): Data to save.
+        path (str): CSV file path.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    data.to_csv(path, index=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingest play-by-play data into the season/week partitioned store.')
+    parser.add_argument('--source', default='data/raw/NFL Play by Play 2009-2018 (v5).csv', help='Play-by-play CSV to ingest.')
+    parser.add_argument('--store', default=PLAYS_STORE, help='Store directory.')
+    args = parser.parse_args()
+
+    written = ingest_plays(args.source, args.store)
+    print(f'Wrote {len(written)} partitions ({written["rows"].sum() if len(written) else 0} plays) to {args.store}')
+    for season, (start_date, end_date) in season_date_ranges(args.store).items():
+        print(f'Season {season}: {start_date} to {end_date}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+
+def expected_score(home_elo, away_elo):
+    """
+    Calculate the expected score of the home team, as in Neo4jElo.calculate_expected_scores.
+    
+    Args:
+        home_elo (float or array-like): ELO rating of the home team.
+        away_elo (float or array-like): ELO rating of the away team.
+        
+    Returns:
+        float or np.ndarray: Expected score (win probability) of the home team.
+    """
+    return 1 / (1 + 10 ** ((np.asarray(away_elo, dtype=float) - np.asarray(home_elo, dtype=float)) / 400))
+
+def actual_scores(results) -> np.ndarray:
+    """
+    Convert game results to the home team's actual score.
+    
+    Args:
+        results (array-like): 'home_win', 'away_win' or 'tie' for each game.
+        
+    Returns:
+        np.ndarray: 1 for a home win, 0 for an away win and 0.5 for a tie.
+    """
+    results = np.asarray(results)
+    return np.select([results == 'home_win', results == 'away_win'], [1.0, 0.0], default=0.5)
+
+def sort_games(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort games chronologically, breaking ties on game_id.
+    
+    Args:
+        games (pd.DataFrame): DataFrame with game_id and game_date columns.
+        
+    Returns:
+        pd.DataFrame: Copy of the games sorted by game_date and game_id.
+    """
+    games = games.copy()
+    games['game_date'] = pd.to_datetime(games['game_date'])
+    return games.sort_values(['game_date', 'game_id'], kind='stable').reset_index(drop=True)
+
+def calculate_elo_history(games: pd.DataFrame, k: float = 20, initial_elo: float = 1500) -> pd.DataFrame:
+    """
+    Replay ELO ratings over a set of games and record each team's rating as of every game.
+    
+    The update rule is the one used by Neo4jElo.calculate_elo, so the final ratings match
+    the ones stored on the Team nodes, but no database round trip is needed per game.
+    
+    Args:
+        games (pd.DataFrame): DataFrame with game_id, game_date, home_team, away_team and result.
+        k (float): K-factor for ELO rating calculation.
+        initial_elo (float): Rating every team starts from.
+        
+    Returns:
+        pd.DataFrame: DataFrame with pre-game (home_elo, away_elo) and post-game
+        (home_elo_post, away_elo_post) ratings and the home win probability for each game.
+    """
+    games = sort_games(games)
+    
+    home_teams = games['home_team'].to_numpy()
+    away_teams = games['away_team'].to_numpy()
+    actual_home = actual_scores(games['result'])
+    
+    ratings = {}
+    home_elo = np.empty(len(games))
+    away_elo = np.empty(len(games))
+    home_elo_post = np.empty(len(games))
+    away_elo_post = np.empty(len(games))
+    
+    for i in range(len(games)):
+        home_elo[i] = ratings.get(home_teams[i], initial_elo)
+        away_elo[i] = ratings.get(away_teams[i], initial_elo)
+        
+        expected_home = 1 / (1 + 10 ** ((away_elo[i] - home_elo[i]) / 400))
+        
+        home_elo_post[i] = home_elo[i] + k * (actual_home[i] - expected_home)
+        away_elo_post[i] = away_elo[i] + k * ((1 - actual_home[i]) - (1 - expected_home))
+        
+        ratings[home_teams[i]] = home_elo_post[i]
+        ratings[away_teams[i]] = away_elo_post[i]
+    
+    history = games[['game_id', 'game_date', 'home_team', 'away_team']].copy()
+    history['home_elo'] = home_elo
+    history['away_elo'] = away_elo
+    history['home_win_prob'] = expected_score(home_elo, away_elo)
+    history['home_elo_post'] = home_elo_post
+    history['away_elo_post'] = away_elo_post
+    
+    return history
+
+def latest_ratings(history: pd.DataFrame, column: str = 'elo_post') -> dict:
+    """
+    Get each team's rating after the last game in a rating history.
+    
+    Args:
+        history (pd.DataFrame): Output of calculate_elo_history or calculate_glicko_history.
+        column (str): Per-side column to read, 'elo_post' for ratings or 'rd_post' for Glicko-2 deviations.
+        
+    Returns:
+        dict: Mapping of team name to its latest rating.
+    """
+    long = pd.concat([
+        history[['game_date', 'game_id', 'home_team', 'home_' + column]].set_axis(['game_date', 'game_id', 'team', 'value'], axis=1),
+        history[['game_date', 'game_id', 'away_team', 'away_' + column]].set_axis(['game_date', 'game_id', 'team', 'value'], axis=1)
+    ])
+    long = long.sort_values(['game_date', 'game_id'], kind='stable')
+    
+    return long.groupby('team')['value'].last().to_dict()
+
+# Glicko-2 works on a scale where 1500 and 173.7178 rating points map to 0 and 1
+GLICKO_SCALE = 173.7178
+
+def _glicko_g(phi):
+    return 1 / np.sqrt(1 + 3 * phi ** 2 / np.pi ** 2)
+
+def glicko_expected_score(home_rating, away_rating, home_rd, away_rd):
+    """
+    Calculate the home win probability from Glicko-2 ratings, accounting for both teams' uncertainty.
+    
+    Args:
+        home_rating (float or array-like): Rating of the home team on the ELO scale.
+        away_rating (float or array-like): Rating of the away team on the ELO scale.
+        home_rd (float or array-like): Rating deviation of the home team.
+        away_rd (float or array-like): Rating deviation of the away team.
+        
+    Returns:
+        float or np.ndarray: Home win probability, pulled towards 0.5 the more uncertain the ratings are.
+    """
+    mu_diff = (np.asarray(home_rating, dtype=float) - np.asarray(away_rating, dtype=float)) / GLICKO_SCALE
+    phi = np.sqrt(np.asarray(home_rd, dtype=float) ** 2 + np.asarray(away_rd, dtype=float) ** 2) / GLICKO_SCALE
+    return 1 / (1 + np.exp(-_glicko_g(phi) * mu_diff))
+
+def _glicko_volatility(delta, phi, v, sigma, tau, tolerance=1e-6):
+    # Illinois root finding of the new volatility (step 5 of the Glicko-2 paper), run for all teams at once
+    a = np.log(sigma ** 2)
+    
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+    
+    A = a.copy()
+    B = np.empty_like(a)
+    large = delta ** 2 > phi ** 2 + v
+    B[large] = np.log(delta[large] ** 2 - phi[large] ** 2 - v[large])
+    k = np.ones_like(a)
+    small = ~large
+    while small.any():
+        below = f(a - k * tau) < 0
+        k[small & below] += 1
+        small &= below
+    B[~large] = (a - k * tau)[~large]
+    
+    fA, fB = f(A), f(B)
+    active = np.abs(B - A) > tolerance
+    while active.any():
+        C = A + (A - B) * fA / (fB - fA)
+        fC = f(C)
+        move = active & (fC * fB <= 0)
+        halve = active & ~(fC * fB <= 0)
+        A = np.where(move, B, A)
+        fA = np.where(move, fB, np.where(halve, fA / 2, fA))
+        B = np.where(active, C, B)
+        fB = np.where(active, fC, fB)
+        active = np.abs(B - A) > tolerance
+    
+    return np.exp(A / 2)
+
+def _glicko_period(mu, phi, sigma, team, opponent, score, tau):
+    """
+    Apply one Glicko-2 rating period (steps 3 to 8 of the Glicko-2 paper) to every team at once.
+    
+    Args:
+        mu (np.ndarray): Ratings of all teams on the Glicko-2 scale.
+        phi (np.ndarray): Rating deviations on the Glicko-2 scale.
+        sigma (np.ndarray): Volatilities.
+        team (np.ndarray): Index of the rated team of every game, once from each side.
+        opponent (np.ndarray): Index of its opponent.
+        score (np.ndarray): Score of the rated team, 1, 0.5 or 0.
+        tau (float): Constraint on volatility changes over time.
+        
+    Returns:
+        tuple: New (mu, phi, sigma) arrays.
+    """
+    mu, phi, sigma = mu.copy(), phi.copy(), sigma.copy()
+    g = _glicko_g(phi[opponent])
+    expected = 1 / (1 + np.exp(-g * (mu[team] - mu[opponent])))
+    
+    played = np.bincount(team, minlength=len(mu)) > 0
+    v_inverse = np.bincount(team, weights=g ** 2 * expected * (1 - expected), minlength=len(mu))
+    improvement = np.bincount(team, weights=g * (score - expected), minlength=len(mu))
+    
+    v = 1 / v_inverse[played]
+    delta = v * improvement[played]
+    new_sigma = _glicko_volatility(delta, phi[played], v, sigma[played], tau)
+    phi_star = np.sqrt(phi[played] ** 2 + new_sigma ** 2)
+    new_phi = 1 / np.sqrt(1 / phi_star ** 2 + 1 / v)
+    
+    # Teams on a bye only gain uncertainty
+    phi[~played] = np.sqrt(phi[~played] ** 2 + sigma[~played] ** 2)
+    mu[played] = mu[played] + new_phi ** 2 * improvement[played]
+    phi[played] = new_phi
+    sigma[played] = new_sigma
+    return mu, phi, sigma
+
+def calculate_glicko_history(games: pd.DataFrame, initial_rating: float = 1500, initial_rd: float = 350,
+                             initial_volatility: float = 0.06, tau: float = 0.5, offseason_periods: int = 8) -> pd.DataFrame:
+    """
+    Replay Glicko-2 ratings over a set of games, treating each NFL week as one rating period.
+    
+    All games of a week are applied as one vectorized batch, and every team's rating deviation
+    grows between seasons as if it had sat out offseason_periods rating periods, so early season
+    probabilities are less confident than the ELO ones.
+    
+    Args:
+        games (pd.DataFrame): DataFrame with game_id, game_date, home_team, away_team and result.
+        initial_rating (float): Rating every team starts from, on the ELO scale.
+        initial_rd (float): Rating deviation every team starts from.
+        initial_volatility (float): Volatility every team starts from.
+        tau (float): Constraint on volatility changes over time.
+        offseason_periods (int): Idle rating periods applied between seasons.
+        
+    Returns:
+        pd.DataFrame: Same columns as calculate_elo_history, with ratings on the ELO scale, plus
+        pre-game (home_rd, away_rd) and post-week (home_rd_post, away_rd_post) rating deviations.
+    """
+    from src.feature_calculator import add_season_and_week
+    
+    games = add_season_and_week(sort_games(games))
+    teams = sorted(set(games['home_team']) | set(games['away_team']))
+    team_index = {team: i for i, team in enumerate(teams)}
+    
+    home = games['home_team'].map(team_index).to_numpy()
+    away = games['away_team'].map(team_index).to_numpy()
+    actual_home = actual_scores(games['result'])
+    
+    mu = np.zeros(len(teams))
+    phi = np.full(len(teams), initial_rd / GLICKO_SCALE)
+    sigma = np.full(len(teams), initial_volatility)
+    
+    pre = np.empty((len(games), 4))
+    post = np.empty((len(games), 4))
+    
+    period = games['season'].to_numpy() * 100 + games['week'].to_numpy()
+    boundaries = np.flatnonzero(np.diff(period)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(games)]])
+    
+    previous_season = None
+    for start, end in zip(starts, ends):
+        season = games['season'].iat[start]
+        if previous_season is not None and season != previous_season:
+            phi = np.sqrt(phi ** 2 + offseason_periods * sigma ** 2)
+        previous_season = season
+        
+        h, a, s = home[start:end], away[start:end], actual_home[start:end]
+        pre[start:end] = np.column_stack([mu[h], mu[a], phi[h], phi[a]])
+        
+        # Every game counts once from each side: (team, opponent, score)
+        team = np.concatenate([h, a])
+        opponent = np.concatenate([a, h])
+        score = np.concatenate([s, 1 - s])
+        mu, phi, sigma = _glicko_period(mu, phi, sigma, team, opponent, score, tau)
+        
+        post[start:end] = np.column_stack([mu[h], mu[a], phi[h], phi[a]])
+    
+    pre[:, :2] = pre[:, :2] * GLICKO_SCALE + initial_rating
+    post[:, :2] = post[:, :2] * GLICKO_SCALE + initial_rating
+    pre[:, 2:] *= GLICKO_SCALE
+    post[:, 2:] *= GLICKO_SCALE
+    
+    history = games[['game_id', 'game_date', 'home_team', 'away_team']].copy()
+    history['home_elo'] = pre[:, 0]
+    history['away_elo'] = pre[:, 1]
+    history['home_rd'] = pre[:, 2]
+    history['away_rd'] = pre[:, 3]
+    history['home_win_prob'] = glicko_expected_score(pre[:, 0], pre[:, 1], pre[:, 2], pre[:, 3])
+    history['home_elo_post'] = post[:, 0]
+    history['away_elo_post'] = post[:, 1]
+    history['home_rd_post'] = post[:, 2]
+    history['away_rd_post'] = post[:, 3]
+    
+    return history
+
+# Rating engines selectable by name from the backtest and prediction paths
+RATING_ENGINES = {
+    'elo': calculate_elo_history,
+    'glicko2': calculate_glicko_history
+}
+
+def calculate_rating_history(games: pd.DataFrame, engine: str = 'elo', **kwargs) -> pd.DataFrame:
+    """
+    Replay ratings over a set of games with the chosen rating engine.
+    
+    Args:
+        games (pd.DataFrame): DataFrame with game_id, game_date, home_team, away_team and result.
+        engine (str): Name of an engine in RATING_ENGINES.
+        **kwargs: Passed to the engine, e.g. k for ELO.
+        
+    Returns:
+        pd.DataFrame: Rating history with pre-game ratings and home win probability for each game.
+    """
+    if engine not in RATING_ENGINES:
+        raise ValueError(f'Unknown rating engine: {engine}')
+    return RATING_ENGINES[engine](games, **kwargs)
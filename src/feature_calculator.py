@@ -1,12 +1,45 @@
+import os
+
+import numpy as np
 import pandas as pd
+
+# Scoring windows as (qtr, upper, lower) bounds on game_seconds_remaining: a play
+# belongs to a window when qtr matches and lower < game_seconds_remaining <= upper.
+# None leaves that bound open, so (None, None, None) covers the whole game.
+SCORE_WINDOWS = {
+    'final': (None, None, None),
+    'q1': (1, None, None),
+    'q2': (2, None, None),
+    'q3': (3, None, None),
+    'q4': (4, None, None),
+    'q5': (5, None, None),
+    'last_2_min_q2': (2, 1920, 1800),
+    'last_2_minutes_q4': (4, 120, None),
+}
+
+# Play-by-play columns calculate_post_priori reads
+PLAY_COLUMNS = [
+    'game_id', 'play_id', 'game_date', 'home_team', 'away_team', 'posteam', 'posteam_type', 'qtr',
+    'game_seconds_remaining', 'total_home_score', 'total_away_score', 'play_type', 'yards_gained',
+    'complete_pass', 'incomplete_pass', 'pass_attempt', 'rush_attempt', 'interception', 'fumble',
+    'fumble_lost', 'fumble_forced', 'fumble_recovery_1_team', 'first_down_pass', 'first_down_rush',
+    'first_down_penalty', 'third_down_converted', 'third_down_failed', 'fourth_down_converted',
+    'fourth_down_failed', 'penalty', 'penalty_team', 'penalty_yards', 'field_goal_result', 'kick_distance',
+    'return_yards', 'pass_touchdown', 'rush_touchdown', 'touchdown', 'qb_hit', 'sack', 'safety',
+    'solo_tackle', 'punt_inside_twenty', 'tackled_for_loss'
+]
+
 def calculate_post_priori(data: pd.DataFrame) -> pd.DataFrame:
     
     post_priori = pd.DataFrame()
     post_priori['game_id'] = data['game_id'].unique()
     post_priori = post_priori.merge(data[['game_id', 'game_date', 'home_team', 'away_team']].drop_duplicates(), on='game_id', how='left')
         
+    #score snapshots for every window are computed once and shared by the score functions
+    window_scores = calculate_window_scores(data)
+    
     #calculating post_priori_characteristics by calling the functions below and merging the dataframes
-    scores = calculate_scores(data)
+    scores = calculate_scores(data, window_scores)
     conv_perc = calculate_conv_perc(data)
     turnovers = calculate_turnovers(data)
     downs = total_downs(data)
@@ -15,49 +48,120 @@ def calculate_post_priori(data: pd.DataFrame) -> pd.DataFrame:
     time_of_possession = calculate_time_of_possession(data)
     yards_gained = calculate_yards_gained(data)
     play_count = calculate_tot_play_count(data)
-    score_last_2_minutes_q2 = calculate_score_last_2_minutes_q2(data)
-    score_last_2_minutes_q4 = calculate_score_last_2_minutes_q4(data)
+    score_last_2_minutes_q2 = calculate_score_last_2_minutes_q2(data, window_scores)
+    score_last_2_minutes_q4 = calculate_score_last_2_minutes_q4(data, window_scores)
     offensive_metrics = calculate_offensive_metrics(data)
     defensive_metrics = calculate_defensive_metrics(data)
     
-    post_priori = pd.merge(post_priori, scores, on='game_id')
-    post_priori = pd.merge(post_priori, conv_perc, on='game_id')
-    post_priori = pd.merge(post_priori, turnovers, on='game_id')
-    post_priori = pd.merge(post_priori, downs, on='game_id')
-    post_priori = pd.merge(post_priori, penalties, on='game_id')
-    post_priori = pd.merge(post_priori, fd_penalty, on='game_id')
-    post_priori = pd.merge(post_priori, time_of_possession, on='game_id')
-    post_priori = pd.merge(post_priori, yards_gained, on='game_id')
-    post_priori = pd.merge(post_priori, play_count, on='game_id')
-    post_priori = pd.merge(post_priori, score_last_2_minutes_q2, on='game_id')
-    post_priori = pd.merge(post_priori, score_last_2_minutes_q4, on='game_id')
-    post_priori = pd.merge(post_priori, offensive_metrics, on='game_id')
-    post_priori = pd.merge(post_priori, defensive_metrics, on='game_id')
-    
-    post_priori.to_csv('data/processed/post_priori.csv', index=False)
+    #the late-game scores and the offensive/defensive metrics also carry home_team and away_team,
+    #which post_priori already has, so only their statistics are merged
+    for statistics in [scores, conv_perc, turnovers, downs, penalties, fd_penalty, time_of_possession, yards_gained,
+                       play_count, score_last_2_minutes_q2, score_last_2_minutes_q4, offensive_metrics, defensive_metrics]:
+        post_priori = pd.merge(post_priori, statistics.drop(columns=['home_team', 'away_team'], errors='ignore'), on='game_id')
+    
     return post_priori
 
-def calculate_scores(data: pd.DataFrame) -> pd.DataFrame:
+def save_post_priori(post_priori: pd.DataFrame, path: str = 'data/processed/post_priori.csv'):
+    '''
+    Save the post-priori data to CSV, creating its directory if needed.
+    
+    Args:
+        post_priori (pd.DataFrame): Output of calculate_post_priori.
+        path (str): CSV file path.
+    '''
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    post_priori.to_csv(path, index=False)
+
+def calculate_window_scores(data: pd.DataFrame, windows: dict = None) -> pd.DataFrame:
+    '''
+    Calculate home and away score snapshots at the end of each scoring window for each game.
+    
+    The plays are sorted by game once and every window is reduced in the same segmented
+    pass, so adding a window does not add another scan of the play-by-play table.
+    
+    Args:
+        data (pd.DataFrame): DataFrame containing play-by-play data.
+        windows (dict): Mapping of window name to (qtr, upper, lower) bounds, see SCORE_WINDOWS.
+        
+    Returns:
+        pd.DataFrame: DataFrame with score_<window>_home and score_<window>_away for each game,
+        NaN where a game has no plays in the window.
+    '''
+    if windows is None:
+        windows = SCORE_WINDOWS
+    
+    plays = data[['game_id', 'play_id', 'qtr', 'game_seconds_remaining', 'total_home_score', 'total_away_score']]
+    plays = plays.sort_values(by=['game_id', 'play_id'], kind='stable')
+    
+    #start offset of each game's segment in the sorted plays
+    game_ids, starts = np.unique(plays['game_id'].to_numpy(), return_index=True)
+    
+    qtr = plays['qtr'].to_numpy()
+    seconds_remaining = plays['game_seconds_remaining'].to_numpy(dtype=float)
+    
+    #one boolean column per window
+    in_window = np.ones((len(plays), len(windows)), dtype=bool)
+    for i, (window_qtr, upper, lower) in enumerate(windows.values()):
+        if window_qtr is not None:
+            in_window[:, i] &= qtr == window_qtr
+        if upper is not None:
+            in_window[:, i] &= seconds_remaining <= upper
+        if lower is not None:
+            in_window[:, i] &= seconds_remaining > lower
+    
+    window_scores = pd.DataFrame({'game_id': game_ids})
+    for side in ['home', 'away']:
+        score = plays['total_' + side + '_score'].to_numpy(dtype=float)
+        #fmax ignores NaN, so a game with no plays in a window keeps NaN for it
+        snapshots = np.fmax.reduceat(np.where(in_window, score[:, None], np.nan), starts, axis=0)
+        for i, name in enumerate(windows):
+            window_scores['score_' + name + '_' + side] = snapshots[:, i]
+    
+    #keep home/away columns of the same window next to each other
+    columns = ['game_id'] + [f'score_{name}_{side}' for name in windows for side in ['home', 'away']]
+    return window_scores[columns]
+
+def label_results(home_score, away_score) -> np.ndarray:
+    '''
+    Label each game as a home win, away win or tie.
+    
+    Args:
+        home_score (array-like): Home team scores.
+        away_score (array-like): Away team scores.
+        
+    Returns:
+        np.ndarray: Array of 'home_win', 'away_win' or 'tie' labels.
+    '''
+    home_score = np.asarray(home_score, dtype=float)
+    away_score = np.asarray(away_score, dtype=float)
+    return np.select([home_score > away_score, home_score < away_score], ['home_win', 'away_win'], default='tie')
+
+def calculate_scores(data: pd.DataFrame, window_scores: pd.DataFrame = None) -> pd.DataFrame:
     '''
     Calculate scores for each quarter and total scores for each game.
     
     Args:
         data (pd.DataFrame): DataFrame containing play-by-play data.
+        window_scores (pd.DataFrame): Output of calculate_window_scores, computed from data if not given.
         
     Returns:
         pd.DataFrame: DataFrame with scores for each quarter and total scores for each game.
     '''
-    scores = data.groupby(['game_id']).agg({'total_home_score': 'max', 'total_away_score': 'max'}).reset_index()
+    if window_scores is None:
+        window_scores = calculate_window_scores(data)
+    
+    scores = window_scores[['game_id', 'score_final_home', 'score_final_away']].rename(columns={'score_final_home': 'total_home_score', 'score_final_away': 'total_away_score'})
     scores['point_diff'] = scores['total_home_score'] - scores['total_away_score']
     
     #scores for each quarter
-    home_qtr_score = pd.Series([0] * len(scores))
-    away_qtr_score = pd.Series([0] * len(scores))
+    home_qtr_score = 0
+    away_qtr_score = 0
     
     for qtr in range(1, 6):
-        qtr_scores = data[data['qtr'] == qtr].groupby(['game_id'])[['total_home_score', 'total_away_score']].max().reset_index()
-        scores['score_q' + str(qtr) + '_home'] = qtr_scores['total_home_score']
-        scores['score_q' + str(qtr) + '_away'] = qtr_scores['total_away_score']
+        scores['score_q' + str(qtr) + '_home'] = window_scores['score_q' + str(qtr) + '_home']
+        scores['score_q' + str(qtr) + '_away'] = window_scores['score_q' + str(qtr) + '_away']
         
         scores['score_q' + str(qtr) + '_allow_home'] = scores['score_q' + str(qtr) + '_away'] - away_qtr_score
         scores['score_q' + str(qtr) + '_allow_away'] = scores['score_q' + str(qtr) + '_home'] - home_qtr_score
@@ -65,7 +169,7 @@ def calculate_scores(data: pd.DataFrame) -> pd.DataFrame:
         home_qtr_score = scores['score_q' + str(qtr) + '_home']
         away_qtr_score = scores['score_q' + str(qtr) + '_away']
     
-    scores['result'] = scores.apply(lambda row: 'home_win' if row['total_home_score'] > row['total_away_score'] else ('away_win' if row['total_home_score'] < row['total_away_score'] else 'tie'), axis=1)
+    scores['result'] = label_results(scores['total_home_score'], scores['total_away_score'])
     
     return scores
 
@@ -88,8 +192,9 @@ def calculate_conv_perc(data: pd.DataFrame) -> pd.DataFrame:
     away_conv_perc['third_down_conv_perc'] = (away_conv_perc['third_down_converted'] / (away_conv_perc['third_down_converted'] + away_conv_perc['third_down_failed'])) * 100
     away_conv_perc['fourth_down_conv_perc'] = (away_conv_perc['fourth_down_converted'] / (away_conv_perc['fourth_down_converted'] + away_conv_perc['fourth_down_failed'])) * 100
     
-    home_conv_perc['third_down_conv_perc_allow'] = away_conv_perc['third_down_conv_perc']
-    away_conv_perc['third_down_conv_perc_allow'] = home_conv_perc['third_down_conv_perc']
+    # The opponent's value of the same game, matched on game_id since a side can be missing from a game
+    home_conv_perc['third_down_conv_perc_allow'] = home_conv_perc['game_id'].map(away_conv_perc.set_index('game_id')['third_down_conv_perc'])
+    away_conv_perc['third_down_conv_perc_allow'] = away_conv_perc['game_id'].map(home_conv_perc.set_index('game_id')['third_down_conv_perc'])
     
     home_conv_perc.drop(columns=['third_down_converted', 'third_down_failed', 'fourth_down_converted', 'fourth_down_failed'], inplace=True)
     away_conv_perc.drop(columns=['third_down_converted', 'third_down_failed', 'fourth_down_converted', 'fourth_down_failed'], inplace=True)
@@ -112,8 +217,8 @@ def calculate_turnovers(data: pd.DataFrame) -> pd.DataFrame:
     home_turnovers['total_turnovers'] = home_turnovers['fumble'] + home_turnovers['interception']
     away_turnovers['total_turnovers'] = away_turnovers['fumble'] + away_turnovers['interception']
     
-    home_turnovers['total_turnovers_allow'] = away_turnovers['total_turnovers']
-    away_turnovers['total_turnovers_allow'] = home_turnovers['total_turnovers']
+    home_turnovers['total_turnovers_allow'] = home_turnovers['game_id'].map(away_turnovers.set_index('game_id')['total_turnovers'])
+    away_turnovers['total_turnovers_allow'] = away_turnovers['game_id'].map(home_turnovers.set_index('game_id')['total_turnovers'])
     
     home_turnovers.drop(columns=['fumble', 'interception'], inplace=True)
     away_turnovers.drop(columns=['fumble', 'interception'], inplace=True)
@@ -162,11 +267,14 @@ def penalties_and_yard_penalties_gained(data: pd.DataFrame) -> pd.DataFrame:
     home_penalties.columns = ['game_id', 'num_penalties_gained', 'yards_penalties_gained']
     away_penalties.columns = ['game_id', 'num_penalties_gained', 'yards_penalties_gained']
     
-    home_penalties['num_penalties_allowed'] = away_penalties['num_penalties_gained']
-    home_penalties['yards_penalties_allowed'] = away_penalties['yards_penalties_gained']
+    # Games where only one team was penalized are missing from the other side, so values are matched on game_id
+    home_gained = home_penalties.set_index('game_id')
+    away_gained = away_penalties.set_index('game_id')
+    home_penalties['num_penalties_allowed'] = home_penalties['game_id'].map(away_gained['num_penalties_gained'])
+    home_penalties['yards_penalties_allowed'] = home_penalties['game_id'].map(away_gained['yards_penalties_gained'])
     
-    away_penalties['num_penalties_allowed'] = home_penalties['num_penalties_gained']
-    away_penalties['yards_penalties_allowed'] = home_penalties['yards_penalties_gained']
+    away_penalties['num_penalties_allowed'] = away_penalties['game_id'].map(home_gained['num_penalties_gained'])
+    away_penalties['yards_penalties_allowed'] = away_penalties['game_id'].map(home_gained['yards_penalties_gained'])
     
     return pd.merge(home_penalties, away_penalties, on='game_id', suffixes=('_home', '_away'))
 
@@ -187,8 +295,8 @@ def calculate_fd_due_to_penalty_gained(data: pd.DataFrame) -> pd.DataFrame:
     home_fd_penalty.columns = ['game_id', 'fd_due_to_penalty_gained']
     away_fd_penalty.columns = ['game_id', 'fd_due_to_penalty_gained']
 
-    home_fd_penalty['fd_due_to_penalty_allow'] = away_fd_penalty['fd_due_to_penalty_gained']
-    away_fd_penalty['fd_due_to_penalty_allow'] = home_fd_penalty['fd_due_to_penalty_gained']
+    home_fd_penalty['fd_due_to_penalty_allow'] = home_fd_penalty['game_id'].map(away_fd_penalty.set_index('game_id')['fd_due_to_penalty_gained'])
+    away_fd_penalty['fd_due_to_penalty_allow'] = away_fd_penalty['game_id'].map(home_fd_penalty.set_index('game_id')['fd_due_to_penalty_gained'])
 
     
     return pd.merge(home_fd_penalty, away_fd_penalty, on='game_id', suffixes=('_home', '_away'))
@@ -296,64 +404,58 @@ def calculate_tot_play_count(data: pd.DataFrame) -> pd.DataFrame:
     
 #     return pd.merge(home_score_last_2_minutes_q4, away_score_last_2_minutes_q4, on='game_id')
 
-def calculate_score_last_2_minutes_q2(data: pd.DataFrame) -> pd.DataFrame:
+def calculate_late_game_scores(data: pd.DataFrame, window: str, window_scores: pd.DataFrame = None) -> pd.DataFrame:
     """
-    Calculate scores in the last two minutes of the second quarter for each team.
+    Calculate the scores of each team at the end of a late-game scoring window.
     
     Args:
         data (pd.DataFrame): DataFrame containing play-by-play data.
+        window (str): Name of a window in SCORE_WINDOWS, e.g. 'last_2_min_q2'.
+        window_scores (pd.DataFrame): Output of calculate_window_scores, computed from data if not given.
         
     Returns:
-        pd.DataFrame: DataFrame with scores in the last two minutes of the second quarter for each team.
+        pd.DataFrame: DataFrame with home and away scores at the end of the window for each game.
     """
+    if window_scores is None:
+        window_scores = calculate_window_scores(data, {window: SCORE_WINDOWS[window]})
     
-    # Filter data to last 2 minutes of 2nd quarter
-    last_2_min_q2 = data[(data['game_seconds_remaining'] <= 1920) & (data['game_seconds_remaining'] > 1800) & (data['qtr'] == 2)]
-
-    # Calculate score for home team in last 2 minutes of Q2
-    home_score_last_2_min_q2 = last_2_min_q2.groupby(['game_id', 'home_team'])['total_home_score'].max().reset_index()
-    home_score_last_2_min_q2.columns = ['game_id', 'home_team', 'score_last_2_min_q2_home']
-
-    # Calculate score for away team in last 2 minutes of Q2
-    away_score_last_2_min_q2 = last_2_min_q2.groupby(['game_id', 'away_team'])['total_away_score'].max().reset_index()
-    away_score_last_2_min_q2.columns = ['game_id', 'away_team', 'score_last_2_min_q2_away']
+    home_col = 'score_' + window + '_home'
+    away_col = 'score_' + window + '_away'
     
-    # Merge home and away scores
-    scores_last_2_min_q2 = pd.merge(home_score_last_2_min_q2, away_score_last_2_min_q2, on='game_id', how='outer')
+    games = data[['game_id', 'home_team', 'away_team']].drop_duplicates(subset='game_id')
+    late_scores = games.merge(window_scores[['game_id', home_col, away_col]], on='game_id', how='left')
     
-    # Fill NaN values with 0 (for games where there were no plays in the last 2 minutes of Q2)
-    scores_last_2_min_q2 = scores_last_2_min_q2.fillna(0)
+    # Fill NaN values with 0 (for games where there were no plays in the window)
+    late_scores[[home_col, away_col]] = late_scores[[home_col, away_col]].fillna(0)
     
-    return scores_last_2_min_q2
+    return late_scores[['game_id', 'home_team', home_col, 'away_team', away_col]]
 
-def calculate_score_last_2_minutes_q4(data: pd.DataFrame) -> pd.DataFrame:
+def calculate_score_last_2_minutes_q2(data: pd.DataFrame, window_scores: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Calculate scores in the last two minutes of the second quarter for each team.
+    
+    Args:
+        data (pd.DataFrame): DataFrame containing play-by-play data.
+        window_scores (pd.DataFrame): Output of calculate_window_scores, computed from data if not given.
+        
+    Returns:
+        pd.DataFrame: DataFrame with scores in the last two minutes of the second quarter for each team.
+    """
+    return calculate_late_game_scores(data, 'last_2_min_q2', window_scores)
+
+def calculate_score_last_2_minutes_q4(data: pd.DataFrame, window_scores: pd.DataFrame = None) -> pd.DataFrame:
     """
     Calculate scores in the last two minutes of the fourth quarter for each team.
     
     Args:
         data (pd.DataFrame): DataFrame containing play-by-play data.
+        window_scores (pd.DataFrame): Output of calculate_window_scores, computed from data if not given.
         
     Returns:
         pd.DataFrame: DataFrame with scores in the last two minutes of the fourth quarter for each team.
     """
-    # Filter data to last 2 minutes of 4th quarter
-    last_2_min_q4 = data[(data['game_seconds_remaining'] <= 120) & (data['qtr'] == 4)]
-    
-    # Calculate score for home team in last 2 minutes of Q4
-    home_score_last_2_minutes_q4 = last_2_min_q4.groupby(['game_id', 'home_team'])['total_home_score'].max().reset_index()
-    home_score_last_2_minutes_q4.columns = ['game_id', 'home_team', 'score_last_2_minutes_q4_home']
-    
-    # Calculate score for away team in last 2 minutes of Q4
-    away_score_last_2_minutes_q4 = last_2_min_q4.groupby(['game_id', 'away_team'])['total_away_score'].max().reset_index()
-    away_score_last_2_minutes_q4.columns = ['game_id', 'away_team', 'score_last_2_minutes_q4_away']
-    
-    # Merge home and away scores
-    scores_last_2_min_q4 = pd.merge(home_score_last_2_minutes_q4, away_score_last_2_minutes_q4, on='game_id', how='outer')
-    
-    # Fill NaN values with 0 (for games where there were no plays in the last 2 minutes of Q4)
-    scores_last_2_min_q4 = scores_last_2_min_q4.fillna(0)
-    
-    return scores_last_2_min_q4
+    return calculate_late_game_scores(data, 'last_2_minutes_q4', window_scores)
+
 def calculate_offensive_metrics(data: pd.DataFrame) -> pd.DataFrame:
     '''
     Calculate offensive metrics for each team.
@@ -614,3 +716,30 @@ def calculate_defensive_metrics(data: pd.DataFrame) -> pd.DataFrame:
     defensive_metrics_df = defensive_metrics_df.fillna(0)
     
     return defensive_metrics_df
+
+def add_season_and_week(games: pd.DataFrame, season_starts: dict = None) -> pd.DataFrame:
+    '''
+    Add the NFL season and week of each game.
+    
+    Games played in January and February belong to the season that started the previous
+    September, and weeks are counted in 7 day blocks from the first game of the season.
+    
+    Args:
+        games (pd.DataFrame): DataFrame with a game_date column.
+        season_starts (dict): Known first game date of each season, so games from part of a
+            season (e.g. a weekly update) are numbered from the real start of their season.
+        
+    Returns:
+        pd.DataFrame: Copy of the games with season and week columns.
+    '''
+    games = games.copy()
+    game_date = pd.to_datetime(games['game_date'])
+    
+    games['season'] = game_date.dt.year - (game_date.dt.month < 3).astype(int)
+    season_start = game_date.groupby(games['season']).transform('min')
+    if season_starts:
+        known_start = pd.to_datetime(games['season'].map(season_starts))
+        season_start = season_start.where(known_start.isna() | (season_start < known_start), known_start)
+    games['week'] = (game_date - season_start).dt.days // 7 + 1
+    
+    return games
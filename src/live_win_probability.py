@@ -0,0 +1,301 @@
+import argparse
+import json
+import math
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import expected_score
+
+# Standard deviation of the final home margin over a full game, in points
+MARGIN_STD = 13.45
+
+# Expected value of having the ball, in points
+POSSESSION_POINTS = 1.5
+
+GAME_SECONDS = 3600
+
+# Length of an overtime period; game_seconds_remaining counts down again in each one
+OVERTIME_SECONDS = 900
+
+_normal = NormalDist()
+
+def _value(play: dict, key: str, default=0):
+    """Read a play field, treating missing and NaN values as the default."""
+    value = play.get(key, default)
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return default
+    return value
+
+class GameState:
+    """
+    Incremental state of one game, updated with constant work per play.
+    """
+
+    def __init__(self, game_id, home_team: str, away_team: str, pregame_home_win_prob: float = 0.5):
+        """
+        Start a game at kickoff.
+
+        Args:
+            game_id: Identifier of the game.
+            home_team (str): Name of the home team.
+            away_team (str): Name of the away team.
+            pregame_home_win_prob (float): Home win probability before kickoff, e.g. from ELO.
+        """
+        self.game_id = game_id
+        self.home_team = home_team
+        self.away_team = away_team
+        self.pregame_home_win_prob = pregame_home_win_prob
+
+        # Full-game home margin implied by the pregame probability
+        clipped = min(max(pregame_home_win_prob, 1e-6), 1 - 1e-6)
+        self.pregame_spread = MARGIN_STD * _normal.inv_cdf(clipped)
+
+        self.play_id = None
+        self.qtr = 1
+        self.seconds_remaining = GAME_SECONDS
+        self.possession = None
+        self.score = {'home': 0, 'away': 0}
+        self.turnovers = {'home': 0, 'away': 0}
+        self.yards = {'home': 0, 'away': 0}
+        self.first_downs = {'home': 0, 'away': 0}
+        self.plays = {'home': 0, 'away': 0}
+
+    def update(self, play: dict):
+        """
+        Apply one play-by-play event, using the same columns calculate_post_priori reads.
+
+        Args:
+            play (dict): Play with total_home_score, total_away_score, game_seconds_remaining,
+                qtr, posteam_type, yards_gained, first down and turnover columns.
+        """
+        self.play_id = _value(play, 'play_id', self.play_id)
+        self.qtr = int(_value(play, 'qtr', self.qtr))
+        self.seconds_remaining = float(_value(play, 'game_seconds_remaining', self.seconds_remaining))
+
+        # Scores are running totals, so an out of order duplicate can never lower them
+        self.score['home'] = max(self.score['home'], _value(play, 'total_home_score', 0))
+        self.score['away'] = max(self.score['away'], _value(play, 'total_away_score', 0))
+
+        side = _value(play, 'posteam_type', None)
+        if side not in self.score:
+            return
+        self.possession = side
+        self.plays[side] += 1
+        self.yards[side] += _value(play, 'yards_gained')
+        self.first_downs[side] += _value(play, 'first_down_rush') + _value(play, 'first_down_pass') + _value(play, 'first_down_penalty')
+        # Counted like calculate_turnovers, every fumble rather than only the lost ones, so the
+        # live totals match the post-priori total_turnovers columns
+        self.turnovers[side] += _value(play, 'interception') + _value(play, 'fumble')
+
+    def home_win_probability(self) -> float:
+        """
+        Calculate the current home win probability.
+
+        The remaining margin is modelled as normal, centred on the current margin plus the share of
+        the pregame spread still to be played and the value of possession, with a spread that
+        shrinks with the square root of the time remaining.
+
+        Returns:
+            float: Probability of the home team winning.
+        """
+        margin = self.score['home'] - self.score['away']
+        remaining = max(self.seconds_remaining, 0) / GAME_SECONDS
+
+        if remaining == 0:
+            if margin == 0:
+                return self.pregame_home_win_prob
+            return 1.0 if margin > 0 else 0.0
+
+        possession = 0
+        if self.possession == 'home':
+            possession = POSSESSION_POINTS
+        elif self.possession == 'away':
+            possession = -POSSESSION_POINTS
+
+        expected_margin = margin + self.pregame_spread * remaining + possession * min(remaining * 4, 1)
+        return _normal.cdf(expected_margin / (MARGIN_STD * math.sqrt(remaining)))
+
+    def snapshot(self) -> dict:
+        """
+        Get the current state and win probability of the game.
+
+        Returns:
+            dict: Score, time, possession, per-side totals and home win probability.
+        """
+        update = {
+            'game_id': self.game_id,
+            'play_id': self.play_id,
+            'home_team': self.home_team,
+            'away_team': self.away_team,
+            'qtr': self.qtr,
+            'game_seconds_remaining': self.seconds_remaining,
+            'posteam_type': self.possession,
+            'home_score': self.score['home'],
+            'away_score': self.score['away']
+        }
+        for side in ['home', 'away']:
+            update['turnovers_' + side] = self.turnovers[side]
+            update['yards_gained_' + side] = self.yards[side]
+            update['first_downs_' + side] = self.first_downs[side]
+        update['home_win_prob'] = self.home_win_probability()
+        return update
+
+class LiveWinProbabilityConsumer:
+    """
+    Consume play-by-play events for any number of concurrent games and emit win probabilities.
+    """
+
+    def __init__(self, elo_ratings: dict, initial_elo: float = 1500):
+        """
+        Args:
+            elo_ratings (dict): Pregame ELO rating of each team.
+            initial_elo (float): Rating assumed for teams missing from elo_ratings.
+        """
+        self.elo_ratings = elo_ratings
+        self.initial_elo = initial_elo
+        self.games = {}
+
+    def process(self, play: dict) -> dict:
+        """
+        Update the state of the play's game and return its new win probability.
+
+        The game's state is dropped once its final play is processed, so the consumer only keeps
+        the games in progress.
+
+        Args:
+            play (dict): Play-by-play event with game_id, home_team and away_team.
+
+        Returns:
+            dict: Snapshot of the game after the play, with game_over set on its final play.
+        """
+        game = self.games.get(play['game_id'])
+        if game is None:
+            home_elo = self.elo_ratings.get(play['home_team'], self.initial_elo)
+            away_elo = self.elo_ratings.get(play['away_team'], self.initial_elo)
+            game = GameState(play['game_id'], play['home_team'], play['away_team'], float(expected_score(home_elo, away_elo)))
+            self.games[play['game_id']] = game
+
+        game.update(play)
+        snapshot = game.snapshot()
+        snapshot['game_over'] = is_final_play(play)
+        if snapshot['game_over']:
+            self.finish(play['game_id'])
+        return snapshot
+
+    def finish(self, game_id):
+        """
+        Drop the state of a finished game.
+
+        Args:
+            game_id: Identifier of the game.
+        """
+        self.games.pop(game_id, None)
+
+    def run(self, source):
+        """
+        Process every event of a source.
+
+        Args:
+            source (iterable): Play-by-play events as dicts.
+
+        Yields:
+            dict: Snapshot of the updated game after each play.
+        """
+        for play in source:
+            yield self.process(play)
+
+def is_final_play(play: dict) -> bool:
+    """
+    Check whether a play is the last event of its game.
+
+    Args:
+        play (dict): Play-by-play event, marked game_over by the replay or described as END GAME by the feed.
+
+    Returns:
+        bool: True for the final play of a game.
+    """
+    return bool(_value(play, 'game_over', False)) or str(_value(play, 'desc', '')).strip().upper() == 'END GAME'
+
+def file_replay_source(path: str, game_date: str = None, chunksize: int = 50000):
+    """
+    Replay a play-by-play CSV as a stream of events.
+
+    Plays of games on the same day are interleaved by elapsed game time, as they would arrive
+    during a Sunday slate, so every game of the day is in progress at the same time. The last play of
+    each game is marked game_over.
+
+    Args:
+        path (str): Play-by-play CSV file.
+        game_date (str): Only replay games played on this date.
+        chunksize (int): Rows read from the file at a time.
+
+    Yields:
+        dict: One play per event.
+    """
+    pending = []
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False):
+        if game_date is not None:
+            chunk = chunk[chunk['game_date'] == game_date]
+        if chunk.empty:
+            continue
+
+        # The file is in chronological order, so every day before the chunk's last one is complete
+        plays = pd.concat(pending + [chunk])
+        last_day = plays['game_date'].max()
+        pending = [plays[plays['game_date'] == last_day]]
+        yield from _interleave_days(plays[plays['game_date'] < last_day])
+
+    if pending:
+        yield from _interleave_days(pd.concat(pending))
+
+def elapsed_seconds(plays: pd.DataFrame) -> np.ndarray:
+    """
+    Get the game time elapsed at each play, increasing through overtime.
+
+    game_seconds_remaining starts again in every overtime period, so on its own it would
+    order overtime plays before the end of regulation.
+
+    Args:
+        plays (pd.DataFrame): Plays with qtr and game_seconds_remaining.
+
+    Returns:
+        np.ndarray: Seconds elapsed since kickoff.
+    """
+    qtr = plays['qtr'].fillna(1).to_numpy(dtype=float)
+    remaining = plays['game_seconds_remaining'].to_numpy(dtype=float)
+    overtime = GAME_SECONDS + (qtr - 4) * OVERTIME_SECONDS - remaining
+    return np.where(qtr > 4, overtime, GAME_SECONDS - remaining)
+
+def _interleave_days(plays: pd.DataFrame):
+    for day, day_plays in plays.groupby('game_date', sort=True):
+        day_plays = day_plays.assign(elapsed=elapsed_seconds(day_plays))
+        day_plays = day_plays.sort_values(['elapsed', 'game_id', 'play_id'], kind='stable').drop(columns='elapsed')
+        day_plays = day_plays.assign(game_over=~day_plays['game_id'].duplicated(keep='last'))
+        yield from day_plays.to_dict('records')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay play-by-play data and print live win probabilities.')
+    parser.add_argument('--plays', default='data/raw/NFL Play by Play 2009-2018 (v5).csv', help='Play-by-play CSV to replay.')
+    parser.add_argument('--ratings', required=True, help='JSON file mapping team name to pregame ELO rating.')
+    parser.add_argument('--game-date', default=None, help='Only replay games played on this date (YYYY-MM-DD).')
+    parser.add_argument('--output', default=None, help='Optional CSV path for every update.')
+    args = parser.parse_args()
+
+    with open(args.ratings) as f:
+        consumer = LiveWinProbabilityConsumer(json.load(f))
+
+    updates = []
+    for update in consumer.run(file_replay_source(args.plays, game_date=args.game_date)):
+        if args.output:
+            updates.append(update)
+        if update['game_over']:
+            print(f"{update['game_id']}: {update['home_team']} {update['home_score']} - {update['away_score']} {update['away_team']}, "
+                  f"home win probability {update['home_win_prob']:.3f}")
+
+    if args.output:
+        pd.DataFrame(updates).to_csv(args.output, index=False)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,604 @@
+import argparse
+import json
+import os
+import pickle
+import queue
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import calculate_rating_history, expected_score, glicko_expected_score, latest_ratings
+from src.preprocessing import FeaturePreprocessor
+from src.training_matrix import latest_team_state, side_columns
+
+MANIFEST = 'manifest.json'
+
+# Rolling state columns of the training matrix, without the side (last_3_games_score_q1)
+ROLLING_STATE = re.compile(r'last_(\d+)_games_')
+
+# Feature columns derived from the two teams' ratings rather than from the team state
+ELO_FEATURES = ['home_elo', 'away_elo', 'home_rd', 'away_rd', 'elo_diff', 'elo_home_win_prob']
+
+def team_state_columns(features: pd.DataFrame) -> list:
+    """
+    Find the per-team state columns of a feature set, the ones the service can rebuild for any matchup.
+
+    Rating features are calculated from the ratings instead, and game-level columns such as the
+    training matrix's h2h_* record have no side, so neither is part of the team state.
+
+    Args:
+        features (pd.DataFrame): Training matrix or other feature set.
+
+    Returns:
+        list: (state name, home column, away column) of every per-team state column.
+    """
+    return [pair for pair in side_columns(features) if pair[1] not in ELO_FEATURES and pair[2] not in ELO_FEATURES]
+
+class CompactModel:
+    """
+    Fitted random forest or logistic regression as plain numpy arrays, so serving loads and
+    evaluates it without importing scikit-learn.
+    """
+
+    def __init__(self, arrays: dict):
+        """
+        Args:
+            arrays (dict): Output of compact_model, or the arrays of its saved .npz file.
+        """
+        self.arrays = {name: np.asarray(value) for name, value in arrays.items()}
+        self.kind = str(self.arrays['kind'])
+        self.classes_ = self.arrays['classes']
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            np.savez(f, **self.arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as arrays:
+            return cls(dict(arrays))
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Calculate class probabilities the way the scikit-learn model does.
+
+        Args:
+            X (np.ndarray): Feature matrix.
+
+        Returns:
+            np.ndarray: One column per class in classes_.
+        """
+        a = self.arrays
+        if self.kind == 'logistic_regression':
+            z = ((X - a['mean']) / a['scale']) @ a['coef'] + a['intercept']
+            p = 1 / (1 + np.exp(-z))
+            return np.column_stack([1 - p, p])
+
+        # Walk every tree at once: each sample moves one level down in every tree per step
+        X = X.astype(np.float32)
+        node = np.repeat(a['roots'][:, None], len(X), axis=1)
+        samples = np.arange(len(X))[None, :]
+        for _ in range(int(a['max_depth'])):
+            left = a['left'][node]
+            go_left = X[samples, a['feature'][node]] <= a['threshold'][node]
+            node = np.where(left < 0, node, np.where(go_left, left, a['right'][node]))
+        return a['value'][node].mean(axis=0)
+
+def compact_model(model) -> CompactModel:
+    """
+    Convert a fitted model from build_model into a CompactModel.
+
+    Args:
+        model: Fitted RandomForestClassifier, or StandardScaler + LogisticRegression pipeline.
+
+    Returns:
+        CompactModel: The same model as arrays, or None for models that cannot be converted.
+    """
+    if hasattr(model, 'estimators_'):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        # Child indices are shifted to the concatenated node arrays; leaves keep -1
+        left = np.concatenate([np.where(tree.children_left < 0, -1, tree.children_left + offset) for tree, offset in zip(trees, offsets)])
+        right = np.concatenate([np.where(tree.children_right < 0, -1, tree.children_right + offset) for tree, offset in zip(trees, offsets)])
+        value = np.concatenate([tree.value[:, 0, :] for tree in trees])
+        return CompactModel({
+            'kind': 'random_forest',
+            'classes': model.classes_,
+            'roots': offsets,
+            'left': left,
+            'right': right,
+            'feature': np.concatenate([np.maximum(tree.feature, 0) for tree in trees]),
+            'threshold': np.concatenate([tree.threshold for tree in trees]),
+            'value': value / value.sum(axis=1, keepdims=True),
+            'max_depth': max(tree.max_depth for tree in trees)
+        })
+    steps = getattr(model, 'named_steps', {})
+    if list(steps) == ['standardscaler', 'logisticregression'] and len(model.classes_) == 2:
+        scaler, regression = steps['standardscaler'], steps['logisticregression']
+        return CompactModel({
+            'kind': 'logistic_regression',
+            'classes': model.classes_,
+            'mean': scaler.mean_,
+            'scale': scaler.scale_,
+            'coef': regression.coef_[0],
+            'intercept': regression.intercept_[0]
+        })
+    return None
+
+def build_team_state(post_priori: pd.DataFrame, state_columns: list) -> pd.DataFrame:
+    """
+    Get the latest per-team state of every team, after its most recent game.
+
+    The features of the training matrix describe teams before each game, so a team's last
+    matrix row would leave out its most recent game. The state is rebuilt from the post-game
+    rolling averages instead, in step with the post-game ratings from latest_ratings.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data the training matrix was assembled from.
+        state_columns (list): Side-free state names wanted, e.g. last_3_games_score_q1.
+
+    Returns:
+        pd.DataFrame: One row per team, indexed by team name, with the state columns that can
+        be rebuilt; other names are left out.
+    """
+    windows = sorted({int(match.group(1)) for match in map(ROLLING_STATE.match, state_columns) if match})
+    if not windows:
+        return pd.DataFrame(index=pd.Index([], name='team'))
+    state = latest_team_state(post_priori, tuple(windows))
+    return state[[col for col in state_columns if col in state.columns]]
+
+def export_artifacts(path: str, features: pd.DataFrame, post_priori: pd.DataFrame = None, model_name: str = 'random_forest', model_params: dict = None, k: float = 20,
+                     engine: str = 'elo', preprocessor: FeaturePreprocessor = None, selection: str = None) -> str:
+    """
+    Fit a model on every game and write the artifacts the prediction service loads.
+
+    The model is trained on the rating features and the per-team state columns only, the
+    features the service can build for a future matchup (see team_state_columns), with the
+    team state rebuilt after every team's most recent game by build_team_state.
+
+    The files of each export carry its version in their name and the manifest is replaced last,
+    so a running service never sees a half-written export.
+
+    Args:
+        path (str): Artifact directory.
+        features (pd.DataFrame): Training matrix, or another feature set with game_id, game_date,
+            home_team, away_team and result.
+        post_priori (pd.DataFrame): Post-priori data the team state is rebuilt from, required
+            unless model_name is None.
+        model_name (str): Model passed to build_model, or None to serve ELO probabilities only.
+        model_params (dict): Keyword arguments for the model.
+        k (float): K-factor for ELO rating calculation.
+        engine (str): Rating engine, 'elo' or 'glicko2'.
+        preprocessor (FeaturePreprocessor): Preprocessor the model is trained behind, fitted here on
+            the servable columns of every game if it is not fitted yet; a copy is exported with the
+            model so serving applies exactly the same transform.
+        selection (str): Preprocessor feature selection, e.g. 'top_10_features', or None for all features.
+
+    Returns:
+        str: Version of the exported artifacts.
+    """
+    from src.backtest import build_model, feature_columns, prepare_backtest_data
+
+    os.makedirs(path, exist_ok=True)
+    # The suffix keeps two exports started in the same second from overwriting each other's files
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    games = prepare_backtest_data(features, k=k, engine=engine)
+    history = calculate_rating_history(games, engine=engine, **({'k': k} if engine == 'elo' else {}))
+    ratings = latest_ratings(history)
+    if model_name is not None and post_priori is None:
+        raise ValueError('Exporting a model needs the post_priori data to rebuild the team state from')
+    pairs = team_state_columns(features)
+    team_state = build_team_state(post_priori, [name for name, _, _ in pairs]) if post_priori is not None else pd.DataFrame(index=pd.Index([], name='team'))
+
+    # Which side and state column every servable feature is rebuilt from
+    team_features = {col: ['home', name] for name, col, _ in pairs if name in team_state.columns}
+    team_features.update({col: ['away', name] for name, _, col in pairs if name in team_state.columns})
+    servable = [col for col in feature_columns(games) if col in ELO_FEATURES or col in team_features]
+
+    manifest = {
+        'version': version,
+        'engine': engine,
+        'model': None,
+        'feature_columns': [],
+        'team_features': {},
+        'preprocessor': None,
+        'feature_selection': None,
+        'team_state': f'team_state_{version}.csv',
+        'elo_ratings': f'elo_ratings_{version}.json'
+    }
+
+    if model_name is not None:
+        if preprocessor is not None:
+            if not preprocessor.fitted:
+                preprocessor.fit(games[servable + ['target']], target_column='target')
+            unservable = [col for col in preprocessor.columns if col not in servable]
+            if unservable or preprocessor.categorical_columns:
+                raise ValueError(f"The service cannot build the preprocessor's columns {', '.join(unservable or preprocessor.categorical_columns)}")
+            columns = preprocessor.columns
+            X = preprocessor.transform_array(games, selection).astype(np.float32)
+            manifest['preprocessor'] = f'preprocessor_{version}.json'
+            manifest['feature_selection'] = selection
+            preprocessor.save(os.path.join(path, manifest['preprocessor']))
+        else:
+            columns = servable
+            X = games[columns].fillna(0).to_numpy(dtype=np.float32)
+        model = build_model(model_name, model_params)
+        model.fit(X, games['target'].to_numpy())
+        manifest['model'] = f'model_{version}.pkl'
+        compact = compact_model(model)
+        if compact is not None:
+            manifest['compact_model'] = f'model_{version}.npz'
+            compact.save(os.path.join(path, manifest['compact_model']))
+        manifest['feature_columns'] = columns
+        manifest['team_features'] = {col: team_features[col] for col in columns if col in team_features}
+        with open(os.path.join(path, manifest['model']), 'wb') as f:
+            pickle.dump(model, f)
+
+    team_state.to_csv(os.path.join(path, manifest['team_state']))
+    if engine == 'glicko2':
+        manifest['rating_deviations'] = f'rating_deviations_{version}.json'
+        with open(os.path.join(path, manifest['rating_deviations']), 'w') as f:
+            json.dump(latest_ratings(history, 'rd_post'), f)
+    with open(os.path.join(path, manifest['elo_ratings']), 'w') as f:
+        json.dump(ratings, f)
+
+    tmp_manifest = os.path.join(path, MANIFEST + '.tmp')
+    with open(tmp_manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_manifest, os.path.join(path, MANIFEST))
+
+    return version
+
+class PredictionArtifacts:
+    """
+    Immutable snapshot of a loaded model, team state and ELO ratings.
+    """
+
+    def __init__(self, path: str):
+        """
+        Load the artifacts referenced by the manifest and precompute the per-team feature tables.
+
+        Args:
+            path (str): Artifact directory written by export_artifacts.
+        """
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+
+        self.version = manifest['version']
+        self.engine = manifest.get('engine', 'elo')
+        self.feature_columns = manifest['feature_columns']
+
+        # Model columns are the preprocessor's raw inputs, transformed after they are gathered
+        self.preprocessor = None
+        self.feature_selection = manifest.get('feature_selection')
+        if manifest.get('preprocessor'):
+            self.preprocessor = FeaturePreprocessor.load(os.path.join(path, manifest['preprocessor']))
+            if self.preprocessor.categorical_columns:
+                raise ValueError('Categorical preprocessor columns cannot be built from team state or ratings')
+
+        self.model = None
+        if manifest.get('compact_model'):
+            # Loading the pickled model would import scikit-learn, which dominates a one-off prediction
+            self.model = CompactModel.load(os.path.join(path, manifest['compact_model']))
+        elif manifest['model'] is not None:
+            with open(os.path.join(path, manifest['model']), 'rb') as f:
+                self.model = pickle.load(f)
+
+        with open(os.path.join(path, manifest['elo_ratings'])) as f:
+            ratings = json.load(f)
+        team_state = pd.read_csv(os.path.join(path, manifest['team_state']), index_col=0)
+
+        self.teams = sorted(set(ratings) | set(team_state.index))
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        self.elo = np.array([ratings.get(team, 1500.0) for team in self.teams])
+        self.rd = None
+        if manifest.get('rating_deviations'):
+            with open(os.path.join(path, manifest['rating_deviations'])) as f:
+                deviations = json.load(f)
+            self.rd = np.array([deviations.get(team, 350.0) for team in self.teams])
+
+        # Split the model columns into home state, away state and rating columns once, so a
+        # request only needs fancy indexing into these tables
+        team_features = manifest.get('team_features', {})
+        team_state = team_state.reindex(self.teams).fillna(0)
+        self.home_positions, home_cols = [], []
+        self.away_positions, away_cols = [], []
+        self.elo_positions, self.elo_cols = [], []
+        for position, col in enumerate(self.feature_columns):
+            if col in ELO_FEATURES:
+                self.elo_positions.append(position)
+                self.elo_cols.append(col)
+            elif col in team_features and team_features[col][0] == 'home':
+                self.home_positions.append(position)
+                home_cols.append(team_features[col][1])
+            elif col in team_features:
+                self.away_positions.append(position)
+                away_cols.append(team_features[col][1])
+            else:
+                raise ValueError(f'Cannot build feature {col!r} from team state or ratings')
+
+        self.home_table = team_state[home_cols].to_numpy(dtype=np.float32)
+        self.away_table = team_state[away_cols].to_numpy(dtype=np.float32)
+
+    def team_indices(self, teams: list) -> np.ndarray:
+        """
+        Map team names to row positions in the feature tables.
+
+        Args:
+            teams (list): Team names.
+
+        Returns:
+            np.ndarray: Row position of each team.
+        """
+        try:
+            return np.array([self.team_index[team] for team in teams], dtype=int)
+        except KeyError as e:
+            raise ValueError(f'Unknown team: {e.args[0]}') from None
+
+    def predict(self, home_teams: list, away_teams: list) -> dict:
+        """
+        Calculate home win probabilities for a batch of matchups.
+
+        Args:
+            home_teams (list): Home team of each matchup.
+            away_teams (list): Away team of each matchup.
+
+        Returns:
+            dict: Arrays of ELO and model home win probabilities.
+        """
+        home_idx = self.team_indices(home_teams)
+        away_idx = self.team_indices(away_teams)
+
+        home_elo = self.elo[home_idx]
+        away_elo = self.elo[away_idx]
+        if self.rd is None:
+            home_rd = away_rd = np.zeros(len(home_idx))
+            elo_prob = expected_score(home_elo, away_elo)
+        else:
+            home_rd, away_rd = self.rd[home_idx], self.rd[away_idx]
+            elo_prob = glicko_expected_score(home_elo, away_elo, home_rd, away_rd)
+
+        if self.model is None:
+            return {'elo_home_win_prob': elo_prob, 'home_win_prob': elo_prob}
+
+        X = np.empty((len(home_idx), len(self.feature_columns)), dtype=np.float32)
+        X[:, self.home_positions] = self.home_table[home_idx]
+        X[:, self.away_positions] = self.away_table[away_idx]
+        elo_features = {'home_elo': home_elo, 'away_elo': away_elo, 'home_rd': home_rd, 'away_rd': away_rd,
+                        'elo_diff': home_elo - away_elo, 'elo_home_win_prob': elo_prob}
+        for position, col in zip(self.elo_positions, self.elo_cols):
+            X[:, position] = elo_features[col]
+
+        if self.preprocessor is not None:
+            X = self.preprocessor.scale_and_select(X, self.feature_selection).astype(np.float32)
+
+        classes = list(self.model.classes_)
+        model_prob = self.model.predict_proba(X)[:, classes.index(1)] if 1 in classes else np.zeros(len(X))
+
+        return {'elo_home_win_prob': elo_prob, 'home_win_prob': model_prob}
+
+class PredictionService:
+    """
+    In-process prediction API that micro-batches concurrent requests and hot-reloads its artifacts.
+    """
+
+    def __init__(self, path: str, max_batch_size: int = 256, max_wait_ms: float = 2, reload_interval: float = 30):
+        """
+        Load the artifacts and start the batching and reload threads.
+
+        Args:
+            path (str): Artifact directory written by export_artifacts.
+            max_batch_size (int): Largest number of queued matchups predicted together.
+            max_wait_ms (float): How long the batcher waits for more requests after the first one.
+            reload_interval (float): Seconds between manifest checks, or None to disable hot reload.
+        """
+        self.path = path
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.reload_interval = reload_interval
+
+        self.artifacts = PredictionArtifacts(path)
+        self._manifest_mtime = os.path.getmtime(os.path.join(path, MANIFEST))
+
+        self._requests = queue.Queue()
+        self._stopped = threading.Event()
+        self._threads = [threading.Thread(target=self._batch_loop, daemon=True)]
+        if reload_interval:
+            self._threads.append(threading.Thread(target=self._reload_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        """Stop the batching and reload threads."""
+        self._stopped.set()
+        self._requests.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def reload(self) -> bool:
+        """
+        Load the artifacts again if the manifest changed since the last load.
+
+        The new snapshot is fully loaded before it replaces the current one, so requests keep
+        being answered from the old artifacts while the reload is in progress.
+
+        Returns:
+            bool: True if new artifacts were loaded.
+        """
+        mtime = os.path.getmtime(os.path.join(self.path, MANIFEST))
+        if mtime == self._manifest_mtime:
+            return False
+        self.artifacts = PredictionArtifacts(self.path)
+        self._manifest_mtime = mtime
+        return True
+
+    def _reload_loop(self):
+        while not self._stopped.wait(self.reload_interval):
+            try:
+                self.reload()
+            except (OSError, ValueError) as e:
+                print(f'Artifact reload failed, keeping version {self.artifacts.version}: {e}')
+
+    def _batch_loop(self):
+        while not self._stopped.is_set():
+            first = self._requests.get()
+            if first is None:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list):
+        try:
+            results = self.predict_batch([request[0] for request in batch], [request[1] for request in batch])
+        except ValueError:
+            # One bad team name should only fail its own request
+            for home_team, away_team, future in batch:
+                try:
+                    future.set_result(self.predict_batch([home_team], [away_team])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            # Anything else fails the whole batch, but must not kill the batching thread
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def predict_batch(self, home_teams: list, away_teams: list) -> list:
+        """
+        Predict a batch of matchups directly, without going through the batching queue.
+
+        Args:
+            home_teams (list): Home team of each matchup.
+            away_teams (list): Away team of each matchup.
+
+        Returns:
+            list: One dict per matchup with the ELO and model home win probabilities.
+        """
+        artifacts = self.artifacts
+        probs = artifacts.predict(home_teams, away_teams)
+        return [{
+            'home_team': home_team,
+            'away_team': away_team,
+            'home_win_prob': float(probs['home_win_prob'][i]),
+            'elo_home_win_prob': float(probs['elo_home_win_prob'][i]),
+            'predicted_winner': home_team if probs['home_win_prob'][i] > 0.5 else away_team,
+            'version': artifacts.version
+        } for i, (home_team, away_team) in enumerate(zip(home_teams, away_teams))]
+
+    def predict(self, home_team: str, away_team: str, timeout: float = None) -> dict:
+        """
+        Predict a single matchup, batched together with other concurrent requests.
+
+        Args:
+            home_team (str): Name of the home team.
+            away_team (str): Name of the away team.
+            timeout (float): Seconds to wait for the result.
+
+        Returns:
+            dict: ELO and model home win probabilities for the matchup.
+        """
+        future = Future()
+        self._requests.put((home_team, away_team, future))
+        return future.result(timeout=timeout)
+
+def make_handler(service: PredictionService, timeout: float = 10):
+    """
+    Build an HTTP request handler bound to a prediction service.
+
+    POST /predict accepts {"home_team": ..., "away_team": ...} or {"games": [{...}, ...]},
+    GET /health returns the loaded artifact version.
+
+    Args:
+        service (PredictionService): Service answering the requests.
+        timeout (float): Seconds to wait for a batched prediction before answering 504.
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass.
+    """
+    class PredictionHandler(BaseHTTPRequestHandler):
+
+        def _send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path != '/health':
+                self._send_json(404, {'error': 'not found'})
+                return
+            self._send_json(200, {'status': 'ok', 'version': service.artifacts.version})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send_json(404, {'error': 'not found'})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if 'games' in request:
+                    games = request['games']
+                    result = service.predict_batch([game['home_team'] for game in games], [game['away_team'] for game in games])
+                else:
+                    result = service.predict(request['home_team'], request['away_team'], timeout=timeout)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except TimeoutError:
+                self._send_json(504, {'error': f'no prediction within {timeout} seconds'})
+                return
+            except Exception as e:
+                self._send_json(500, {'error': str(e)})
+                return
+            self._send_json(200, result)
+
+        def log_message(self, format, *args):
+            pass
+
+    return PredictionHandler
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve ELO and model win probabilities over HTTP.')
+    parser.add_argument('--artifacts', default='data/artifacts', help='Artifact directory written by export_artifacts.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--reload-interval', type=float, default=30)
+    parser.add_argument('--timeout', type=float, default=10, help='Seconds to wait for a prediction before answering 504.')
+    args = parser.parse_args()
+
+    service = PredictionService(args.artifacts, reload_interval=args.reload_interval)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service, timeout=args.timeout))
+    print(f'Serving artifacts {service.artifacts.version} on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    main()
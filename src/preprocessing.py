@@ -0,0 +1,316 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import RATING_ENGINES
+
+PREPROCESSOR_FORMAT = 1
+
+# Final score columns of post_priori, known only after the game they describe
+OUTCOME_COLUMNS = ['total_home_score', 'total_away_score', 'point_diff']
+
+# Identifier, label and outcome columns that preprocess_data never treats as features
+EXCLUDED_COLUMNS = ['game_id', 'season', 'week', 'target', 'result'] + OUTCOME_COLUMNS
+
+def fingerprint_dataset(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hash a feature dataset file so a fitted preprocessor can be tied to the data it was fitted on.
+
+    Args:
+        path (str): Feature dataset file.
+        chunk_size (int): Bytes read at a time.
+
+    Returns:
+        str: SHA-256 hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def preprocessor_path(dataset_path: str) -> str:
+    """
+    Get the path a dataset's fitted preprocessor is stored at, next to the dataset itself.
+
+    Args:
+        dataset_path (str): Feature dataset file, e.g. data/processed/averages/last_10_games.csv.
+
+    Returns:
+        str: Path of the preprocessor JSON file.
+    """
+    return os.path.splitext(dataset_path)[0] + '.preprocessor.json'
+
+class FeaturePreprocessor:
+    """
+    Fit-once replacement of preprocess_data: scaling, one-hot encoding and top-k feature selection
+    whose fitted state is saved to JSON and reapplied to new rows without refitting.
+    """
+
+    def __init__(self, k_features: tuple = (10, 25), categorical_columns: list = None):
+        """
+        Args:
+            k_features (tuple): Sizes of the top-k feature selections, as in preprocess_data.
+            categorical_columns (list): Columns to one-hot encode before scaling.
+        """
+        self.k_features = tuple(k_features)
+        self.categorical_columns = list(categorical_columns or [])
+        self.columns = None
+        self.categories = {}
+        self.feature_names = None
+        self.mean = None
+        self.scale = None
+        self.selections = {}
+        self.dataset_fingerprint = None
+
+    @property
+    def fitted(self) -> bool:
+        return self.mean is not None
+
+    def selection_names(self) -> list:
+        """
+        Get the names of the feature selections this preprocessor fits.
+
+        Returns:
+            list: 'all_features' followed by one 'top_<k>_features' name per k.
+        """
+        return ['all_features'] + [f'top_{k}_features' for k in self.k_features]
+
+    def clone(self):
+        """
+        Get an unfitted preprocessor with the same settings, e.g. to fit once per backtest fold.
+
+        Returns:
+            FeaturePreprocessor: Unfitted preprocessor.
+        """
+        return FeaturePreprocessor(self.k_features, self.categorical_columns)
+
+    def _encode(self, frame: pd.DataFrame) -> np.ndarray:
+        # Numeric columns followed by one indicator column per fitted category
+        blocks = [frame[self.columns].fillna(0).to_numpy(dtype=np.float64)]
+        for col in self.categorical_columns:
+            values = frame[col].to_numpy()
+            blocks.append((values[:, None] == np.array(self.categories[col], dtype=object)[None, :]).astype(np.float64))
+        return np.hstack(blocks)
+
+    def fit(self, data: pd.DataFrame, target_column: str = 'result', dataset_path: str = None):
+        """
+        Fit the encoder categories, scaler statistics and feature selections.
+
+        Args:
+            data (pd.DataFrame): Feature dataset with the target column.
+            target_column (str): Name of the target column.
+            dataset_path (str): File the data was loaded from, fingerprinted to version the fitted state.
+
+        Returns:
+            FeaturePreprocessor: The fitted preprocessor.
+        """
+        from sklearn.feature_selection import SelectKBest, f_classif
+
+        excluded = set(EXCLUDED_COLUMNS + [target_column] + self.categorical_columns)
+        self.columns = [col for col in data.select_dtypes(include=['number']).columns if col not in excluded]
+        self.categories = {col: sorted(data[col].dropna().unique().tolist()) for col in self.categorical_columns}
+        self.feature_names = self.columns + [f'{col}_{category}' for col in self.categorical_columns for category in self.categories[col]]
+
+        X = self._encode(data)
+        self.mean = X.mean(axis=0)
+        self.scale = X.std(axis=0)
+        self.scale[self.scale == 0] = 1
+        X_scaled = (X - self.mean) / self.scale
+
+        y = data[target_column]
+        self.selections = {}
+        for k in self.k_features:
+            selector = SelectKBest(f_classif, k=min(k, X_scaled.shape[1])).fit(X_scaled, y)
+            self.selections[f'top_{k}_features'] = np.flatnonzero(selector.get_support()).tolist()
+
+        self.dataset_fingerprint = fingerprint_dataset(dataset_path) if dataset_path else None
+        return self
+
+    def transform_array(self, frame: pd.DataFrame, selection: str = None) -> np.ndarray:
+        """
+        Encode, scale and select features of new rows in one vectorized pass.
+
+        Args:
+            frame (pd.DataFrame): Rows with the fitted numeric and categorical columns.
+            selection (str): 'top_10_features', 'top_25_features', ... or None for all features.
+
+        Returns:
+            np.ndarray: Transformed feature matrix.
+        """
+        if not self.fitted:
+            raise ValueError('FeaturePreprocessor must be fitted or loaded before transform')
+        return self.scale_and_select(self._encode(frame), selection)
+
+    def scale_and_select(self, X: np.ndarray, selection: str = None) -> np.ndarray:
+        """
+        Scale and select an already encoded feature matrix, for callers that build the raw
+        columns themselves, such as the prediction service.
+
+        Args:
+            X (np.ndarray): Matrix with the columns of feature_names.
+            selection (str): Selection name, or None for all features.
+
+        Returns:
+            np.ndarray: Transformed feature matrix.
+        """
+        X_scaled = (X - self.mean) / self.scale
+        if selection is None or selection == 'all_features':
+            return X_scaled
+        return X_scaled[:, self.selections[selection]]
+
+    def selected_columns(self, selection: str = None) -> list:
+        """
+        Get the feature names of a selection.
+
+        Args:
+            selection (str): Selection name, or None for all features.
+
+        Returns:
+            list: Feature names in transform order.
+        """
+        if selection is None or selection == 'all_features':
+            return list(self.feature_names)
+        return [self.feature_names[i] for i in self.selections[selection]]
+
+    def transform(self, frame: pd.DataFrame, selection: str = None) -> pd.DataFrame:
+        """
+        Transform new rows into a DataFrame with the selected feature names.
+
+        Args:
+            frame (pd.DataFrame): Rows with the fitted numeric and categorical columns.
+            selection (str): Selection name, or None for all features.
+
+        Returns:
+            pd.DataFrame: Transformed features indexed like frame.
+        """
+        return pd.DataFrame(self.transform_array(frame, selection), columns=self.selected_columns(selection), index=frame.index)
+
+    def datasets(self, data: pd.DataFrame, target_column: str = 'result') -> dict:
+        """
+        Transform a dataset into the same outputs preprocess_data returns, without refitting.
+
+        Args:
+            data (pd.DataFrame): Feature dataset with the target column.
+            target_column (str): Name of the target column.
+
+        Returns:
+            dict: 'all_features' and one DataFrame per top-k selection, plus the 'target' column.
+        """
+        X_scaled = self.transform_array(data)
+        datasets = {'all_features': pd.DataFrame(X_scaled, columns=self.feature_names)}
+        for selection, positions in self.selections.items():
+            datasets[selection] = pd.DataFrame(X_scaled[:, positions], columns=self.selected_columns(selection))
+        datasets['target'] = data[target_column]
+        return datasets
+
+    def save(self, path: str):
+        """
+        Save the fitted state to JSON.
+
+        Args:
+            path (str): Output file, see preprocessor_path for the conventional location.
+        """
+        state = {
+            'format': PREPROCESSOR_FORMAT,
+            'dataset_fingerprint': self.dataset_fingerprint,
+            'k_features': list(self.k_features),
+            'columns': self.columns,
+            'categorical_columns': self.categorical_columns,
+            'categories': self.categories,
+            'feature_names': self.feature_names,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'selections': self.selections
+        }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dataset_path: str = None):
+        """
+        Load a fitted preprocessor, optionally checking it was fitted on the given dataset.
+
+        Args:
+            path (str): File written by save.
+            dataset_path (str): Feature dataset the preprocessor must have been fitted on.
+
+        Returns:
+            FeaturePreprocessor: The fitted preprocessor.
+        """
+        with open(path) as f:
+            state = json.load(f)
+        if state['format'] != PREPROCESSOR_FORMAT:
+            raise ValueError(f"Unsupported preprocessor format {state['format']} in {path}")
+        if dataset_path is not None and state['dataset_fingerprint'] != fingerprint_dataset(dataset_path):
+            raise ValueError(f'{path} was fitted on a different version of {dataset_path}')
+
+        preprocessor = cls(state['k_features'], state['categorical_columns'])
+        preprocessor.dataset_fingerprint = state['dataset_fingerprint']
+        preprocessor.columns = state['columns']
+        preprocessor.categories = state['categories']
+        preprocessor.feature_names = state['feature_names']
+        preprocessor.mean = np.array(state['mean'])
+        preprocessor.scale = np.array(state['scale'])
+        preprocessor.selections = state['selections']
+        return preprocessor
+
+def fit_dataset_preprocessor(dataset_path: str, target_column: str = 'result', k_features: tuple = (10, 25),
+                             categorical_columns: list = None, engine: str = None) -> FeaturePreprocessor:
+    """
+    Fit a preprocessor on a feature dataset file and store it next to the dataset.
+
+    Args:
+        dataset_path (str): Training matrix or feature dataset CSV.
+        target_column (str): Name of the target column.
+        k_features (tuple): Sizes of the top-k feature selections.
+        categorical_columns (list): Columns to one-hot encode.
+        engine (str): Rating engine, 'elo' or 'glicko2', to also fit on the pre-game rating features
+            that prepare_backtest_data adds, against its binary target. None fits on the file as is.
+
+    Returns:
+        FeaturePreprocessor: The fitted preprocessor.
+    """
+    from src.backtest import load_features
+
+    data = load_features(dataset_path)
+    # The training matrix falls back to CSV without a parquet engine; fingerprint the file actually read
+    csv_path = os.path.splitext(dataset_path)[0] + '.csv'
+    if not os.path.exists(dataset_path) and os.path.exists(csv_path):
+        dataset_path = csv_path
+    if engine is not None:
+        from src.backtest import prepare_backtest_data
+        data = prepare_backtest_data(data, engine=engine)
+        target_column = 'target'
+    if target_column not in data.columns:
+        raise ValueError(f'{dataset_path} has no {target_column!r} column; fit on the training matrix, '
+                         'or pass --engine for a feature set with game columns')
+
+    preprocessor = FeaturePreprocessor(k_features, categorical_columns).fit(data, target_column, dataset_path=dataset_path)
+    preprocessor.save(preprocessor_path(dataset_path))
+    return preprocessor
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit and store the feature preprocessor of a dataset.')
+    parser.add_argument('--features', default='data/processed/training_matrix.parquet', help='Training matrix or feature dataset CSV.')
+    parser.add_argument('--target', default='target', help='Target column.')
+    parser.add_argument('--k', type=int, nargs='+', default=[10, 25], help='Sizes of the top-k feature selections.')
+    parser.add_argument('--categorical', nargs='*', default=[], help='Columns to one-hot encode.')
+    parser.add_argument('--engine', choices=list(RATING_ENGINES), default=None, help='Include pre-game rating features.')
+    args = parser.parse_args()
+
+    preprocessor = fit_dataset_preprocessor(args.features, target_column=args.target, k_features=args.k,
+                                            categorical_columns=args.categorical, engine=args.engine)
+    dataset_path = args.features if os.path.exists(args.features) else os.path.splitext(args.features)[0] + '.csv'
+    print(f'Saved {preprocessor_path(dataset_path)} ({len(preprocessor.feature_names)} features)')
+    for selection in preprocessor.selections:
+        print(f'{selection}: {", ".join(preprocessor.selected_columns(selection))}')
+
+if __name__ == "__main__":
+    main()
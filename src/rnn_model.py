@@ -0,0 +1,30 @@
+import torch
+import torch.nn as nn
+
+class RNNModel(nn.Module):
+    """
+    Recurrent classifier from the modeling notebook, reading the last hidden state of a tanh RNN.
+    """
+
+    def __init__(self, input_size: int, hidden_size: int, num_layers: int, dropout: float, output_size: int = 2):
+        """
+        Args:
+            input_size (int): Number of features per time step.
+            hidden_size (int): Size of the hidden state.
+            num_layers (int): Number of stacked RNN layers.
+            dropout (float): Dropout between RNN layers, only used with more than one layer.
+            output_size (int): Number of classes.
+        """
+        super(RNNModel, self).__init__()
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+
+        self.rnn = nn.RNN(input_size, hidden_size, num_layers,
+                          batch_first=True, dropout=dropout if num_layers > 1 else 0)
+        self.fc = nn.Linear(hidden_size, output_size)
+
+    def forward(self, x):
+        h0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(x.device)
+        out, _ = self.rnn(x, h0)
+        out = self.fc(out[:, -1, :])
+        return out
@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from src.elo_ratings import calculate_elo_history, sort_games
+from src.feature_calculator import add_season_and_week, label_results
+
+# Score column pairs used by the different game sources: Neo4jElo.get_games, post_priori and elo_data.csv
+SCORE_COLUMNS = [('home_score', 'away_score'), ('total_home_score', 'total_away_score'), ('score_home', 'score_away')]
+
+# Ratings joined to the games by join_schedule_ratings; elo is left out, the training matrix has its own
+RATING_COLUMNS = ['win_pct', 'massey', 'colley', 'pagerank', 'sos_elo', 'opp_win_pct']
+
+def prepare_games(games: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalize a game source to home_score, away_score, result, season and week columns.
+
+    Games without a date (game_date = null in Neo4j) cannot be placed in a season or week, and
+    games without scores have not been played, so both are dropped.
+
+    Args:
+        games (pd.DataFrame): Games with game_id, game_date, home_team, away_team and one pair of score columns.
+
+    Returns:
+        pd.DataFrame: Chronologically sorted games.
+    """
+    for home_col, away_col in SCORE_COLUMNS:
+        if home_col in games.columns and away_col in games.columns:
+            games = games.rename(columns={home_col: 'home_score', away_col: 'away_score'})
+            break
+    else:
+        raise ValueError('Games need home and away score columns')
+
+    games = games.assign(game_date=pd.to_datetime(games['game_date'])).dropna(subset=['game_date', 'home_score', 'away_score'])
+    if games.empty:
+        raise ValueError('No dated games with scores')
+    games = add_season_and_week(sort_games(games))
+    games['result'] = label_results(games['home_score'], games['away_score'])
+    return games
+
+class ScheduleGraph:
+    """
+    Sparse game graph with opponent-adjusted team ratings as of every week of every season.
+    """
+
+    def __init__(self, games: pd.DataFrame, ridge: float = 1e-3, damping: float = 0.85, k: float = 20):
+        """
+        Args:
+            games (pd.DataFrame): Games with game_id, game_date, home_team, away_team and scores.
+            ridge (float): Regularization keeping the Massey system solvable while the graph is disconnected.
+            damping (float): PageRank damping factor.
+            k (float): K-factor for the ELO ratings used in strength of schedule.
+        """
+        self.games = prepare_games(games)
+        self.ridge = ridge
+        self.damping = damping
+        self.k = k
+
+        self.teams = sorted(set(self.games['home_team']) | set(self.games['away_team']))
+        self.team_index = {team: i for i, team in enumerate(self.teams)}
+        self._ratings = None
+
+    @classmethod
+    def from_neo4j(cls, elo_system, **kwargs):
+        """
+        Build the graph from the PLAYED relationships exported by Neo4jElo.get_games.
+
+        Args:
+            elo_system (Neo4jElo): Connected ELO system.
+            **kwargs: Passed to ScheduleGraph.
+
+        Returns:
+            ScheduleGraph: Graph of every game in the database.
+        """
+        return cls(elo_system.get_games(), **kwargs)
+
+    def incidence_matrix(self, games: pd.DataFrame) -> sparse.csr_matrix:
+        """
+        Build the game x team incidence matrix, +1 for the home team and -1 for the away team.
+
+        Args:
+            games (pd.DataFrame): Subset of self.games.
+
+        Returns:
+            sparse.csr_matrix: (n_games, n_teams) incidence matrix.
+        """
+        n_games = len(games)
+        rows = np.concatenate([np.arange(n_games), np.arange(n_games)])
+        cols = np.concatenate([games['home_team'].map(self.team_index).to_numpy(), games['away_team'].map(self.team_index).to_numpy()])
+        values = np.concatenate([np.ones(n_games), -np.ones(n_games)])
+        return sparse.csr_matrix((values, (rows, cols)), shape=(n_games, len(self.teams)))
+
+    def _pagerank(self, wins: sparse.csr_matrix) -> np.ndarray:
+        # Losers link to the teams that beat them; teams without a loss spread their rank evenly
+        n_teams = len(self.teams)
+        out_weight = np.asarray(wins.sum(axis=1)).ravel()
+        inverse_weight = np.divide(1, out_weight, out=np.zeros(n_teams), where=out_weight > 0)
+        transition = sparse.diags(inverse_weight) @ wins
+        dangling = out_weight == 0
+
+        rank = np.full(n_teams, 1 / n_teams)
+        for _ in range(100):
+            new_rank = self.damping * (transition.T @ rank + rank[dangling].sum() / n_teams) + (1 - self.damping) / n_teams
+            if np.abs(new_rank - rank).sum() < 1e-10:
+                return new_rank
+            rank = new_rank
+        return rank
+
+    def _solve(self, laplacian: sparse.csr_matrix, margin: np.ndarray, win_loss: np.ndarray, wins: sparse.csr_matrix, elo: np.ndarray) -> dict:
+        n_teams = len(self.teams)
+        identity = sparse.identity(n_teams, format='csr')
+        games_played = laplacian.diagonal()
+
+        # Off-diagonal of the Laplacian holds -(games between i and j)
+        opponents = sparse.diags(games_played) - laplacian
+        win_pct = np.divide(win_loss + games_played, 2 * games_played, out=np.full(n_teams, 0.5), where=games_played > 0)
+
+        return {
+            'games_played': games_played,
+            'win_pct': win_pct,
+            'massey': spsolve((laplacian + self.ridge * identity).tocsc(), margin),
+            'colley': spsolve((laplacian + 2 * identity).tocsc(), 1 + win_loss / 2),
+            'pagerank': self._pagerank(wins),
+            'elo': elo.copy(),
+            'sos_elo': np.divide(opponents @ elo, games_played, out=np.full(n_teams, np.nan), where=games_played > 0),
+            'opp_win_pct': np.divide(opponents @ win_pct, games_played, out=np.full(n_teams, np.nan), where=games_played > 0)
+        }
+
+    def ratings_table(self) -> pd.DataFrame:
+        """
+        Calculate ratings as of the start of every week, and after the last week, of every season.
+
+        The graph of each season is accumulated week by week, so each week only adds the sparse
+        contribution of its own games before the systems are solved again.
+
+        Returns:
+            pd.DataFrame: One row per (season, week, team) with the as_of_date cutoff, games played,
+            win percentage, Massey, Colley and PageRank ratings, ELO, opponents' average ELO (sos_elo)
+            and opponents' win percentage.
+        """
+        if self._ratings is not None:
+            return self._ratings
+
+        n_teams = len(self.teams)
+        history = calculate_elo_history(self.games, k=self.k)
+        elo = np.full(n_teams, 1500.0)
+        frames = []
+
+        for season, season_games in self.games.groupby('season', sort=True):
+            laplacian = sparse.csr_matrix((n_teams, n_teams))
+            wins = sparse.csr_matrix((n_teams, n_teams))
+            margin = np.zeros(n_teams)
+            win_loss = np.zeros(n_teams)
+
+            season_teams = set(season_games['home_team']) | set(season_games['away_team'])
+            in_season = np.array([team in season_teams for team in self.teams])
+            weeks = list(season_games.groupby('week', sort=True))
+            cutoffs = [(week, week_games['game_date'].min()) for week, week_games in weeks]
+            cutoffs.append((weeks[-1][0] + 1, season_games['game_date'].max() + pd.Timedelta(days=1)))
+
+            for i, (week, as_of_date) in enumerate(cutoffs):
+                ratings = pd.DataFrame(self._solve(laplacian, margin, win_loss, wins, elo))
+                ratings.insert(0, 'team', self.teams)
+                ratings.insert(0, 'as_of_date', as_of_date)
+                ratings.insert(0, 'week', week)
+                ratings.insert(0, 'season', season)
+                frames.append(ratings[in_season])
+
+                if i == len(weeks):
+                    break
+
+                # Add this week's games to the season graph
+                week_games = weeks[i][1]
+                incidence = self.incidence_matrix(week_games)
+                point_diff = (week_games['home_score'] - week_games['away_score']).to_numpy(dtype=float)
+                outcome = np.sign(point_diff)
+                laplacian = laplacian + (incidence.T @ incidence).tocsr()
+                margin += incidence.T @ point_diff
+                win_loss += incidence.T @ outcome
+
+                home = week_games['home_team'].map(self.team_index).to_numpy()
+                away = week_games['away_team'].map(self.team_index).to_numpy()
+                home_share = (outcome + 1) / 2
+                loser = np.concatenate([away, home])
+                winner = np.concatenate([home, away])
+                wins = wins + sparse.csr_matrix((np.concatenate([home_share, 1 - home_share]), (loser, winner)), shape=(n_teams, n_teams))
+
+                week_history = history[history['game_id'].isin(week_games['game_id'])]
+                elo[week_history['home_team'].map(self.team_index).to_numpy()] = week_history['home_elo_post'].to_numpy()
+                elo[week_history['away_team'].map(self.team_index).to_numpy()] = week_history['away_elo_post'].to_numpy()
+
+        self._ratings = pd.concat(frames, ignore_index=True)
+        return self._ratings
+
+    def ratings_as_of(self, date) -> pd.DataFrame:
+        """
+        Get each team's ratings from the latest weekly cutoff on or before a date.
+
+        Args:
+            date (str or pd.Timestamp): Date to look up.
+
+        Returns:
+            pd.DataFrame: One row per team that had played that season by the cutoff.
+        """
+        table = self.ratings_table()
+        cutoffs = table['as_of_date'].unique()
+        position = np.searchsorted(cutoffs, np.datetime64(pd.Timestamp(date)), side='right') - 1
+        if position < 0:
+            return table.iloc[0:0]
+        return table[table['as_of_date'] == cutoffs[position]].reset_index(drop=True)
+
+    def save(self, path: str):
+        """
+        Cache the weekly ratings table so feature generation can join it without rebuilding the graph.
+
+        Args:
+            path (str): CSV file path.
+        """
+        self.ratings_table().to_csv(path, index=False)
+
+def load_ratings_table(path: str) -> pd.DataFrame:
+    """
+    Load a ratings table saved by ScheduleGraph.save.
+
+    Args:
+        path (str): CSV file path.
+
+    Returns:
+        pd.DataFrame: Weekly ratings table.
+    """
+    return pd.read_csv(path, parse_dates=['as_of_date'])
+
+def join_schedule_ratings(games: pd.DataFrame, ratings: pd.DataFrame, columns: list = RATING_COLUMNS) -> pd.DataFrame:
+    """
+    Join both teams' schedule ratings as of every game's date.
+
+    Each game gets the (team, as_of_date) rows of the latest weekly cutoff on or before its
+    game_date. A week's cutoff is the date of its first game and only holds earlier weeks, so
+    no game sees its own result.
+
+    Args:
+        games (pd.DataFrame): Games with game_date, home_team and away_team, e.g. the training matrix.
+        ratings (pd.DataFrame): Output of ScheduleGraph.ratings_table or load_ratings_table.
+        columns (list): Rating columns to join.
+
+    Returns:
+        pd.DataFrame: Copy of the games with home_<rating> and away_<rating> columns, NaN for
+        teams without ratings at the time.
+    """
+    games = games.reset_index(drop=True)
+    games['game_date'] = pd.to_datetime(games['game_date'])
+    state = ratings[['team', 'as_of_date'] + columns].sort_values('as_of_date', kind='stable')
+    ordered = games.sort_values('game_date', kind='stable')
+
+    for side in ['home', 'away']:
+        left = ordered[['game_date', side + '_team']].reset_index()
+        joined = pd.merge_asof(left, state, left_on='game_date', right_on='as_of_date', left_by=side + '_team', right_by='team')
+        joined = joined.set_index('index')
+        for col in columns:
+            games[f'{side}_{col}'] = joined[col]
+    return games
@@ -0,0 +1,243 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import actual_scores
+
+# Conference and division of each team, including the abbreviations of relocated franchises
+DIVISIONS = {
+    'BUF': ('AFC', 'East'), 'MIA': ('AFC', 'East'), 'NE': ('AFC', 'East'), 'NYJ': ('AFC', 'East'),
+    'BAL': ('AFC', 'North'), 'CIN': ('AFC', 'North'), 'CLE': ('AFC', 'North'), 'PIT': ('AFC', 'North'),
+    'HOU': ('AFC', 'South'), 'IND': ('AFC', 'South'), 'JAX': ('AFC', 'South'), 'JAC': ('AFC', 'South'), 'TEN': ('AFC', 'South'),
+    'DEN': ('AFC', 'West'), 'KC': ('AFC', 'West'), 'LAC': ('AFC', 'West'), 'SD': ('AFC', 'West'), 'OAK': ('AFC', 'West'), 'LV': ('AFC', 'West'),
+    'DAL': ('NFC', 'East'), 'NYG': ('NFC', 'East'), 'PHI': ('NFC', 'East'), 'WAS': ('NFC', 'East'),
+    'CHI': ('NFC', 'North'), 'DET': ('NFC', 'North'), 'GB': ('NFC', 'North'), 'MIN': ('NFC', 'North'),
+    'ATL': ('NFC', 'South'), 'CAR': ('NFC', 'South'), 'NO': ('NFC', 'South'), 'TB': ('NFC', 'South'),
+    'ARI': ('NFC', 'West'), 'LA': ('NFC', 'West'), 'LAR': ('NFC', 'West'), 'STL': ('NFC', 'West'), 'SF': ('NFC', 'West'), 'SEA': ('NFC', 'West')
+}
+
+class SeasonSetup:
+    """
+    Team indices, game incidence matrices and records shared by every simulation chunk.
+    """
+
+    def __init__(self, ratings: dict, schedule: pd.DataFrame, completed: pd.DataFrame = None, divisions: dict = None):
+        """
+        Args:
+            ratings (dict): Current ELO rating of each team.
+            schedule (pd.DataFrame): Remaining games with home_team and away_team, and optionally week.
+            completed (pd.DataFrame): Games already played this season with home_team, away_team and result.
+            divisions (dict): Mapping of team to (conference, division), defaults to DIVISIONS.
+        """
+        divisions = divisions or DIVISIONS
+        completed = completed if completed is not None else pd.DataFrame(columns=['home_team', 'away_team', 'result'])
+
+        self.teams = sorted(set(schedule['home_team']) | set(schedule['away_team']) | set(completed['home_team']) | set(completed['away_team']))
+        unknown = [team for team in self.teams if team not in divisions]
+        if unknown:
+            raise ValueError(f'No division for teams: {unknown}')
+        team_index = {team: i for i, team in enumerate(self.teams)}
+
+        self.conference = np.array([divisions[team][0] for team in self.teams])
+        self.division = np.array([' '.join(divisions[team]) for team in self.teams])
+        self.elo = np.array([ratings.get(team, 1500.0) for team in self.teams])
+
+        self.home = schedule['home_team'].map(team_index).to_numpy()
+        self.away = schedule['away_team'].map(team_index).to_numpy()
+        self.week = schedule['week'].to_numpy() if 'week' in schedule.columns else np.arange(len(schedule))
+
+        # Which remaining games count towards the division and conference records
+        self.division_game = self.division[self.home] == self.division[self.away]
+        self.conference_game = self.conference[self.home] == self.conference[self.away]
+
+        # Game x team incidence matrices, so simulated results turn into records with a matmul
+        n_games, n_teams = len(schedule), len(self.teams)
+        self.home_matrix = np.zeros((n_games, n_teams), dtype=np.float32)
+        self.away_matrix = np.zeros((n_games, n_teams), dtype=np.float32)
+        self.home_matrix[np.arange(n_games), self.home] = 1
+        self.away_matrix[np.arange(n_games), self.away] = 1
+
+        self.base_wins = self._record(completed, team_index)
+        self.base_division_wins = self._record(completed, team_index, 'division')
+        self.base_conference_wins = self._record(completed, team_index, 'conference')
+
+    def _record(self, completed: pd.DataFrame, team_index: dict, scope: str = None) -> np.ndarray:
+        wins = np.zeros(len(self.teams))
+        if completed.empty:
+            return wins
+        home = completed['home_team'].map(team_index).to_numpy()
+        away = completed['away_team'].map(team_index).to_numpy()
+        actual_home = actual_scores(completed['result'])
+        mask = np.ones(len(completed), dtype=bool)
+        if scope == 'division':
+            mask = self.division[home] == self.division[away]
+        elif scope == 'conference':
+            mask = self.conference[home] == self.conference[away]
+        np.add.at(wins, home[mask], actual_home[mask])
+        np.add.at(wins, away[mask], 1 - actual_home[mask])
+        return wins
+
+def simulate_results(setup: SeasonSetup, n_sims: int, rng: np.random.Generator, k: float = 0) -> np.ndarray:
+    """
+    Draw the result of every remaining game for a batch of simulated seasons.
+
+    Args:
+        setup (SeasonSetup): Season being simulated.
+        n_sims (int): Number of simulated seasons.
+        rng (np.random.Generator): Random number generator.
+        k (float): K-factor for updating ratings within each simulation, 0 keeps them fixed.
+
+    Returns:
+        np.ndarray: (n_sims, n_games) float32 array, 1 where the home team won.
+    """
+    n_games = len(setup.home)
+    draws = rng.random((n_sims, n_games), dtype=np.float32)
+
+    if k == 0:
+        expected_home = 1 / (1 + 10 ** ((setup.elo[setup.away] - setup.elo[setup.home]) / 400))
+        return (draws < expected_home).astype(np.float32)
+
+    # Ratings diverge between simulations, so games are played week by week on a (n_sims, n_teams) array
+    elo = np.tile(setup.elo, (n_sims, 1))
+    home_wins = np.empty((n_sims, n_games), dtype=np.float32)
+    for week in np.unique(setup.week):
+        games = np.flatnonzero(setup.week == week)
+        home, away = setup.home[games], setup.away[games]
+        expected_home = 1 / (1 + 10 ** ((elo[:, away] - elo[:, home]) / 400))
+        home_wins[:, games] = draws[:, games] < expected_home
+        change = k * (home_wins[:, games] - expected_home)
+        np.add.at(elo, (slice(None), home), change)
+        np.add.at(elo, (slice(None), away), -change)
+
+    return home_wins
+
+def rank_standings(setup: SeasonSetup, home_wins: np.ndarray, rng: np.random.Generator, wild_cards: int = 2) -> dict:
+    """
+    Determine division winners and playoff seeds for a batch of simulated seasons.
+
+    Ties are broken with a single sort key per team: overall wins, then division wins,
+    then conference wins, then a random draw. This simplifies the NFL rules, which only
+    compare division records between teams of the same division: wild card ties between
+    teams of different divisions are also broken on division record before conference record.
+
+    Args:
+        setup (SeasonSetup): Season being simulated.
+        home_wins (np.ndarray): Output of simulate_results.
+        rng (np.random.Generator): Random number generator for the final tie-break.
+        wild_cards (int): Wild card teams per conference.
+
+    Returns:
+        dict: (n_sims, n_teams) arrays of wins, division winner flags and seeds (0 for no playoffs).
+    """
+    away_wins = 1 - home_wins
+    wins = setup.base_wins + home_wins @ setup.home_matrix + away_wins @ setup.away_matrix
+    division_wins = setup.base_division_wins + (home_wins * setup.division_game) @ setup.home_matrix + (away_wins * setup.division_game) @ setup.away_matrix
+    conference_wins = setup.base_conference_wins + (home_wins * setup.conference_game) @ setup.home_matrix + (away_wins * setup.conference_game) @ setup.away_matrix
+
+    # Records are multiples of 0.5 below 100, so the scaled records never overlap, and the random
+    # draw stays below 0.5 so it only separates teams whose records are all equal
+    key = wins * 1e6 + division_wins * 1e3 + conference_wins + rng.random(wins.shape) * 0.1
+
+    n_sims, n_teams = wins.shape
+    division_winner = np.zeros((n_sims, n_teams), dtype=bool)
+    for division in np.unique(setup.division):
+        members = np.flatnonzero(setup.division == division)
+        division_winner[np.arange(n_sims), members[np.argmax(key[:, members], axis=1)]] = True
+
+    # Division winners take the top seeds, then the best remaining records get the wild cards
+    seed_key = key + division_winner * 1e9
+    seeds = np.zeros((n_sims, n_teams), dtype=np.int8)
+    for conference in np.unique(setup.conference):
+        members = np.flatnonzero(setup.conference == conference)
+        n_division_winners = len(np.unique(setup.division[members]))
+        order = np.argsort(-seed_key[:, members], axis=1)[:, :n_division_winners + wild_cards]
+        for seed in range(order.shape[1]):
+            seeds[np.arange(n_sims), members[order[:, seed]]] = seed + 1
+
+    return {'wins': wins, 'division_winner': division_winner, 'seeds': seeds}
+
+def _simulate_chunk(setup: SeasonSetup, n_sims: int, seed_sequence: np.random.SeedSequence, k: float, wild_cards: int) -> dict:
+    rng = np.random.default_rng(seed_sequence)
+    standings = rank_standings(setup, simulate_results(setup, n_sims, rng, k=k), rng, wild_cards=wild_cards)
+    n_seeds = wild_cards + len(np.unique(setup.division)) // len(np.unique(setup.conference))
+    return {
+        'wins': standings['wins'].sum(axis=0),
+        'division': standings['division_winner'].sum(axis=0),
+        'seeds': np.stack([(standings['seeds'] == seed).sum(axis=0) for seed in range(1, n_seeds + 1)], axis=1)
+    }
+
+def simulate_season(ratings: dict, schedule: pd.DataFrame, completed: pd.DataFrame = None, n_sims: int = 100000,
+                    k: float = 0, wild_cards: int = 2, seed: int = 42, chunk_size: int = 10000, workers: int = None,
+                    divisions: dict = None) -> pd.DataFrame:
+    """
+    Simulate the rest of a season many times and report division, playoff and seed probabilities.
+
+    Simulations run in fixed-size chunks across worker processes. Every chunk gets its own child
+    of the seed, so results only depend on seed and chunk_size, not on the number of workers.
+
+    Args:
+        ratings (dict): Current ELO rating of each team.
+        schedule (pd.DataFrame): Remaining games with home_team and away_team, and optionally week.
+        completed (pd.DataFrame): Games already played this season with home_team, away_team and result.
+        n_sims (int): Number of simulated seasons.
+        k (float): K-factor for updating ratings within each simulation, 0 keeps them fixed.
+        wild_cards (int): Wild card teams per conference.
+        seed (int): Seed of the random number generators.
+        chunk_size (int): Simulated seasons per chunk.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        divisions (dict): Mapping of team to (conference, division), defaults to DIVISIONS.
+
+    Returns:
+        pd.DataFrame: One row per team with expected wins and division, playoff and seed probabilities.
+    """
+    setup = SeasonSetup(ratings, schedule, completed, divisions)
+
+    chunk_sizes = [chunk_size] * (n_sims // chunk_size) + ([n_sims % chunk_size] if n_sims % chunk_size else [])
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(_simulate_chunk, [setup] * len(chunk_sizes), chunk_sizes, seed_sequences,
+                                   [k] * len(chunk_sizes), [wild_cards] * len(chunk_sizes)))
+
+    seeds = sum(chunk['seeds'] for chunk in chunks) / n_sims
+    odds = pd.DataFrame({
+        'team': setup.teams,
+        'conference': setup.conference,
+        'division': setup.division,
+        'expected_wins': sum(chunk['wins'] for chunk in chunks) / n_sims,
+        'division_prob': sum(chunk['division'] for chunk in chunks) / n_sims,
+        'playoff_prob': seeds.sum(axis=1)
+    })
+    for seed_number in range(seeds.shape[1]):
+        odds[f'seed_{seed_number + 1}_prob'] = seeds[:, seed_number]
+
+    return odds.sort_values(['conference', 'division', 'expected_wins'], ascending=[True, True, False]).reset_index(drop=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo simulation of the remaining season on ELO ratings.')
+    parser.add_argument('--ratings', required=True, help='JSON file mapping team name to current ELO rating.')
+    parser.add_argument('--schedule', required=True, help='CSV of remaining games with home_team, away_team and optionally week.')
+    parser.add_argument('--completed', default=None, help='CSV of games played this season with home_team, away_team and result.')
+    parser.add_argument('--sims', type=int, default=100000)
+    parser.add_argument('--k', type=float, default=0, help='K-factor for ratings updates within each simulation.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help='Optional CSV path for the playoff odds.')
+    args = parser.parse_args()
+
+    with open(args.ratings) as f:
+        ratings = json.load(f)
+    schedule = pd.read_csv(args.schedule)
+    completed = pd.read_csv(args.completed) if args.completed else None
+
+    odds = simulate_season(ratings, schedule, completed, n_sims=args.sims, k=args.k, seed=args.seed, workers=args.workers)
+
+    if args.output:
+        odds.to_csv(args.output, index=False)
+    print(odds.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset
+
+from src.training_matrix import team_game_rows
+
+FEATURES_FILE = 'features.npy'
+TARGETS_FILE = 'targets.npy'
+OFFSETS_FILE = 'offsets.npy'
+GAME_IDS_FILE = 'game_ids.npy'
+DATES_FILE = 'game_dates.npy'
+META_FILE = 'meta.json'
+
+def build_sequence_dataset(post_priori: pd.DataFrame, path: str, features: pd.DataFrame = None) -> dict:
+    """
+    Materialize every team's chronological game features into a contiguous float32 array on disk.
+
+    Rows are grouped by team, so each team's sequence is one contiguous block and the offsets
+    index gives where each block starts.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data with game_id, game_date, home_team, away_team and result.
+        path (str): Output directory.
+        features (pd.DataFrame): Optional scenario averages joined on game_id.
+
+    Returns:
+        dict: Metadata written next to the arrays (teams, columns and number of rows).
+    """
+    os.makedirs(path, exist_ok=True)
+    rows = team_game_rows(post_priori, features)
+    columns = [col for col in rows.columns if col not in ['game_id', 'game_date', 'team', 'opponent', 'won']]
+
+    features_array = np.lib.format.open_memmap(os.path.join(path, FEATURES_FILE), mode='w+', dtype=np.float32, shape=(len(rows), len(columns)))
+    features_array[:] = rows[columns].fillna(0).to_numpy(dtype=np.float32)
+    features_array.flush()
+    del features_array
+
+    teams, starts = np.unique(rows['team'].to_numpy(), return_index=True)
+    np.save(os.path.join(path, OFFSETS_FILE), np.append(starts, len(rows)).astype(np.int64))
+    np.save(os.path.join(path, TARGETS_FILE), rows['won'].to_numpy(dtype=np.float32))
+    np.save(os.path.join(path, GAME_IDS_FILE), rows['game_id'].to_numpy(dtype=np.int64))
+    np.save(os.path.join(path, DATES_FILE), rows['game_date'].to_numpy(dtype='datetime64[D]'))
+
+    meta = {'teams': teams.tolist(), 'columns': columns, 'rows': len(rows)}
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    return meta
+
+class TeamSequenceDataset(Dataset):
+    """
+    Windows of a team's previous games paired with the outcome of its next game, read from the memmap.
+    """
+
+    def __init__(self, path: str, window: int = 10, start_date: str = None, end_date: str = None):
+        """
+        Build the sample index; the feature array itself is only mapped when first read, so each
+        DataLoader worker maps the file on its own instead of receiving a pickled copy.
+
+        Args:
+            path (str): Directory written by build_sequence_dataset.
+            window (int): Number of previous games in each sequence.
+            start_date (str): Only use target games on or after this date.
+            end_date (str): Only use target games before this date.
+        """
+        self.path = path
+        self.window = window
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+
+        offsets = np.load(os.path.join(path, OFFSETS_FILE))
+        dates = np.load(os.path.join(path, DATES_FILE))
+
+        # A row is a target when its team has at least window earlier games
+        team_start = np.repeat(offsets[:-1], np.diff(offsets))
+        row = np.arange(self.meta['rows'])
+        valid = row - team_start >= window
+        if start_date is not None:
+            valid &= dates >= np.datetime64(start_date)
+        if end_date is not None:
+            valid &= dates < np.datetime64(end_date)
+        self.index = row[valid]
+
+        self.targets = torch.from_numpy(np.load(os.path.join(path, TARGETS_FILE)))
+        self._features = None
+
+    @property
+    def features(self) -> np.ndarray:
+        if self._features is None:
+            # Copy-on-write mapping gives writable arrays for torch.from_numpy without copying pages
+            self._features = np.load(os.path.join(self.path, FEATURES_FILE), mmap_mode='c')
+        return self._features
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        row = self.index[i]
+        return torch.from_numpy(self.features[row - self.window:row]), self.targets[row]
@@ -0,0 +1,257 @@
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.feature_calculator import PLAY_COLUMNS, calculate_post_priori
+
+# Column offsets are aligned so every column view starts on a cache line
+ALIGNMENT = 64
+
+def _release(shm: shared_memory.SharedMemory, owner: bool):
+    shm.close()
+    if owner:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def _stored_as_is(dtype) -> bool:
+    return dtype.kind in 'biufcmM' and not isinstance(dtype, pd.api.extensions.ExtensionDtype)
+
+class SharedFrame:
+    """
+    Columns of a DataFrame placed once in a single shared memory block, so worker processes
+    can attach zero-copy views by name instead of receiving a pickled copy.
+
+    Numeric, boolean and datetime columns are stored as they are. Other columns (team names,
+    posteam_type, play_type, ...) are stored as categorical codes into one vocabulary kept in the
+    spec, so the frame rebuilt by a worker behaves the same in comparisons and group bys.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, spec: dict, owner: bool):
+        """
+        Use SharedFrame.create or SharedFrame.attach instead of calling this directly.
+
+        Args:
+            shm (shared_memory.SharedMemory): Block holding the columns.
+            spec (dict): Block name, number of rows and column layout.
+            owner (bool): Whether this process created the block and unlinks it when done.
+        """
+        self.shm = shm
+        self.spec = spec
+        self.owner = owner
+        self._columns = {column['name']: column for column in spec['columns']}
+        # Owners unlink the block even if close is never called, e.g. when a stage raises
+        self._finalizer = weakref.finalize(self, _release, shm, owner)
+
+    @classmethod
+    def create(cls, frame: pd.DataFrame, columns: list = None, categorical: bool = True):
+        """
+        Copy the columns of a DataFrame into a new shared memory block.
+
+        Args:
+            frame (pd.DataFrame): Cleaned play-by-play data, post_priori or any other frame.
+            columns (list): Columns to share, defaulting to every column.
+            categorical (bool): Share non-numeric columns as categorical codes instead of dropping them.
+
+        Returns:
+            SharedFrame: Frame owned by this process.
+        """
+        names = columns or list(frame.columns)
+        stored = [name for name in names if _stored_as_is(frame[name].dtype)]
+        coded = [name for name in names if name not in stored] if categorical else []
+        # One vocabulary for every coded column, so e.g. penalty_team == home_team still compares
+        categories = pd.Index(pd.unique(np.concatenate([frame[name].dropna().to_numpy() for name in coded]))) if coded else pd.Index([])
+
+        layout, arrays, offset = [], [], 0
+        for name in names:
+            if name in stored:
+                array = frame[name].to_numpy()
+            elif name in coded:
+                array = pd.Categorical(frame[name], categories=categories).codes.astype(np.int32)
+            else:
+                continue
+            layout.append({'name': name, 'dtype': array.dtype.str, 'offset': offset, 'coded': name in coded})
+            arrays.append(array)
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        spec = {'name': shm.name, 'rows': len(frame), 'columns': layout, 'categories': categories}
+        shared = cls(shm, spec, owner=True)
+        for column, array in zip(layout, arrays):
+            shared.column(column['name'])[:] = array
+        return shared
+
+    @classmethod
+    def attach(cls, spec: dict):
+        """
+        Attach to a block created by another process.
+
+        Args:
+            spec (dict): SharedFrame.spec of the creating process.
+
+        Returns:
+            SharedFrame: Frame whose columns are views into the shared block.
+        """
+        try:
+            # Python 3.13+: only the creator's resource tracker should ever unlink the block
+            shm = shared_memory.SharedMemory(name=spec['name'], track=False)
+        except TypeError:
+            shm = shared_memory.SharedMemory(name=spec['name'])
+        return cls(shm, spec, owner=False)
+
+    def __len__(self):
+        return self.spec['rows']
+
+    @property
+    def columns(self) -> list:
+        return list(self._columns)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Get the stored array of a column, the codes for categorical columns.
+
+        Args:
+            name (str): Column name.
+
+        Returns:
+            np.ndarray: View into the shared block.
+        """
+        column = self._columns[name]
+        return np.ndarray(self.spec['rows'], dtype=np.dtype(column['dtype']), buffer=self.shm.buf, offset=column['offset'])
+
+    def to_frame(self, columns: list = None, rows: slice = None) -> pd.DataFrame:
+        """
+        Build a DataFrame over the shared columns without copying them.
+
+        Args:
+            columns (list): Columns to include, defaulting to every shared column.
+            rows (slice): Contiguous rows to include, e.g. one worker's games.
+
+        Returns:
+            pd.DataFrame: Frame whose numeric columns are views into the shared block; treat it as read-only.
+        """
+        rows = rows if rows is not None else slice(None)
+        data = {}
+        for name in columns or self.columns:
+            values = self.column(name)[rows]
+            if self._columns[name]['coded']:
+                values = pd.Categorical.from_codes(values, self.spec['categories'], validate=False)
+            data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    def close(self):
+        """
+        Release this process's mapping, and unlink the block if this process created it.
+
+        Views returned by column and to_frame must not be used afterwards.
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# Shared frame attached once per worker process by _init_worker
+_worker_frame = None
+
+def _init_worker(spec: dict):
+    global _worker_frame
+    _worker_frame = SharedFrame.attach(spec)
+
+def worker_frame() -> SharedFrame:
+    """
+    Get the shared frame attached by the current map_shared worker.
+
+    Returns:
+        SharedFrame: Frame attached when the worker started.
+    """
+    if _worker_frame is None:
+        raise RuntimeError('worker_frame is only available inside map_shared workers')
+    return _worker_frame
+
+def map_shared(function, shared: SharedFrame, tasks: list, workers: int = None) -> list:
+    """
+    Run a function over tasks in worker processes that all attach the same shared frame.
+
+    Args:
+        function (callable): Module-level function taking one task and reading worker_frame().
+        shared (SharedFrame): Frame created by this process.
+        tasks (list): Small picklable task descriptions, e.g. row ranges.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+
+    Returns:
+        list: Result of every task, in task order.
+    """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.spec,)) as executor:
+        return list(executor.map(function, tasks))
+
+def game_row_ranges(game_ids: np.ndarray, n_chunks: int) -> list:
+    """
+    Split rows sorted by game into contiguous ranges that never cut a game in two.
+
+    Args:
+        game_ids (np.ndarray): Game id of every row, grouped by game.
+        n_chunks (int): Number of ranges to aim for.
+
+    Returns:
+        list: (start, stop) row positions of every range.
+    """
+    game_starts = np.flatnonzero(np.r_[True, game_ids[1:] != game_ids[:-1]])
+    # Cut at the first game starting at or after each evenly spaced row target
+    targets = np.linspace(0, len(game_ids), n_chunks + 1)[1:-1]
+    positions = np.searchsorted(game_starts, targets)
+    cuts = np.unique(game_starts[positions[positions < len(game_starts)]])
+    bounds = np.r_[0, cuts[cuts > 0], len(game_ids)]
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+def _post_priori_rows(bounds: tuple) -> pd.DataFrame:
+    plays = worker_frame().to_frame(rows=slice(*bounds))
+    # Decode the categorical columns, whose group bys and merges would otherwise keep every
+    # category of the shared vocabulary instead of only the values in this range
+    for name in plays.columns:
+        if isinstance(plays[name].dtype, pd.CategoricalDtype):
+            plays[name] = plays[name].astype(plays[name].cat.categories.dtype)
+    return calculate_post_priori(plays)
+
+def parallel_post_priori(data: pd.DataFrame, workers: int = None, chunks_per_worker: int = 4) -> pd.DataFrame:
+    """
+    Calculate post_priori in worker processes that share one copy of the play-by-play data.
+
+    Every post-priori statistic is calculated per game, so each worker handles whole games
+    from a contiguous range of rows. Only the columns calculate_post_priori reads are shared,
+    so free-text and player columns never reach the shared vocabulary the workers receive.
+
+    Starting the workers, sharing the plays and sending the results back costs seconds, so this
+    only beats calculate_post_priori when several cores split multiple seasons of plays; on a
+    single season or a single core the serial calculation is faster.
+
+    Args:
+        data (pd.DataFrame): Cleaned play-by-play data.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        chunks_per_worker (int): Row ranges per worker, to balance games of different lengths.
+
+    Returns:
+        pd.DataFrame: The rows and values of calculate_post_priori(data), in the same order.
+    """
+    workers = workers or os.cpu_count()
+    # Games must be contiguous for the row ranges; the stable sort keeps their first-seen order
+    order = pd.Index(pd.unique(data['game_id']))
+    data = data.iloc[np.argsort(order.get_indexer(data['game_id']), kind='stable')]
+
+    with SharedFrame.create(data, columns=[col for col in PLAY_COLUMNS if col in data.columns]) as shared:
+        ranges = game_row_ranges(shared.column('game_id'), workers * chunks_per_worker)
+        parts = map_shared(_post_priori_rows, shared, ranges, workers=workers)
+
+    post_priori = pd.concat(parts, ignore_index=True)
+    # Team columns come back with the dtype of the shared vocabulary; restore the input's
+    for name in ['game_date', 'home_team', 'away_team']:
+        if name in post_priori.columns:
+            post_priori[name] = post_priori[name].astype(data[name].dtype)
+    return post_priori
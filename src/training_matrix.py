@@ -0,0 +1,321 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.elo_ratings import RATING_ENGINES, actual_scores, calculate_rating_history, expected_score, glicko_expected_score
+from src.feature_calculator import add_season_and_week
+
+# Identifier columns of the team rows that are never averaged
+TEAM_ROW_KEYS = ['game_id', 'game_date', 'team', 'opponent', 'is_home']
+
+def side_columns(frame: pd.DataFrame) -> list:
+    """
+    Find the numeric columns that exist once for each side of a game.
+
+    Post-priori columns end with _home/_away (score_q1_home) and scenario columns carry
+    _home_/_away_ inside their name (last_10_games_home_score).
+
+    Args:
+        frame (pd.DataFrame): Post-priori or scenario averages DataFrame.
+
+    Returns:
+        list: (name, home column, away column) for every column pair, with the side removed from the name.
+    """
+    numeric = set(frame.select_dtypes(include=['number']).columns)
+    pairs = []
+    for col in frame.columns:
+        if col not in numeric:
+            continue
+        if col.endswith('_home'):
+            away_col = col[:-len('_home')] + '_away'
+            name = col[:-len('_home')]
+        elif '_home_' in col:
+            away_col = col.replace('_home_', '_away_', 1)
+            name = col.replace('_home_', '_', 1)
+        else:
+            continue
+        if away_col in numeric:
+            pairs.append((name, col, away_col))
+    return pairs
+
+def team_game_rows(post_priori: pd.DataFrame, features: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Turn games into one row per team and game, seen from that team's side.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data with game_id, game_date, home_team, away_team and result.
+        features (pd.DataFrame): Optional scenario averages joined on game_id.
+
+    Returns:
+        pd.DataFrame: Rows with team, opponent, game_id, game_date, is_home, won and the side-free feature columns,
+        sorted by team and date.
+    """
+    games = post_priori
+    if features is not None:
+        scenario_cols = ['game_id'] + [col for pair in side_columns(features) for col in pair[1:] if col not in post_priori.columns]
+        games = games.merge(features[scenario_cols], on='game_id', how='left')
+
+    pairs = side_columns(games)
+    names = [name for name, _, _ in pairs]
+    won = actual_scores(games['result'])
+
+    home = games[['game_id', 'game_date', 'home_team', 'away_team'] + [home_col for _, home_col, _ in pairs]]
+    home = home.set_axis(['game_id', 'game_date', 'team', 'opponent'] + names, axis=1).assign(is_home=1.0, won=won)
+    away = games[['game_id', 'game_date', 'away_team', 'home_team'] + [away_col for _, _, away_col in pairs]]
+    away = away.set_axis(['game_id', 'game_date', 'team', 'opponent'] + names, axis=1).assign(is_home=0.0, won=1 - won)
+
+    rows = pd.concat([home, away], ignore_index=True)
+    rows['game_date'] = pd.to_datetime(rows['game_date'])
+    return rows.sort_values(['team', 'game_date', 'game_id'], kind='stable').reset_index(drop=True)
+
+def team_margin_rows(post_priori: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get team_game_rows with point_diff from each team's side, sorted by date.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data with total_home_score and total_away_score.
+
+    Returns:
+        pd.DataFrame: Team rows sorted by game_date.
+    """
+    # point_diff is from the home side in post_priori, so it is turned to each team's side here
+    home_margin = post_priori['total_home_score'] - post_priori['total_away_score']
+    rows = team_game_rows(post_priori.drop(columns=['point_diff'], errors='ignore'))
+    rows['point_diff'] = np.where(rows['is_home'] == 1, 1, -1) * rows['game_id'].map(home_margin.set_axis(post_priori['game_id'])).to_numpy()
+    return rows.sort_values('game_date', kind='stable')
+
+def _as_of_join(games: pd.DataFrame, state: pd.DataFrame, by: list) -> pd.DataFrame:
+    # State rows describe a team after a game, so only rows strictly before the game date are used
+    return pd.merge_asof(games, state, on='game_date', by=by, allow_exact_matches=False)
+
+def _side_state(games: pd.DataFrame, state: pd.DataFrame, side: str) -> pd.DataFrame:
+    # Join a team state to one side of every game, naming its columns for that side
+    left = games[['game_id', 'game_date', side + '_team']].rename(columns={side + '_team': 'team'})
+    joined = _as_of_join(left, state, by='team')
+    columns = [col for col in state.columns if col not in ['team', 'game_date']]
+    return joined[['game_id'] + columns].rename(columns={col: col.format(side=side) for col in columns})
+
+def rolling_team_state(rows: pd.DataFrame, windows: tuple = (3, 5, 10)) -> pd.DataFrame:
+    """
+    Calculate each team's rolling averages after every game it played.
+
+    Args:
+        rows (pd.DataFrame): Output of team_game_rows.
+        windows (tuple): Numbers of games averaged.
+
+    Returns:
+        pd.DataFrame: team, game_date and last_<n>_games_{side}_<stat> columns, where {side} is
+        filled in when the state is joined to a side of a game.
+    """
+    stats = [col for col in rows.columns if col not in TEAM_ROW_KEYS]
+    grouped = rows.groupby('team', sort=False)[stats]
+    frames = [rows[['team', 'game_date']]]
+    for n in windows:
+        rolled = grouped.rolling(n, min_periods=n).mean().reset_index(level=0, drop=True)
+        frames.append(rolled.rename(columns={stat: f'last_{n}_games_{{side}}_{stat}' for stat in stats}))
+    return pd.concat(frames, axis=1).sort_values('game_date', kind='stable')
+
+def latest_team_state(post_priori: pd.DataFrame, windows: tuple = (3, 5, 10)) -> pd.DataFrame:
+    """
+    Get every team's rolling averages after its most recent game.
+
+    The matrix's rolling columns describe a team before each game; this is the same state after
+    the last game it played, the state its next game starts from.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data, as for assemble_training_matrix.
+        windows (tuple): Numbers of games averaged.
+
+    Returns:
+        pd.DataFrame: One row per team, indexed by team, with side-free columns (last_3_games_score_q1).
+    """
+    state = rolling_team_state(team_margin_rows(post_priori), windows)
+    state = state.drop_duplicates('team', keep='last').set_index('team').drop(columns='game_date')
+    return state.rename(columns=lambda col: col.replace('_{side}_', '_', 1))
+
+def elo_team_state(post_priori: pd.DataFrame, k: float = 20, engine: str = 'elo', initial_elo: float = 1500,
+                   initial_rd: float = 350) -> pd.DataFrame:
+    """
+    Get each team's rating after every game it played.
+
+    Args:
+        post_priori (pd.DataFrame): Games with game_id, game_date, home_team, away_team and result.
+        k (float): K-factor for ELO rating calculation.
+        engine (str): Rating engine, 'elo' or 'glicko2'.
+        initial_elo (float): Rating every team starts from.
+        initial_rd (float): Glicko-2 rating deviation every team starts from.
+
+    Returns:
+        pd.DataFrame: team, game_date and {side}_elo columns, plus {side}_rd for Glicko-2.
+    """
+    if engine == 'elo':
+        settings = {'k': k, 'initial_elo': initial_elo}
+    else:
+        settings = {'initial_rating': initial_elo, 'initial_rd': initial_rd}
+    history = calculate_rating_history(post_priori, engine=engine, **settings)
+    columns = ['elo_post', 'rd_post'] if engine == 'glicko2' else ['elo_post']
+    names = ['team', 'game_date'] + ['{side}_' + col[:-len('_post')] for col in columns]
+    home = history[['home_team', 'game_date'] + ['home_' + col for col in columns]].set_axis(names, axis=1)
+    away = history[['away_team', 'game_date'] + ['away_' + col for col in columns]].set_axis(names, axis=1)
+    state = pd.concat([home, away], ignore_index=True)
+    state['game_date'] = pd.to_datetime(state['game_date'])
+    return state.sort_values('game_date', kind='stable')
+
+def head_to_head_state(rows: pd.DataFrame, windows: tuple = (3,)) -> pd.DataFrame:
+    """
+    Calculate each team's record against each opponent after every game between them.
+
+    Args:
+        rows (pd.DataFrame): Output of team_game_rows with a point_diff column from the team's side.
+        windows (tuple): Numbers of most recent meetings averaged.
+
+    Returns:
+        pd.DataFrame: team, opponent, game_date, h2h_games, h2h_win_pct, h2h_margin and
+        h2h_last_<m>_win_pct / h2h_last_<m>_margin columns, from the team's side.
+    """
+    meetings = rows[['team', 'opponent', 'game_date', 'won', 'point_diff']].rename(columns={'point_diff': 'margin'})
+    meetings = meetings.sort_values(['team', 'opponent', 'game_date'], kind='stable').reset_index(drop=True)
+
+    grouped = meetings.groupby(['team', 'opponent'], sort=False)
+    state = meetings[['team', 'opponent', 'game_date']].copy()
+    state['h2h_games'] = grouped.cumcount() + 1
+    state['h2h_win_pct'] = grouped['won'].cumsum() / state['h2h_games']
+    state['h2h_margin'] = grouped['margin'].cumsum() / state['h2h_games']
+    for m in windows:
+        rolled = grouped[['won', 'margin']].rolling(m, min_periods=1).mean().reset_index(level=[0, 1], drop=True)
+        state[f'h2h_last_{m}_win_pct'] = rolled['won']
+        state[f'h2h_last_{m}_margin'] = rolled['margin']
+    return state.sort_values('game_date', kind='stable')
+
+def assemble_training_matrix(post_priori: pd.DataFrame, windows: tuple = (3, 5, 10), h2h_windows: tuple = (3,),
+                             k: float = 20, initial_elo: float = 1500, engine: str = 'elo', initial_rd: float = 350,
+                             schedule_ratings: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Join every game to both teams' pre-game rating, rolling averages and head-to-head record.
+
+    Each source is turned into a state table of (team, game_date) rows describing a team after
+    a game, sorted once, and joined with merge_asof to the last state strictly before each game,
+    so no feature can see the game it describes or anything after it.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data with game_id, game_date, home_team, away_team, result,
+            total_home_score and total_away_score.
+        windows (tuple): Numbers of games in the rolling averages.
+        h2h_windows (tuple): Numbers of most recent meetings in the head-to-head averages.
+        k (float): K-factor for ELO rating calculation.
+        initial_elo (float): Rating of a team before its first game.
+        engine (str): Rating engine, 'elo' or 'glicko2'. Glicko-2 adds the home_rd and away_rd
+            rating deviations, and elo_home_win_prob accounts for them.
+        initial_rd (float): Glicko-2 rating deviation of a team before its first game.
+        schedule_ratings (pd.DataFrame): Optional weekly ratings table of a ScheduleGraph, joined as
+            home_/away_ Massey, Colley, PageRank and strength of schedule columns.
+
+    Returns:
+        pd.DataFrame: One row per game with identifiers, result, target and features. Rolling
+        columns follow the scenario naming (last_10_games_home_score), and head-to-head columns
+        are from the home team's side.
+    """
+    if engine not in RATING_ENGINES:
+        raise ValueError(f'Unknown rating engine: {engine}')
+
+    games = post_priori[['game_id', 'game_date', 'home_team', 'away_team', 'result']].copy()
+    games['game_date'] = pd.to_datetime(games['game_date'])
+    games = add_season_and_week(games.sort_values(['game_date', 'game_id'], kind='stable').reset_index(drop=True))
+
+    rows = team_margin_rows(post_priori)
+
+    elo = elo_team_state(post_priori, k=k, engine=engine, initial_elo=initial_elo, initial_rd=initial_rd)
+    rolling = rolling_team_state(rows, windows)
+    matrix = games
+    for side in ['home', 'away']:
+        matrix = matrix.merge(_side_state(games, elo, side), on='game_id', how='left')
+        matrix = matrix.merge(_side_state(games, rolling, side), on='game_id', how='left')
+
+    matrix['home_elo'] = matrix['home_elo'].fillna(initial_elo)
+    matrix['away_elo'] = matrix['away_elo'].fillna(initial_elo)
+    matrix['elo_diff'] = matrix['home_elo'] - matrix['away_elo']
+    if engine == 'glicko2':
+        matrix['home_rd'] = matrix['home_rd'].fillna(initial_rd)
+        matrix['away_rd'] = matrix['away_rd'].fillna(initial_rd)
+        matrix['elo_home_win_prob'] = glicko_expected_score(matrix['home_elo'], matrix['away_elo'], matrix['home_rd'], matrix['away_rd'])
+    else:
+        matrix['elo_home_win_prob'] = expected_score(matrix['home_elo'], matrix['away_elo'])
+
+    h2h = head_to_head_state(rows, h2h_windows)
+    left = games[['game_id', 'game_date', 'home_team', 'away_team']].rename(columns={'home_team': 'team', 'away_team': 'opponent'})
+    h2h = _as_of_join(left, h2h, by=['team', 'opponent']).drop(columns=['game_date', 'team', 'opponent'])
+    h2h['h2h_games'] = h2h['h2h_games'].fillna(0)
+    matrix = matrix.merge(h2h, on='game_id', how='left')
+
+    if schedule_ratings is not None:
+        # Imported here so the matrix does not need scipy unless schedule ratings are joined
+        from src.schedule_graph import join_schedule_ratings
+        matrix = join_schedule_ratings(matrix, schedule_ratings)
+
+    matrix['target'] = (matrix['result'] == 'home_win').astype(int)
+    return matrix
+
+def save_training_matrix(matrix: pd.DataFrame, path: str) -> str:
+    """
+    Write the training matrix to a single columnar file.
+
+    Parquet is used when a parquet engine (pyarrow or fastparquet) is installed, otherwise the
+    matrix is written as CSV next to the requested path.
+
+    Args:
+        matrix (pd.DataFrame): Output of assemble_training_matrix.
+        path (str): Output path, e.g. data/processed/training_matrix.parquet.
+
+    Returns:
+        str: Path of the file written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        matrix.to_parquet(path, index=False)
+    except ImportError:
+        path = os.path.splitext(path)[0] + '.csv'
+        matrix.to_csv(path, index=False)
+    return path
+
+def load_training_matrix(path: str) -> pd.DataFrame:
+    """
+    Load a training matrix written by save_training_matrix.
+
+    Args:
+        path (str): Parquet or CSV file; the CSV fallback of a parquet path is found automatically.
+
+    Returns:
+        pd.DataFrame: Training matrix.
+    """
+    csv_path = os.path.splitext(path)[0] + '.csv'
+    if path.endswith('.csv') or (not os.path.exists(path) and os.path.exists(csv_path)):
+        return pd.read_csv(csv_path, parse_dates=['game_date'])
+    return pd.read_parquet(path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Assemble the leakage-free training matrix from post-priori data.')
+    parser.add_argument('--post-priori', default='data/processed/post_priori.csv', help='Post-priori CSV.')
+    parser.add_argument('--output', default='data/processed/training_matrix.parquet', help='Output parquet file.')
+    parser.add_argument('--windows', type=int, nargs='+', default=[3, 5, 10], help='Rolling average windows in games.')
+    parser.add_argument('--h2h-windows', type=int, nargs='+', default=[3], help='Head-to-head windows in meetings.')
+    parser.add_argument('--k', type=float, default=20)
+    parser.add_argument('--engine', choices=list(RATING_ENGINES), default='elo')
+    parser.add_argument('--schedule-ratings', default=None, help='Optional ratings table saved by ScheduleGraph.save.')
+    args = parser.parse_args()
+
+    schedule_ratings = None
+    if args.schedule_ratings:
+        from src.schedule_graph import load_ratings_table
+        schedule_ratings = load_ratings_table(args.schedule_ratings)
+    matrix = assemble_training_matrix(pd.read_csv(args.post_priori), windows=tuple(args.windows),
+                                      h2h_windows=tuple(args.h2h_windows), k=args.k, engine=args.engine,
+                                      schedule_ratings=schedule_ratings)
+    path = save_training_matrix(matrix, args.output)
+    print(f'Saved {len(matrix)} games x {matrix.shape[1]} columns to {path}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from src.backtest import (build_model, evaluate_predictions, feature_columns, home_win_probability, load_features, prepare_backtest_data,
+                          walk_forward_folds)
+from src.preprocessing import fingerprint_dataset
+
+# Search spaces of tune_random_forest and tune_rnn in the modeling notebook
+RF_PARAM_GRID = {
+    'n_estimators': [100, 200, 300],
+    'max_depth': [10, 20, 30, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4]
+}
+
+RNN_PARAM_GRID = {
+    'hidden_size': [25, 50, 100],
+    'num_layers': [1, 2, 3],
+    'dropout': [0.0, 0.2, 0.4],
+    'learning_rate': [0.001, 0.01]
+}
+
+TUNING_MODELS = {'random_forest', 'rnn'}
+
+# Metrics where a higher value is better; every other metric is minimized
+HIGHER_IS_BETTER = {'accuracy'}
+
+TRIALS_FILE = 'trials.jsonl'
+
+# Fewest trees a random forest trial is grown with on the lowest rung
+MIN_TREES = 20
+
+# Previous games in each RNN input sequence, unless a candidate sets its own window
+SEQUENCE_WINDOW = 10
+
+def param_candidates(grid: dict) -> list:
+    """
+    Expand a parameter grid into every combination.
+
+    Args:
+        grid (dict): Lists of values keyed by parameter name.
+
+    Returns:
+        list: One parameter dict per combination.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def tuning_folds(games: pd.DataFrame, n_folds: int = 3) -> list:
+    """
+    Build time-ordered validation folds over the last seasons of the data.
+
+    Args:
+        games (pd.DataFrame): Output of prepare_backtest_data.
+        n_folds (int): Number of validation seasons, each trained on every earlier game.
+
+    Returns:
+        list: Folds as returned by walk_forward_folds.
+    """
+    last_season = int(games['season'].max())
+    return walk_forward_folds(games, last_season - n_folds + 1, last_season)
+
+def sequence_folds(games: pd.DataFrame, n_folds: int = 3) -> list:
+    """
+    Build the time-ordered validation folds of RNN tuning as date ranges of the sequence dataset.
+
+    Each fold validates on one of the last seasons and trains on every team game before it,
+    like tuning_folds, but as the target dates TeamSequenceDataset filters on.
+
+    Args:
+        games (pd.DataFrame): Games with game_date, e.g. post_priori or the output of prepare_backtest_data.
+        n_folds (int): Number of validation seasons.
+
+    Returns:
+        list: Folds with test_start and test_end (exclusive) dates.
+    """
+    from src.feature_calculator import add_season_and_week
+
+    games = add_season_and_week(games[['game_date']])
+    game_date = pd.to_datetime(games['game_date'])
+    last_season = int(games['season'].max())
+    folds = []
+    for season in range(last_season - n_folds + 1, last_season + 1):
+        dates = game_date[games['season'] == season]
+        if dates.empty:
+            continue
+        folds.append({'season': season, 'test_start': dates.min().strftime('%Y-%m-%d'),
+                      'test_end': (dates.max() + pd.Timedelta(days=1)).strftime('%Y-%m-%d')})
+    return folds
+
+def prepare_sequence_tuning(post_priori: pd.DataFrame, path: str, n_folds: int = 3) -> list:
+    """
+    Write the sequence dataset RNN trials read and build its validation folds.
+
+    Args:
+        post_priori (pd.DataFrame): Post-priori data with game_id, game_date, home_team, away_team and result.
+        path (str): Directory of the sequence dataset.
+        n_folds (int): Number of validation seasons.
+
+    Returns:
+        list: Folds from sequence_folds.
+    """
+    from src.sequence_dataset import build_sequence_dataset
+
+    build_sequence_dataset(post_priori, path)
+    return sequence_folds(post_priori, n_folds)
+
+def rung_resources(model_name: str, n_rungs: int, eta: int, max_epochs: int = 100) -> list:
+    """
+    Get the resource given to a trial at each rung.
+
+    Random forests are trained on the most recent fraction of each training window with the
+    same fraction of their trees, RNNs for a number of epochs; each rung gets eta times the
+    resource of the previous one.
+
+    Args:
+        model_name (str): 'random_forest' or 'rnn'.
+        n_rungs (int): Number of rungs.
+        eta (int): Reduction factor between rungs.
+        max_epochs (int): RNN epochs at the last rung.
+
+    Returns:
+        list: Resource of every rung, ending with the full resource.
+    """
+    scale = [eta ** (rung - n_rungs + 1) for rung in range(n_rungs)]
+    if model_name == 'rnn':
+        return [max(1, int(round(max_epochs * s))) for s in scale]
+    return [float(s) for s in scale]
+
+def data_fingerprint(X: np.ndarray, y: np.ndarray, folds: list) -> str:
+    """
+    Hash the tuning data and folds, so cached trials are only reused for the same inputs.
+
+    Args:
+        X (np.ndarray): Feature matrix.
+        y (np.ndarray): Target.
+        folds (list): Validation folds.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    for array in [X, y] + [fold[part] for fold in folds for part in ['train', 'test']]:
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+def sequence_fingerprint(path: str, folds: list) -> str:
+    """
+    Hash a sequence dataset and its folds, so cached RNN trials are only reused for the same inputs.
+
+    Args:
+        path (str): Directory written by build_sequence_dataset.
+        folds (list): Folds from sequence_folds.
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    from src.sequence_dataset import FEATURES_FILE, TARGETS_FILE
+
+    digest = hashlib.sha256()
+    for name in [FEATURES_FILE, TARGETS_FILE]:
+        digest.update(fingerprint_dataset(os.path.join(path, name)).encode())
+    digest.update(json.dumps(folds, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def _trial_key(model_name: str, params: dict, fingerprint: str) -> str:
+    text = json.dumps({'model': model_name, 'params': params, 'data': fingerprint}, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+class TrialCache:
+    """
+    Append-only log of finished trials, so an interrupted search resumes where it stopped.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Cache directory, holding trials.jsonl and RNN checkpoints.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.results = {}
+        trials_file = os.path.join(path, TRIALS_FILE)
+        if os.path.exists(trials_file):
+            with open(trials_file) as f:
+                for line in f:
+                    # A search killed while writing leaves a partial last line
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[(record['key'], record['resource'])] = record
+
+    def get(self, key: str, resource) -> dict:
+        return self.results.get((key, resource))
+
+    def put(self, record: dict):
+        self.results[(record['key'], record['resource'])] = record
+        with open(os.path.join(self.path, TRIALS_FILE), 'a') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+
+    def checkpoint_path(self, key: str) -> str:
+        return os.path.join(self.path, f'rnn_{key}.pt')
+
+# Tuning data shared by the trial workers, set once per process by _init_worker
+_worker_X = None
+_worker_y = None
+_worker_folds = None
+_worker_sequences = None
+
+def _init_worker(X: np.ndarray, y: np.ndarray, folds: list, sequence_path: str = None):
+    global _worker_X, _worker_y, _worker_folds, _worker_sequences
+    _worker_X = X
+    _worker_y = y
+    _worker_folds = folds
+    _worker_sequences = sequence_path
+    try:
+        import torch
+        # Trials already run in parallel, one per process
+        torch.set_num_threads(1)
+    except ImportError:
+        pass
+
+def _fit_random_forest(params: dict, fraction: float) -> dict:
+    # Lower rungs grow the same fraction of the forest, the most expensive part of a fit
+    params = {**params, 'n_estimators': max(MIN_TREES, int(params.get('n_estimators', 200) * fraction))}
+    probs, targets = [], []
+    for fold in _worker_folds:
+        train = fold['train'][-max(1, int(len(fold['train']) * fraction)):]
+        model = build_model('random_forest', params)
+        model.fit(_worker_X[train], _worker_y[train])
+        probs.append(home_win_probability(model, _worker_X[fold['test']]))
+        targets.append(_worker_y[fold['test']])
+    return evaluate_predictions(np.concatenate(targets), np.concatenate(probs))
+
+def _sequence_tensors(dataset) -> tuple:
+    # Every window of the dataset as one (samples, window, features) batch and its win labels;
+    # ties count as losses, as in the home_win target
+    from torch.utils.data import DataLoader
+
+    X, won = next(iter(DataLoader(dataset, batch_size=max(1, len(dataset)))))
+    return X, (won > 0.5).long()
+
+def _fit_rnn(params: dict, epochs: int, checkpoint_path: str, patience: int) -> dict:
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+    from src.rnn_model import RNNModel
+    from src.sequence_dataset import TeamSequenceDataset
+
+    # Training continues from the checkpoint of the previous rung instead of starting over
+    checkpoint = torch.load(checkpoint_path) if os.path.exists(checkpoint_path) else None
+    states, probs, targets = [], [], []
+    criterion = nn.CrossEntropyLoss()
+    window = params.get('window', SEQUENCE_WINDOW)
+
+    for i, fold in enumerate(_worker_folds):
+        # Sequences of each team's previous games, predicting the outcome of its next game
+        train_set = TeamSequenceDataset(_worker_sequences, window, end_date=fold['test_start'])
+        val_set = TeamSequenceDataset(_worker_sequences, window, start_date=fold['test_start'], end_date=fold['test_end'])
+        X_train_tensor, y_train_tensor = _sequence_tensors(train_set)
+        X_val_tensor, y_val_tensor = _sequence_tensors(val_set)
+
+        # Scaled with the statistics of the training sequences only
+        mean = X_train_tensor.mean(dim=(0, 1))
+        std = X_train_tensor.std(dim=(0, 1))
+        std[std == 0] = 1
+        X_train_tensor = (X_train_tensor - mean) / std
+        X_val_tensor = (X_val_tensor - mean) / std
+
+        torch.manual_seed(42 + i)
+        model = RNNModel(X_train_tensor.shape[2], params['hidden_size'], params['num_layers'], params['dropout'])
+        optimizer = optim.Adam(model.parameters(), lr=params['learning_rate'])
+        state = {'epoch': 0, 'best_loss': float('inf'), 'bad_epochs': 0, 'best_model': None}
+        if checkpoint is not None:
+            state = checkpoint[i]
+            model.load_state_dict(state['model'])
+            optimizer.load_state_dict(state['optimizer'])
+
+        while state['epoch'] < epochs and state['bad_epochs'] < patience:
+            model.train()
+            optimizer.zero_grad()
+            loss = criterion(model(X_train_tensor), y_train_tensor)
+            loss.backward()
+            optimizer.step()
+            state['epoch'] += 1
+
+            model.eval()
+            with torch.no_grad():
+                val_loss = criterion(model(X_val_tensor), y_val_tensor).item()
+            if val_loss < state['best_loss']:
+                state.update(best_loss=val_loss, bad_epochs=0, best_model={k: v.clone() for k, v in model.state_dict().items()})
+            else:
+                state['bad_epochs'] += 1
+
+        # The checkpoint keeps the latest weights to resume from, the score uses the best epoch so far
+        states.append({**state, 'model': {k: v.clone() for k, v in model.state_dict().items()}, 'optimizer': optimizer.state_dict()})
+        if state['best_model'] is not None:
+            model.load_state_dict(state['best_model'])
+        model.eval()
+        with torch.no_grad():
+            probs.append(torch.softmax(model(X_val_tensor), dim=1)[:, 1].numpy())
+        targets.append(y_val_tensor.numpy())
+
+    buffer = io.BytesIO()
+    torch.save(states, buffer)
+    with open(checkpoint_path + '.tmp', 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+    metrics = evaluate_predictions(np.concatenate(targets), np.concatenate(probs))
+    metrics['epochs_trained'] = max(state['epoch'] for state in states)
+    metrics['early_stopped'] = all(state['bad_epochs'] >= patience for state in states)
+    return metrics
+
+def _run_trial(model_name: str, params: dict, resource, checkpoint_path: str, patience: int) -> dict:
+    if model_name == 'rnn':
+        return _fit_rnn(params, resource, checkpoint_path, patience)
+    return _fit_random_forest(params, resource)
+
+def _score(metrics: dict, metric: str) -> float:
+    # Lower is better for ranking
+    return -metrics[metric] if metric in HIGHER_IS_BETTER else metrics[metric]
+
+def asha_search(X: np.ndarray, y: np.ndarray, folds: list, model_name: str = 'random_forest', candidates: list = None,
+                eta: int = 3, n_rungs: int = 3, max_epochs: int = 100, patience: int = 10, metric: str = 'log_loss',
+                workers: int = None, cache_dir: str = 'data/tuning', sequence_path: str = None) -> pd.DataFrame:
+    """
+    Search hyperparameters with asynchronous successive halving (ASHA) over time-ordered folds.
+
+    Every candidate starts on the smallest resource. Whenever a worker is free, the best
+    1/eta of a rung that have not been promoted yet move up to the next rung, otherwise a new
+    candidate starts, so workers never wait for a rung to fill. RNN trials resume from their
+    checkpoint when promoted and also stop early when the validation loss stops improving.
+
+    RNN trials train on each team's sequence of previous games from a sequence dataset
+    instead of the game rows of X.
+
+    Args:
+        X (np.ndarray): Feature matrix, unused by RNN trials.
+        y (np.ndarray): Binary target, unused by RNN trials.
+        folds (list): Time-ordered folds from tuning_folds, or from sequence_folds for the RNN.
+        model_name (str): 'random_forest' or 'rnn'.
+        candidates (list): Parameter dicts, defaulting to the notebook grid of the model.
+        eta (int): Reduction factor between rungs.
+        n_rungs (int): Number of rungs.
+        max_epochs (int): RNN epochs at the last rung.
+        patience (int): Epochs without validation improvement before an RNN trial stops.
+        metric (str): Metric from evaluate_predictions to rank trials by.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        cache_dir (str): Directory of the trial cache.
+        sequence_path (str): Directory written by build_sequence_dataset, required for the RNN.
+
+    Returns:
+        pd.DataFrame: Every trial with its parameters, rung, resource and metrics, best first.
+    """
+    if model_name not in TUNING_MODELS:
+        raise ValueError(f'Unknown tuning model: {model_name}')
+    if candidates is None:
+        candidates = param_candidates(RNN_PARAM_GRID if model_name == 'rnn' else RF_PARAM_GRID)
+    if model_name == 'rnn' and sequence_path is None:
+        raise ValueError('RNN tuning needs a sequence dataset from build_sequence_dataset')
+
+    resources = rung_resources(model_name, n_rungs, eta, max_epochs)
+    cache = TrialCache(cache_dir)
+    fingerprint = sequence_fingerprint(sequence_path, folds) if model_name == 'rnn' else data_fingerprint(X, y, folds)
+    keys = [_trial_key(model_name, params, fingerprint) for params in candidates]
+
+    rungs = [[] for _ in resources]
+    promoted = [set() for _ in resources]
+    pending = deque(range(len(candidates)))
+    records = []
+
+    def next_job():
+        for rung in reversed(range(n_rungs - 1)):
+            ranked = sorted(rungs[rung])
+            for score, candidate in ranked[:len(ranked) // eta]:
+                if candidate not in promoted[rung]:
+                    promoted[rung].add(candidate)
+                    return candidate, rung + 1
+        if pending:
+            return pending.popleft(), 0
+        return None
+
+    def record(candidate, rung, metrics):
+        rungs[rung].append((_score(metrics, metric), candidate))
+        records.append({'candidate': candidate, 'rung': rung, 'resource': resources[rung], **candidates[candidate], **metrics})
+
+    capacity = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=capacity, initializer=_init_worker, initargs=(X, y, folds, sequence_path)) as executor:
+        running = {}
+        while True:
+            while len(running) < capacity:
+                job = next_job()
+                if job is None:
+                    break
+                candidate, rung = job
+                cached = cache.get(keys[candidate], resources[rung])
+                if cached is not None:
+                    record(candidate, rung, cached['metrics'])
+                    continue
+                future = executor.submit(_run_trial, model_name, candidates[candidate], resources[rung],
+                                         cache.checkpoint_path(keys[candidate]), patience)
+                running[future] = (candidate, rung)
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                candidate, rung = running.pop(future)
+                metrics = future.result()
+                cache.put({'key': keys[candidate], 'model': model_name, 'params': candidates[candidate],
+                           'resource': resources[rung], 'metrics': metrics})
+                record(candidate, rung, metrics)
+
+    trials = pd.DataFrame(records)
+    trials['score'] = [_score(row, metric) for row in trials.to_dict('records')]
+    return trials.sort_values(['rung', 'score'], ascending=[False, True], kind='stable').drop(columns='score').reset_index(drop=True)
+
+def best_params(trials: pd.DataFrame, candidates: list) -> dict:
+    """
+    Get the parameters of the best trial on the highest rung.
+
+    Args:
+        trials (pd.DataFrame): Output of asha_search.
+        candidates (list): Candidates the search ran over.
+
+    Returns:
+        dict: Best parameters.
+    """
+    return candidates[int(trials.iloc[0]['candidate'])]
+
+def main():
+    parser = argparse.ArgumentParser(description='Tune the random forest or RNN with ASHA over time-ordered folds.')
+    parser.add_argument('--features', default='data/processed/training_matrix.parquet',
+                        help='Training matrix or feature CSV with game columns, for the random forest.')
+    parser.add_argument('--post-priori', default='data/processed/post_priori.csv', help='Post-priori CSV the RNN sequences are built from.')
+    parser.add_argument('--sequences', default='data/processed/sequences', help='Directory the RNN sequence dataset is written to.')
+    parser.add_argument('--model', choices=sorted(TUNING_MODELS), default='random_forest')
+    parser.add_argument('--folds', type=int, default=3, help='Number of validation seasons.')
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--rungs', type=int, default=3)
+    parser.add_argument('--max-epochs', type=int, default=100)
+    parser.add_argument('--patience', type=int, default=10)
+    parser.add_argument('--metric', choices=['log_loss', 'brier', 'accuracy', 'ece'], default='log_loss')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', default='data/tuning', help='Trial cache directory.')
+    parser.add_argument('--output', default=None, help='Optional CSV path for every trial.')
+    args = parser.parse_args()
+
+    if args.model == 'rnn':
+        X = y = None
+        folds = prepare_sequence_tuning(pd.read_csv(args.post_priori), args.sequences, args.folds)
+    else:
+        games = prepare_backtest_data(load_features(args.features))
+        X = games[feature_columns(games)].fillna(0).to_numpy(dtype=np.float32)
+        y = games['target'].to_numpy()
+        folds = tuning_folds(games, args.folds)
+    candidates = param_candidates(RNN_PARAM_GRID if args.model == 'rnn' else RF_PARAM_GRID)
+
+    trials = asha_search(X, y, folds, model_name=args.model, candidates=candidates, eta=args.eta, n_rungs=args.rungs,
+                         max_epochs=args.max_epochs, patience=args.patience, metric=args.metric, workers=args.workers,
+                         cache_dir=args.cache, sequence_path=args.sequences)
+    if args.output:
+        trials.to_csv(args.output, index=False)
+    print(trials.head(10).to_string(index=False))
+    print('Best parameters:', best_params(trials, candidates))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+TEAMS = ['ARI', 'ATL', 'BAL', 'BUF', 'CAR', 'CHI', 'CIN', 'CLE']
+
+def make_plays(seasons: tuple = (2009, 2010, 2011, 2012), weeks: int = 6, plays_per_game: int = 60, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a small play-by-play table with every column calculate_post_priori reads.
+
+    Every team plays once a week, and both teams of every game have possessions, penalties and
+    third downs, so no game is dropped by the per-side merges.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    game_number = 0
+    for season in seasons:
+        for week in range(weeks):
+            game_date = pd.Timestamp(f'{season}-09-10') + pd.Timedelta(days=7 * week)
+            order = rng.permutation(TEAMS)
+            for home_team, away_team in zip(order[::2], order[1::2]):
+                game_number += 1
+                game_id = int(f'{season}{game_number:06d}')
+                home_score = away_score = 0
+                for play_id in range(1, plays_per_game + 1):
+                    side = 'home' if (play_id // 5) % 2 == 0 else 'away'
+                    posteam = home_team if side == 'home' else away_team
+                    points = rng.choice([0] * 12 + [3, 7])
+                    if side == 'home':
+                        home_score += points
+                    else:
+                        away_score += points
+                    penalty = int(play_id <= 4 or rng.random() < 0.08)
+                    play_type = rng.choice(['pass', 'run', 'punt', 'field_goal', 'kickoff'], p=[0.45, 0.4, 0.06, 0.04, 0.05])
+                    rows.append({
+                        'game_id': game_id,
+                        'play_id': play_id,
+                        'game_date': game_date.strftime('%Y-%m-%d'),
+                        'home_team': home_team,
+                        'away_team': away_team,
+                        'posteam': posteam,
+                        'posteam_type': side,
+                        'qtr': 1 + (play_id - 1) * 4 // plays_per_game,
+                        'game_seconds_remaining': 3600 - (play_id - 1) * 3600 // plays_per_game,
+                        'total_home_score': home_score,
+                        'total_away_score': away_score,
+                        'play_type': play_type,
+                        'yards_gained': int(rng.integers(-5, 25)),
+                        'complete_pass': int(play_type == 'pass' and rng.random() < 0.6),
+                        'incomplete_pass': int(play_type == 'pass' and rng.random() < 0.4),
+                        'pass_attempt': int(play_type == 'pass'),
+                        'rush_attempt': int(play_type == 'run'),
+                        'interception': int(rng.random() < 0.02),
+                        'fumble': int(rng.random() < 0.02),
+                        'fumble_lost': int(rng.random() < 0.01),
+                        'fumble_forced': int(rng.random() < 0.02),
+                        'fumble_recovery_1_team': rng.choice([home_team, away_team, None], p=[0.02, 0.02, 0.96]),
+                        'first_down_pass': int(play_type == 'pass' and rng.random() < 0.3),
+                        'first_down_rush': int(play_type == 'run' and rng.random() < 0.2),
+                        'first_down_penalty': int(penalty and rng.random() < 0.3),
+                        'third_down_converted': int(play_id % 10 == 3),
+                        'third_down_failed': int(play_id % 10 == 8),
+                        'fourth_down_converted': int(rng.random() < 0.02),
+                        'fourth_down_failed': int(rng.random() < 0.02),
+                        'penalty': penalty,
+                        'penalty_team': [home_team, away_team][play_id % 2] if penalty else None,
+                        'penalty_yards': float(rng.choice([5, 10, 15])) if penalty else 0.0,
+                        'field_goal_result': rng.choice(['made', 'missed']) if play_type == 'field_goal' else None,
+                        'kick_distance': float(rng.integers(20, 60)) if play_type in ['field_goal', 'kickoff', 'punt'] else np.nan,
+                        'return_yards': float(rng.integers(0, 30)) if play_type in ['kickoff', 'punt'] else 0.0,
+                        'pass_touchdown': int(play_type == 'pass' and points == 7),
+                        'rush_touchdown': int(play_type == 'run' and points == 7),
+                        'touchdown': int(points == 7),
+                        'qb_hit': int(rng.random() < 0.05),
+                        'sack': int(rng.random() < 0.03),
+                        'safety': 0,
+                        'solo_tackle': int(rng.random() < 0.5),
+                        'punt_inside_twenty': int(play_type == 'punt' and rng.random() < 0.3),
+                        'tackled_for_loss': int(rng.random() < 0.05)
+                    })
+    return pd.DataFrame(rows)
+
+@pytest.fixture(scope='session')
+def plays() -> pd.DataFrame:
+    return make_plays()
+
+@pytest.fixture(scope='session')
+def post_priori(plays) -> pd.DataFrame:
+    from src.feature_calculator import calculate_post_priori
+
+    return calculate_post_priori(plays)
+
+@pytest.fixture(scope='session')
+def training_matrix(post_priori) -> pd.DataFrame:
+    from src.training_matrix import assemble_training_matrix
+
+    return assemble_training_matrix(post_priori)
+
+@pytest.fixture
+def plays_csv(plays, tmp_path) -> str:
+    path = tmp_path / 'plays.csv'
+    plays.to_csv(path, index=False)
+    return str(path)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.backtest import GAME_COLUMNS, feature_columns, fold_features, join_game_columns, prepare_backtest_data, run_backtest, walk_forward_folds
+from src.preprocessing import FeaturePreprocessor
+
+def test_fold_preprocessor_ignores_test_results(training_matrix):
+    games = prepare_backtest_data(training_matrix)
+    fold = walk_forward_folds(games, 2012, 2012)[0]
+
+    X_train, X_test = fold_features(games, None, fold, FeaturePreprocessor(k_features=(5,)), 'top_5_features')
+
+    # Flipping every test result must not change the scaling or the selected features
+    flipped = games.copy()
+    flipped.loc[flipped.index[fold['test']], 'target'] = 1 - flipped['target'].iloc[fold['test']]
+    X_train_flipped, X_test_flipped = fold_features(flipped, None, fold, FeaturePreprocessor(k_features=(5,)), 'top_5_features')
+
+    assert X_train.shape[1] == 5
+    np.testing.assert_array_equal(X_train, X_train_flipped)
+    np.testing.assert_array_equal(X_test, X_test_flipped)
+    np.testing.assert_allclose(X_train.mean(axis=0), 0, atol=1e-5)
+
+def test_backtest_fits_preprocessor_per_fold(training_matrix):
+    backtest = run_backtest(training_matrix, start_season=2011, end_season=2012, model_name='logistic_regression',
+                            workers=1, preprocessor=FeaturePreprocessor(), selection='top_10_features')
+
+    assert set(backtest['predictions']['season']) == {2011, 2012}
+    assert backtest['predictions']['model_prob'].between(0, 1).all()
+
+def test_backtest_rejects_fitted_preprocessor(training_matrix):
+    games = prepare_backtest_data(training_matrix)
+    fitted = FeaturePreprocessor().fit(games, target_column='target')
+
+    with pytest.raises(ValueError, match='unfitted'):
+        run_backtest(training_matrix, start_season=2012, end_season=2012, workers=1, preprocessor=fitted)
+
+def test_feature_columns_leave_out_final_scores(training_matrix, post_priori):
+    averages = training_matrix[['game_id', 'last_3_games_home_score_q1', 'last_3_games_away_score_q1']]
+
+    joined = join_game_columns(averages, post_priori)
+    assert list(joined.columns) == list(averages.columns) + GAME_COLUMNS[1:]
+
+    # Joining the whole of post_priori must still not turn the final score into a feature
+    columns = feature_columns(prepare_backtest_data(averages.merge(post_priori, on='game_id')))
+    assert not {'total_home_score', 'total_away_score', 'point_diff'} & set(columns)
@@ -0,0 +1,92 @@
+import json
+
+import pandas as pd
+import pytest
+
+from src.cli import main
+
+@pytest.fixture
+def config_path(tmp_path, plays_csv) -> str:
+    config = {
+        'raw_plays': plays_csv,
+        'plays_store': str(tmp_path / 'plays'),
+        'post_priori': str(tmp_path / 'post_priori.csv'),
+        'averages_dir': str(tmp_path / 'averages'),
+        'training_matrix': str(tmp_path / 'training_matrix.parquet'),
+        'schedule_ratings': str(tmp_path / 'schedule_ratings.csv'),
+        'elo_history': str(tmp_path / 'elo_history.csv'),
+        'elo_ratings': str(tmp_path / 'elo_ratings.json'),
+        'artifacts': str(tmp_path / 'artifacts'),
+        'tuning_cache': str(tmp_path / 'tuning'),
+        'sequences': str(tmp_path / 'sequences'),
+        'workers': 1
+    }
+    path = tmp_path / 'nflelo.json'
+    path.write_text(json.dumps(config))
+    return str(path)
+
+def test_post_priori_command(config_path, tmp_path, plays, capsys):
+    main(['--config', config_path, 'post-priori'])
+
+    post_priori = pd.read_csv(tmp_path / 'post_priori.csv')
+    assert len(post_priori) == plays['game_id'].nunique()
+    assert {'home_team', 'away_team', 'result', 'total_home_score'} <= set(post_priori.columns)
+    assert 'Saved' in capsys.readouterr().out
+
+def test_bench_command(config_path, capsys):
+    main(['--config', config_path, 'bench', '--seasons', '2012', '--repeat', '1'])
+
+    stages = [line.split()[0] for line in capsys.readouterr().out.splitlines()[1:]]
+    assert stages == ['load', 'post-priori', 'elo']
+
+@pytest.fixture
+def matrix_config(config_path, capsys) -> str:
+    main(['--config', config_path, 'post-priori'])
+    main(['--config', config_path, 'matrix'])
+    capsys.readouterr()
+    return config_path
+
+def test_backtest_command_defaults_to_training_matrix(matrix_config, capsys):
+    main(['--config', matrix_config, 'backtest', '--start-season', '2011', '--end-season', '2012'])
+
+    output = capsys.readouterr().out
+    assert '2011' in output and '2012' in output and 'all' in output
+
+def test_tune_command_defaults_to_training_matrix(matrix_config, monkeypatch, capsys):
+    monkeypatch.setattr('src.tuning.RF_PARAM_GRID', {'n_estimators': [20], 'max_depth': [3, None]})
+
+    # Without a parquet engine the matrix falls back to CSV, which the loader finds from the parquet path
+    main(['--config', matrix_config, 'tune', '--folds', '1', '--rungs', '1', '--patience', '2'])
+
+    assert 'Best parameters:' in capsys.readouterr().out
+
+def test_tune_rnn_command_trains_on_team_sequences(matrix_config, monkeypatch, capsys, tmp_path):
+    monkeypatch.setattr('src.tuning.RNN_PARAM_GRID', {'hidden_size': [8], 'num_layers': [1], 'dropout': [0.0], 'learning_rate': [0.01]})
+
+    main(['--config', matrix_config, 'tune', '--model', 'rnn', '--folds', '1', '--rungs', '1', '--max-epochs', '3'])
+
+    assert 'Best parameters:' in capsys.readouterr().out
+    assert (tmp_path / 'sequences' / 'features.npy').exists()
+
+def test_backtest_rejects_features_without_game_columns(matrix_config, tmp_path):
+    averages = pd.read_csv(tmp_path / 'training_matrix.csv').drop(columns=['game_date', 'home_team', 'away_team', 'result'])
+    averages.to_csv(tmp_path / 'last_10_games.csv', index=False)
+
+    with pytest.raises(ValueError, match='game_date, home_team, away_team, result'):
+        main(['--config', matrix_config, 'backtest', '--features', str(tmp_path / 'last_10_games.csv')])
+
+def test_export_and_predict_commands(matrix_config, capsys):
+    main(['--config', matrix_config, 'export', '--model', 'logistic_regression'])
+    assert 'Exported artifacts' in capsys.readouterr().out
+
+    main(['--config', matrix_config, 'predict', 'ARI', 'ATL'])
+    result = json.loads(capsys.readouterr().out)
+    assert 0 <= result['home_win_prob'] <= 1
+
+def test_schedule_command_feeds_the_matrix(matrix_config, tmp_path, capsys):
+    main(['--config', matrix_config, 'schedule'])
+    assert 'Saved schedule ratings' in capsys.readouterr().out
+
+    main(['--config', matrix_config, 'matrix', '--schedule-ratings', str(tmp_path / 'schedule_ratings.csv')])
+    matrix = pd.read_csv(tmp_path / 'training_matrix.csv')
+    assert matrix['home_massey'].notna().all()
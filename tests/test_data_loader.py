@@ -0,0 +1,20 @@
+from src.data_loader import ingest_plays, load_and_clean_data
+
+def test_csv_weeks_do_not_restart_at_chunk_boundaries(plays, plays_csv):
+    # Chunks much smaller than a season split every season across many chunks
+    chunked = load_and_clean_data(plays_csv, chunksize=1000)
+    whole = load_and_clean_data(plays_csv, chunksize=len(plays))
+
+    assert chunked[['game_id', 'play_id', 'season', 'week']].equals(whole[['game_id', 'play_id', 'season', 'week']])
+    assert chunked.groupby('season')['week'].max().eq(6).all()
+
+def test_csv_filter_matches_store(plays_csv, tmp_path):
+    store = str(tmp_path / 'plays')
+    ingest_plays(plays_csv, store, chunksize=1000)
+
+    from_csv = load_and_clean_data(plays_csv, seasons=[2010, 2011], start_date='2010-09-20', chunksize=1000)
+    from_store = load_and_clean_data(store, seasons=[2010, 2011], start_date='2010-09-20')
+
+    assert from_csv['game_date'].min() >= '2010-09-20'
+    assert set(from_csv['season']) == {2010, 2011}
+    assert from_csv[['game_id', 'play_id', 'week']].equals(from_store[['game_id', 'play_id', 'week']])
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from src.elo_ratings import GLICKO_SCALE, _glicko_period, calculate_glicko_history
+
+def test_glicko_period_matches_glickmans_example():
+    # Glickman's Glicko-2 paper: a 1500/200 player beats 1400/30, then loses to 1550/100 and 1700/300
+    mu = (np.array([1500, 1400, 1550, 1700]) - 1500) / GLICKO_SCALE
+    phi = np.array([200, 30, 100, 300]) / GLICKO_SCALE
+    sigma = np.full(4, 0.06)
+
+    mu, phi, sigma = _glicko_period(mu, phi, sigma, np.array([0, 0, 0]), np.array([1, 2, 3]), np.array([1.0, 0, 0]), tau=0.5)
+
+    assert mu[0] * GLICKO_SCALE + 1500 == pytest.approx(1464.06, abs=0.01)
+    assert phi[0] * GLICKO_SCALE == pytest.approx(151.52, abs=0.01)
+    assert sigma[0] == pytest.approx(0.05999, abs=1e-5)
+    # Players without games in the period only gain uncertainty
+    assert mu[1:] * GLICKO_SCALE + 1500 == pytest.approx([1400, 1550, 1700])
+    assert phi[1] * GLICKO_SCALE == pytest.approx(np.sqrt(30 ** 2 + (0.06 * GLICKO_SCALE) ** 2))
+
+def test_glicko_history_is_zero_sum_between_equal_teams(post_priori):
+    history = calculate_glicko_history(post_priori)
+    first = history.iloc[0]
+
+    assert first['home_elo'] == first['away_elo'] == 1500
+    assert first['home_rd'] == first['away_rd'] == 350
+    assert first['home_elo_post'] - 1500 == pytest.approx(1500 - first['away_elo_post'])
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from src.live_win_probability import LiveWinProbabilityConsumer, file_replay_source
+
+def test_replay_finishes_every_game(plays, plays_csv, post_priori):
+    consumer = LiveWinProbabilityConsumer({})
+    game_date = plays['game_date'].iloc[0]
+
+    updates = list(consumer.run(file_replay_source(plays_csv, game_date=game_date)))
+    finals = [update for update in updates if update['game_over']]
+
+    day = plays[plays['game_date'] == game_date]
+    assert len(updates) == len(day)
+    assert consumer.games == {}
+    assert sorted(update['game_id'] for update in finals) == sorted(day['game_id'].unique())
+    for update in finals:
+        last = day[day['game_id'] == update['game_id']].iloc[-1]
+        assert (update['home_score'], update['away_score']) == (last['total_home_score'], last['total_away_score'])
+        game = post_priori[post_priori['game_id'] == update['game_id']].iloc[0]
+        assert (update['turnovers_home'], update['turnovers_away']) == (game['total_turnovers_home'], game['total_turnovers_away'])
+
+def test_feed_end_game_play_finishes_game():
+    consumer = LiveWinProbabilityConsumer({'ARI': 1550})
+    play = {'game_id': 1, 'home_team': 'ARI', 'away_team': 'ATL', 'qtr': 4, 'game_seconds_remaining': 0,
+            'total_home_score': 24, 'total_away_score': 17}
+
+    assert not consumer.process(play)['game_over']
+    assert consumer.process({**play, 'desc': 'END GAME'})['game_over']
+    assert consumer.games == {}
+
+def test_replay_keeps_overtime_after_regulation(tmp_path):
+    base = {'game_date': '2012-09-09', 'home_team': 'ARI', 'away_team': 'ATL', 'posteam_type': 'home'}
+    clock = [(4, 300, 0), (4, 100, 0), (4, 0, 0), (5, 900, 0), (5, 500, 0), (5, 200, 6)]
+    plays = [{**base, 'game_id': 1, 'play_id': i + 1, 'qtr': qtr, 'game_seconds_remaining': seconds,
+              'total_home_score': 14 + points, 'total_away_score': 14} for i, (qtr, seconds, points) in enumerate(clock)]
+    plays += [{**base, 'game_id': 2, 'play_id': 1, 'qtr': 4, 'game_seconds_remaining': 0,
+               'home_team': 'BAL', 'away_team': 'BUF', 'total_home_score': 3, 'total_away_score': 0}]
+    path = tmp_path / 'plays.csv'
+    pd.DataFrame(plays).to_csv(path, index=False)
+
+    updates = list(LiveWinProbabilityConsumer({}).run(file_replay_source(str(path))))
+    game = [update for update in updates if update['game_id'] == 1]
+
+    assert [update['play_id'] for update in game] == [1, 2, 3, 4, 5, 6]
+    assert [update['game_over'] for update in game] == [False] * 5 + [True]
+    assert game[-1]['home_score'] == 20
@@ -0,0 +1,75 @@
+import logging
+
+import pytest
+
+import nflelo
+from nflelo import Neo4jElo
+
+class FakeSummary:
+    result_available_after = 2
+    result_consumed_after = 3
+    profile = {'dbHits': 3, 'children': [{'dbHits': 2, 'children': []}]}
+
+class FakeResult:
+
+    def __init__(self, records):
+        self.records = records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def consume(self):
+        return FakeSummary()
+
+class FakeSession:
+
+    def __init__(self):
+        self.queries = []
+
+    def run(self, query, **params):
+        self.queries.append(query)
+        return FakeResult([{'game_id': 1}])
+
+@pytest.fixture
+def elo_system(monkeypatch):
+    # Two queries: 3 ms, then 200 ms
+    clock = iter([0, 0.003, 1, 1.2])
+    monkeypatch.setattr(nflelo.time, 'perf_counter', lambda: next(clock))
+    # The driver only connects on its first session, so no database is needed
+    system = Neo4jElo('bolt://localhost:7687', 'neo4j', 'password', profile=True, slow_query_ms=100)
+    yield system
+    system.close()
+
+def test_run_records_histogram_slow_queries_and_db_hits(elo_system, caplog):
+    session = FakeSession()
+    with caplog.at_level(logging.WARNING, logger='nflelo'):
+        for _ in range(2):
+            assert elo_system._run(session, 'get_games', 'MATCH (t:Team) RETURN t', limit=1) == [{'game_id': 1}]
+
+    stats = elo_system.query_stats()['get_games']
+    assert session.queries == ['PROFILE MATCH (t:Team) RETURN t'] * 2
+    assert stats['count'] == 2
+    assert stats['max_seconds'] == pytest.approx(0.2)
+    assert stats['mean_seconds'] == pytest.approx(0.1015)
+    assert [stats['histogram'][bound] for bound in [0.0025, 0.005, 0.1, 0.25, 10]] == [0, 1, 1, 2, 2]
+    assert stats['slow_queries'] == 1
+    assert stats['db_hits'] == 10
+    assert stats['result_available_after_ms'] == 4
+    assert [record.getMessage().split(' took')[0] for record in caplog.records] == ['Slow query get_games']
+
+def test_query_stats_prometheus(elo_system):
+    session = FakeSession()
+    for _ in range(2):
+        elo_system._run(session, 'get_games', 'MATCH (t:Team) RETURN t')
+
+    lines = elo_system.query_stats_prometheus().splitlines()
+
+    assert '# TYPE neo4j_elo_query_duration_seconds histogram' in lines
+    assert 'neo4j_elo_query_duration_seconds_bucket{template="get_games",le="0.005"} 1' in lines
+    assert 'neo4j_elo_query_duration_seconds_bucket{template="get_games",le="+Inf"} 2' in lines
+    assert 'neo4j_elo_query_duration_seconds_count{template="get_games"} 2' in lines
+    assert 'neo4j_elo_query_db_hits_total{template="get_games"} 10' in lines
+    assert 'neo4j_elo_slow_queries_total{template="get_games"} 1' in lines
+
+    elo_system.reset_query_stats()
+    assert 'template=' not in elo_system.query_stats_prometheus()
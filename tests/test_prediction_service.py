@@ -0,0 +1,108 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.prediction_service import (PredictionArtifacts, PredictionService, build_team_state, compact_model, export_artifacts,
+                                    team_state_columns)
+from src.preprocessing import FeaturePreprocessor
+from src.training_matrix import assemble_training_matrix
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def test_team_state_skips_rating_and_head_to_head_columns(training_matrix, post_priori):
+    team_state = build_team_state(post_priori, [name for name, _, _ in team_state_columns(training_matrix)])
+
+    assert 'last_3_games_score_q1' in team_state.columns
+    assert not [col for col in team_state.columns if col.startswith('h2h_') or 'win_prob' in col]
+
+def test_team_state_includes_each_teams_last_game(post_priori):
+    team_state = build_team_state(post_priori, ['last_3_games_score_q1'])
+
+    games = post_priori[(post_priori['home_team'] == 'ARI') | (post_priori['away_team'] == 'ARI')]
+    games = games.sort_values('game_date', kind='stable').tail(3)
+    scores = [game['score_q1_home'] if game['home_team'] == 'ARI' else game['score_q1_away'] for _, game in games.iterrows()]
+    assert team_state.loc['ARI', 'last_3_games_score_q1'] == pytest.approx(sum(scores) / 3)
+
+def test_export_elo_only_artifacts(training_matrix, tmp_path):
+    export_artifacts(str(tmp_path), training_matrix, model_name=None)
+
+    probs = PredictionArtifacts(str(tmp_path)).predict(['ARI'], ['ATL'])
+    assert probs['home_win_prob'][0] == probs['elo_home_win_prob'][0]
+
+@pytest.mark.parametrize('preprocessor', [None, FeaturePreprocessor(k_features=(10,))])
+def test_training_matrix_artifacts_serve_predictions(training_matrix, post_priori, tmp_path, preprocessor):
+    selection = 'top_10_features' if preprocessor is not None else None
+    export_artifacts(str(tmp_path), training_matrix, post_priori, model_name='random_forest', model_params={'n_estimators': 10},
+                     preprocessor=preprocessor, selection=selection)
+
+    with open(tmp_path / 'manifest.json') as f:
+        manifest = json.load(f)
+    assert not [col for col in manifest['feature_columns'] if col.startswith('h2h_')]
+    assert manifest['team_features']
+
+    service = PredictionService(str(tmp_path), reload_interval=None)
+    try:
+        batch = service.predict_batch(['ARI', 'BAL'], ['ATL', 'CLE'])
+        single = service.predict('ARI', 'ATL', timeout=10)
+    finally:
+        service.close()
+    assert all(0 <= result['home_win_prob'] <= 1 for result in batch)
+    assert single['home_win_prob'] == pytest.approx(batch[0]['home_win_prob'])
+    assert single['version'] == manifest['version']
+
+def test_exports_get_distinct_versions(training_matrix, tmp_path):
+    first = export_artifacts(str(tmp_path), training_matrix, model_name=None)
+    second = export_artifacts(str(tmp_path), training_matrix, model_name=None)
+
+    assert first != second
+    assert os.path.exists(tmp_path / f'elo_ratings_{first}.json')
+
+def test_glicko_training_matrix_artifacts_serve_predictions(post_priori, tmp_path):
+    matrix = assemble_training_matrix(post_priori, engine='glicko2')
+    export_artifacts(str(tmp_path), matrix, post_priori, model_name='logistic_regression', engine='glicko2')
+
+    loaded = PredictionArtifacts(str(tmp_path))
+    probs = loaded.predict(['ARI'], ['ATL'])
+    assert loaded.rd is not None
+    assert 0 <= probs['home_win_prob'][0] <= 1
+
+@pytest.mark.parametrize('model_name', ['random_forest', 'logistic_regression'])
+def test_compact_model_matches_sklearn(training_matrix, model_name):
+    from src.backtest import build_model, feature_columns, prepare_backtest_data
+
+    games = prepare_backtest_data(training_matrix)
+    X = games[feature_columns(games)].fillna(0).to_numpy(dtype=np.float32)
+    model = build_model(model_name, {'n_estimators': 20} if model_name == 'random_forest' else None)
+    half = len(X) // 2
+    model.fit(X[:half], games['target'].to_numpy()[:half])
+
+    np.testing.assert_allclose(compact_model(model).predict_proba(X[half:]), model.predict_proba(X[half:]), atol=1e-6)
+
+def test_predict_command_does_not_load_sklearn(training_matrix, post_priori, tmp_path):
+    export_artifacts(str(tmp_path), training_matrix, post_priori, model_params={'n_estimators': 10})
+    script = ('import sys; from src.cli import main; '
+              f'main(["predict", "ARI", "ATL", "--artifacts", {str(tmp_path)!r}]); '
+              'assert "sklearn" not in sys.modules')
+
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)['home_win_prob'] >= 0
+
+def test_batch_errors_fail_requests_without_stopping_the_service(training_matrix, tmp_path, monkeypatch):
+    export_artifacts(str(tmp_path), training_matrix, model_name=None)
+    service = PredictionService(str(tmp_path), reload_interval=None)
+    predict = service.artifacts.predict
+    monkeypatch.setattr(service.artifacts, 'predict', lambda home_teams, away_teams: 1 / 0)
+    try:
+        with pytest.raises(ZeroDivisionError):
+            service.predict('ARI', 'ATL', timeout=10)
+        monkeypatch.setattr(service.artifacts, 'predict', predict)
+        assert 0 <= service.predict('ARI', 'ATL', timeout=10)['home_win_prob'] <= 1
+    finally:
+        service.close()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+from src.preprocessing import fit_dataset_preprocessor, main
+from src.training_matrix import save_training_matrix
+
+def test_main_defaults_fit_the_training_matrix(training_matrix, tmp_path, monkeypatch, capsys):
+    os.makedirs(tmp_path / 'data' / 'processed')
+    written = save_training_matrix(training_matrix, str(tmp_path / 'data' / 'processed' / 'training_matrix.parquet'))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'argv', ['preprocessing'])
+
+    main()
+
+    assert os.path.exists(os.path.splitext(written)[0] + '.preprocessor.json')
+    assert 'top_10_features' in capsys.readouterr().out
+
+def test_fit_without_target_fails_clearly(training_matrix, tmp_path):
+    path = tmp_path / 'last_10_games.csv'
+    training_matrix.drop(columns=['result', 'target']).to_csv(path, index=False)
+
+    with pytest.raises(ValueError, match="no 'target' column"):
+        fit_dataset_preprocessor(str(path), target_column='target')
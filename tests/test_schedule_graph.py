@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.schedule_graph import ScheduleGraph, join_schedule_ratings
+from src.training_matrix import assemble_training_matrix
+
+# Week 1: A beats B by 10 and C by 8, B beats C by 4. Week 2: C beats A by 3
+GAMES = pd.DataFrame({
+    'game_id': [1, 2, 3, 4],
+    'game_date': ['2012-09-09', '2012-09-10', '2012-09-11', '2012-09-16'],
+    'home_team': ['A', 'B', 'A', 'C'],
+    'away_team': ['B', 'C', 'C', 'A'],
+    'home_score': [20, 14, 15, 17],
+    'away_score': [10, 10, 7, 14]
+})
+
+def week_ratings(graph: ScheduleGraph, week: int) -> pd.DataFrame:
+    table = graph.ratings_table()
+    return table[table['week'] == week].set_index('team')
+
+def test_ratings_after_first_week_match_known_solutions():
+    graph = ScheduleGraph(GAMES, ridge=0.01)
+    ratings = week_ratings(graph, 2)
+
+    # Every pair met once, so Massey is the margin over 3 (plus the ridge) and Colley 0.5 + (wins - losses) / 10
+    assert ratings['massey'].tolist() == pytest.approx(np.array([18, -6, -12]) / 3.01)
+    assert ratings['colley'].tolist() == pytest.approx([0.7, 0.5, 0.3])
+    assert ratings['pagerank'].tolist() == pytest.approx([0.520869, 0.281551, 0.197580], abs=1e-6)
+    assert ratings['win_pct'].tolist() == pytest.approx([1, 0.5, 0])
+    assert ratings['opp_win_pct'].tolist() == pytest.approx([0.25, 0.5, 0.75])
+
+def test_first_week_ratings_see_no_games():
+    ratings = week_ratings(ScheduleGraph(GAMES), 1)
+
+    assert ratings['games_played'].tolist() == [0, 0, 0]
+    assert ratings['massey'].tolist() == pytest.approx([0, 0, 0])
+
+class FakeElo:
+
+    def get_games(self):
+        undated = pd.DataFrame({'game_id': [5], 'game_date': [None], 'home_team': ['B'], 'away_team': ['A'],
+                                'home_score': [21], 'away_score': [3]})
+        return pd.concat([GAMES, undated], ignore_index=True)
+
+def test_from_neo4j_drops_undated_games():
+    graph = ScheduleGraph.from_neo4j(FakeElo())
+
+    assert graph.games['game_id'].tolist() == [1, 2, 3, 4]
+    assert week_ratings(graph, 2)['games_played'].tolist() == [2, 2, 2]
+
+def test_join_uses_ratings_from_before_each_week():
+    graph = ScheduleGraph(GAMES, ridge=0.01)
+
+    joined = join_schedule_ratings(GAMES, graph.ratings_table())
+
+    assert joined['home_massey'].tolist() == pytest.approx([0, 0, 0, -12 / 3.01])
+    assert joined['away_massey'].tolist() == pytest.approx([0, 0, 0, 18 / 3.01])
+
+def test_training_matrix_joins_schedule_ratings(post_priori):
+    ratings = ScheduleGraph(post_priori).ratings_table()
+
+    matrix = assemble_training_matrix(post_priori, schedule_ratings=ratings)
+
+    assert len(matrix) == len(post_priori)
+    assert matrix[['home_massey', 'away_colley', 'home_pagerank']].notna().all().all()
+    first_week = matrix['week'] == matrix.groupby('season')['week'].transform('min')
+    assert np.allclose(matrix.loc[first_week, 'home_massey'], 0)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.season_simulator import SeasonSetup, rank_standings, simulate_season
+
+DIVISIONS = {
+    'A': ('X', 'North'), 'B': ('X', 'North'), 'C': ('X', 'South'), 'D': ('X', 'South'),
+    'E': ('Y', 'North'), 'F': ('Y', 'North'), 'G': ('Y', 'South'), 'H': ('Y', 'South')
+}
+
+def test_half_game_conference_lead_beats_random_tie_break():
+    # A and B have the same overall and division records, A has half a conference win more
+    completed = pd.DataFrame({'home_team': ['A', 'B'], 'away_team': ['C', 'E'], 'result': ['tie', 'tie']})
+    schedule = pd.DataFrame({'home_team': ['D', 'F', 'G'], 'away_team': ['H', 'C', 'E']})
+    setup = SeasonSetup({}, schedule, completed, DIVISIONS)
+    rng = np.random.default_rng(0)
+
+    standings = rank_standings(setup, (rng.random((1000, len(schedule))) < 0.5).astype(np.float32), rng, wild_cards=0)
+
+    assert standings['division_winner'][:, setup.teams.index('A')].all()
+
+@pytest.fixture(scope='module')
+def season():
+    teams = sorted(DIVISIONS)
+    schedule = pd.DataFrame([(home, away, week) for week in range(3) for home in teams for away in teams if home < away],
+                            columns=['home_team', 'away_team', 'week'])
+    ratings = {team: 1400 + 30 * i for i, team in enumerate(teams)}
+    return ratings, schedule
+
+def test_season_odds_are_consistent(season):
+    ratings, schedule = season
+
+    odds = simulate_season(ratings, schedule, n_sims=2000, chunk_size=500, workers=1, divisions=DIVISIONS, k=20)
+
+    assert odds['expected_wins'].sum() == pytest.approx(len(schedule))
+    assert odds.groupby('division')['division_prob'].sum().to_numpy() == pytest.approx(1)
+    assert odds.groupby('conference')['playoff_prob'].sum().to_numpy() == pytest.approx(4)
+    assert (odds.filter(like='seed_').groupby(odds['conference']).sum().to_numpy() == pytest.approx(1))
+    # The strongest team of each division wins it most often
+    assert odds.loc[odds.groupby('division')['division_prob'].idxmax(), 'team'].tolist() == ['B', 'D', 'F', 'H']
+
+def test_season_odds_do_not_depend_on_workers(season):
+    ratings, schedule = season
+
+    single = simulate_season(ratings, schedule, n_sims=1000, chunk_size=250, workers=1, divisions=DIVISIONS)
+    multiple = simulate_season(ratings, schedule, n_sims=1000, chunk_size=250, workers=2, divisions=DIVISIONS)
+
+    pd.testing.assert_frame_equal(single, multiple)
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from src.feature_calculator import calculate_post_priori
+from src.shared_frame import SharedFrame, game_row_ranges, parallel_post_priori
+
+def test_shared_frame_round_trips_columns(plays):
+    with SharedFrame.create(plays) as shared:
+        frame = shared.to_frame(rows=slice(100, 400))
+
+        assert frame['penalty_team'].astype(object).fillna('').tolist() == plays['penalty_team'].iloc[100:400].fillna('').tolist()
+        assert (frame['yards_gained'].to_numpy() == plays['yards_gained'].iloc[100:400].to_numpy()).all()
+
+def test_game_row_ranges_keep_games_whole(plays):
+    ranges = game_row_ranges(plays['game_id'].to_numpy(), 7)
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(plays)
+    for start, _ in ranges[1:]:
+        assert plays['game_id'].iloc[start] != plays['game_id'].iloc[start - 1]
+
+def test_parallel_post_priori_matches_serial(plays):
+    # Games missing a penalized side are where positional alignment used to go wrong
+    plays = plays[~((plays['game_id'] % 7 == 0) & (plays['penalty_team'] == plays['away_team']))]
+
+    serial = calculate_post_priori(plays)
+    parallel = parallel_post_priori(plays, workers=2, chunks_per_worker=3)
+
+    pd.testing.assert_frame_equal(parallel, serial, check_dtype=False)
+
+def test_parallel_post_priori_shares_only_the_columns_it_reads(plays, monkeypatch):
+    import src.shared_frame
+
+    plays = plays.assign(desc=[f'play {i}' for i in range(len(plays))])
+    specs = []
+    map_shared = src.shared_frame.map_shared
+    monkeypatch.setattr(src.shared_frame, 'map_shared', lambda function, shared, tasks, workers=None:
+                        specs.append(shared.spec) or map_shared(function, shared, tasks, workers))
+
+    parallel_post_priori(plays, workers=1, chunks_per_worker=1)
+
+    assert 'desc' not in [column['name'] for column in specs[0]['columns']]
+    assert len(specs[0]['categories']) < 100
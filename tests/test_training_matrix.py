@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from src.elo_ratings import calculate_glicko_history
+from src.training_matrix import assemble_training_matrix
+
+def test_glicko_matrix_uses_glicko_ratings(post_priori, training_matrix):
+    matrix = assemble_training_matrix(post_priori, engine='glicko2')
+
+    assert matrix[['home_rd', 'away_rd']].notna().all().all()
+    assert not np.allclose(matrix['home_elo'], training_matrix['home_elo'])
+
+    # A team's pre-game rating is its rating after its previous game
+    history = calculate_glicko_history(post_priori)
+    last = matrix.iloc[-1]
+    before = history[(history['game_date'] < last['game_date'].strftime('%Y-%m-%d')) &
+                     ((history['home_team'] == last['home_team']) | (history['away_team'] == last['home_team']))].iloc[-1]
+    side = 'home' if before['home_team'] == last['home_team'] else 'away'
+    assert last['home_elo'] == before[f'{side}_elo_post']
+
+@pytest.mark.parametrize('engine', ['elo', 'glicko2'])
+def test_initial_rating_reaches_the_engine(post_priori, engine):
+    shifted = assemble_training_matrix(post_priori, engine=engine, initial_elo=1400)
+    default = assemble_training_matrix(post_priori, engine=engine)
+
+    # Both engines only depend on rating differences, so every rating moves by the same 100 points
+    np.testing.assert_allclose(shifted[['home_elo', 'away_elo']], default[['home_elo', 'away_elo']] - 100)
+    np.testing.assert_allclose(shifted['elo_home_win_prob'], default['elo_home_win_prob'])
@@ -0,0 +1,20 @@
+import os
+
+import numpy as np
+
+from src.sequence_dataset import DATES_FILE, TeamSequenceDataset
+from src.tuning import prepare_sequence_tuning
+
+def test_sequence_folds_train_before_each_validation_season(post_priori, tmp_path):
+    folds = prepare_sequence_tuning(post_priori, str(tmp_path), n_folds=2)
+    dates = np.load(os.path.join(tmp_path, DATES_FILE))
+
+    assert [fold['season'] for fold in folds] == [2011, 2012]
+    for fold in folds:
+        train = TeamSequenceDataset(str(tmp_path), window=3, end_date=fold['test_start'])
+        val = TeamSequenceDataset(str(tmp_path), window=3, start_date=fold['test_start'], end_date=fold['test_end'])
+
+        assert len(train) and len(val)
+        assert dates[train.index].max() < dates[val.index].min()
+        X, _ = val[0]
+        assert X.shape == (3, len(val.meta['columns']))